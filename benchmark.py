@@ -0,0 +1,391 @@
+"""Offline benchmark of the pipeline scripts against local fixtures.
+
+A corpus of project sites (resources/benchmark_sites/) is served from
+loopback addresses, one domain per site, next to the OpenAI and MediaWiki
+stubs from stub_servers.py. The generated sites cover the cases the scrapers
+have to handle: static pages, JavaScript-rendered pages, slow servers,
+lazy-loaded content, parked domains and dead sites. `--record N` adds N real
+pages from archive/ to the corpus.
+
+Each stage script runs in a fresh working directory, in order, with the
+stubs configured through the environment. For every stage the benchmark
+reports wall time, throughput, p50/p95 latency of its per-item phases (from
+the stage's telemetry), CPU time and peak memory, and compares them with the
+stored baseline.
+
+    python benchmark.py                                  # run and compare with resources/benchmark_baseline.json
+    python benchmark.py --save-baseline                  # run and store the results as the new baseline
+    python benchmark.py --stages gen_summary gen_wikis --openai-rpm 120
+
+The exit status is 1 when a stage fails or a metric is worse than the
+baseline by more than --tolerance. A stage that runs longer than
+--stage-timeout is killed and counted as failed, and stages reading from a
+failed one are not run. Stages driving Chrome need Chrome and chromedriver installed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from stub_servers import start_mediawiki_stub, start_openai_stub, start_sites_stub
+from telemetry import load_events
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = 'resources/benchmark_sites'
+BASELINE_FILE = 'resources/benchmark_baseline.json'
+RESULTS_FILE = 'resources/benchmark_results.json'
+SITE_COUNT = 40
+SITE_MIX = {'static': 0.4, 'js': 0.2, 'slow': 0.1, 'lazy': 0.1, 'parked': 0.1, 'dead': 0.1}
+SLOW_DELAY = 3.0
+SEED = 7
+TOLERANCE = 0.2
+# A stage still running after this many seconds is killed and counted as failed
+STAGE_TIMEOUT = 1800
+WAIT_POLL_INTERVAL = 0.5
+# Per-item phases whose latency is reported for each stage
+STAGES = {
+    'info_export': ('http_fetch', 'navigate', 'write'),
+    'contact_export': ('http_fetch', 'navigate', 'contact_page'),
+    'image_export': ('capture', 'encode'),
+    'gen_summary': ('openai_call',),
+    'gen_wikis': ('wiki_edit',),
+}
+# Stage whose outputs a stage reads; it runs first, unmeasured, when only the later stage is benchmarked
+REQUIRES = {'gen_summary': 'info_export', 'gen_wikis': 'gen_summary'}
+# Metrics compared with the baseline, and whether higher values are better
+COMPARED_METRICS = {'seconds': False, 'items_per_second': True, 'p95': False, 'cpu_seconds': False,
+                    'max_rss_mb': False}
+
+WORDS = ('carbon', 'credits', 'regenerative', 'farmers', 'blockchain', 'impact', 'tokenized', 'forest',
+         'restoration', 'community', 'renewable', 'energy', 'transparent', 'verification', 'satellite',
+         'monitoring', 'biodiversity', 'ocean', 'plastic', 'recycling', 'microfinance', 'donations', 'traceable',
+         'supply', 'chain', 'solar', 'grid', 'water', 'access', 'education', 'governance', 'DAO', 'NFT', 'rewards',
+         'public', 'goods', 'funding', 'open', 'source', 'data', 'climate', 'offsets', 'mangrove', 'soil',
+         'sequestration', 'partners', 'network', 'protocol', 'marketplace', 'wallet', 'local', 'cooperative')
+PARKED_PAGE = """<html><head><title>{domain} - domain for sale</title></head><body>
+<h1>{domain}</h1><p>This domain may be for sale! Buy this domain today.</p>
+<p>Related searches: green energy, carbon credits, crypto wallet</p></body></html>"""
+JS_PAGE = """<html><head><title>{name}</title></head><body><div id="root"></div>
+<noscript>You need to enable JavaScript to run this app.</noscript>
+<script>
+document.addEventListener('DOMContentLoaded', function () {{
+  document.getElementById('root').innerHTML = {content};
+}});
+</script></body></html>"""
+LAZY_PAGE = """<html><head><title>{name}</title></head><body><div id="app">
+<h1>{name}</h1><p>{intro}</p><div id="more" style="margin-top: 3000px">Loading...</div></div>
+<script>
+new IntersectionObserver(function (entries, observer) {{
+  if (!entries[0].isIntersecting) return;
+  observer.disconnect();
+  fetch('/more.html').then(function (r) {{ return r.text(); }}).then(function (html) {{
+    document.getElementById('more').innerHTML = html;
+  }});
+}}).observe(document.getElementById('more'));
+</script></body></html>"""
+
+
+def paragraph(rng, sentences=4):
+    text = []
+    for _ in range(sentences):
+        words = rng.choices(WORDS, k=rng.randint(8, 16))
+        text.append(' '.join(words).capitalize() + '.')
+    return ' '.join(text)
+
+
+def site_content(rng, name, slug):
+    """Body HTML of a project homepage: mission, features and a footer with contacts."""
+    features = ''.join(f"<li>{paragraph(rng, 1)}</li>" for _ in range(rng.randint(3, 6)))
+    return (f"<header><nav><a href=\"/\">Home</a> <a href=\"/about\">About</a> <a href=\"/contact\">Contact</a></nav></header>"
+            f"<main><h1>{name}</h1><p>{paragraph(rng)}</p><h2>Our mission</h2><p>{paragraph(rng, 5)}</p>"
+            f"<h2>Features</h2><ul>{features}</ul><h2>Partners</h2><p>{paragraph(rng, 3)}</p></main>"
+            f"<footer><a href=\"https://x.com/{slug}\">X</a> <a href=\"https://github.com/{slug}\">GitHub</a> "
+            f"<a href=\"https://t.me/{slug}\">Telegram</a></footer>")
+
+
+def write_file(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def generate_corpus(corpus=CORPUS_DIR, count=SITE_COUNT, seed=SEED):
+    """Write a deterministic corpus of `count` sites in the SITE_MIX proportions."""
+    rng = random.Random(seed)
+    kinds = [kind for kind, share in SITE_MIX.items() for _ in range(round(share * count))]
+    kinds = (kinds + ['static'] * count)[:count]
+    rng.shuffle(kinds)
+    sites = []
+    for index, kind in enumerate(kinds):
+        name = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()} {index}"
+        slug = re.sub(r'\W+', '-', name.lower())
+        site = {'name': name, 'dir': slug, 'kind': kind}
+        directory = os.path.join(corpus, slug)
+        content = site_content(rng, name, slug)
+        if kind == 'parked':
+            write_file(os.path.join(directory, 'index.html'), PARKED_PAGE.format(domain=f"{slug}.org"))
+        elif kind == 'js':
+            write_file(os.path.join(directory, 'index.html'), JS_PAGE.format(name=name, content=json.dumps(content)))
+        elif kind == 'lazy':
+            write_file(os.path.join(directory, 'index.html'), LAZY_PAGE.format(name=name, intro=paragraph(rng, 1)))
+            write_file(os.path.join(directory, 'more.html'), content)
+        elif kind != 'dead':
+            write_file(os.path.join(directory, 'index.html'),
+                       f"<html><head><title>{name}</title></head><body>{content}</body></html>")
+        if kind in ('static', 'slow', 'js', 'lazy'):
+            write_file(os.path.join(directory, 'contact.html'),
+                       f"<html><body><h1>Contact</h1><p>Write to us at hello@{slug}.org or "
+                       f"<a href=\"mailto:team@{slug}.org\">the team</a>.</p></body></html>")
+            write_file(os.path.join(directory, 'about.html'),
+                       f"<html><body><h1>About {name}</h1><p>{paragraph(rng, 6)}</p></body></html>")
+        if kind == 'slow':
+            site['delay'] = SLOW_DELAY
+        sites.append(site)
+    write_file(os.path.join(corpus, 'sites.json'), json.dumps(sites, indent=1))
+    print(f"Generated {count} sites in {corpus}")
+
+
+def record_archived_pages(limit, corpus=CORPUS_DIR):
+    """Add up to `limit` pages of real projects, as archived by the scrapers, to the corpus."""
+    from page_archive import PageArchive
+
+    with open(os.path.join(corpus, 'sites.json'), 'r', encoding='utf-8') as f:
+        sites = [site for site in json.load(f) if site['kind'] != 'recorded']
+    archive = PageArchive()
+    df = pd.read_csv('resources/mixed_data.csv').dropna(subset=['Website', 'Name'])
+    recorded = 0
+    for _, row in df.iterrows():
+        if recorded >= limit:
+            break
+        html = archive.load(row['Website'], kind='rendered') or archive.load(row['Website'])
+        if not html:
+            continue
+        slug = f"recorded-{re.sub(r'[^a-z0-9]+', '-', row['Name'].lower()).strip('-')}"
+        write_file(os.path.join(corpus, slug, 'index.html'), html)
+        sites.append({'name': row['Name'], 'dir': slug, 'kind': 'recorded'})
+        recorded += 1
+    archive.close()
+    write_file(os.path.join(corpus, 'sites.json'), json.dumps(sites, indent=1))
+    print(f"Recorded {recorded} archived pages into {corpus}")
+
+
+def count_files(directory):
+    return len(os.listdir(directory)) if os.path.isdir(directory) else 0
+
+
+def count_outputs(stage, workdir, wiki):
+    """Items a stage produced: files written, CSV rows or wiki pages."""
+    if stage == 'info_export':
+        return count_files(os.path.join(workdir, 'info'))
+    if stage == 'contact_export':
+        path = os.path.join(workdir, 'resources/contact_info.csv')
+        return len(pd.read_csv(path)) if os.path.exists(path) else 0
+    if stage == 'image_export':
+        path = os.path.join(workdir, 'screenshots')
+        return len([name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name))]) if os.path.isdir(path) else 0
+    if stage == 'gen_summary':
+        return count_files(os.path.join(workdir, 'summaries'))
+    return len(wiki.pages)
+
+
+def phase_latency(stage, workdir):
+    """p50/p95/max seconds of the stage's per-item phases in its telemetry run, or None without events."""
+    path = os.path.join(workdir, 'resources/telemetry.jsonl')
+    if not os.path.exists(path):
+        return None
+    events = load_events(path, run='last')
+    if events.empty or 'seconds' not in events:
+        return None
+    seconds = events.loc[events['event'].isin(STAGES[stage]), 'seconds'].dropna()
+    if seconds.empty:
+        return None
+    return {'p50': round(seconds.median(), 3), 'p95': round(seconds.quantile(0.95), 3),
+            'max': round(seconds.max(), 3), 'samples': int(len(seconds))}
+
+
+def run_stage(stage, workdir, env, args=(), timeout=STAGE_TIMEOUT):
+    """Run a stage script to completion; returns wall seconds, exit code and its resource usage.
+
+    A stage still running after `timeout` seconds is killed, with every
+    process it started, and gets the negative signal number as exit code.
+    """
+    log_path = os.path.join(workdir, 'logs', f'{stage}.log')
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    start = time.monotonic()
+    timed_out = False
+    with open(log_path, 'w', encoding='utf-8') as log:
+        # Its own process group, so a timeout also kills the Chrome processes it started
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, f'{stage}.py'), *args], cwd=workdir,
+                                   env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                                   start_new_session=True)
+        # wait4 gives the usage of this child (and the descendants it waited for) alone
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.monotonic() - start > timeout:
+                timed_out = True
+                os.killpg(process.pid, signal.SIGKILL)
+                _, status, usage = os.wait4(process.pid, 0)
+                break
+            time.sleep(WAIT_POLL_INTERVAL)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.monotonic() - start
+    return {'seconds': round(seconds, 3), 'exit_code': process.returncode, 'timed_out': timed_out,
+            'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 3),
+            'max_rss_mb': round(usage.ru_maxrss / 1024, 1)}  # ru_maxrss is in KiB on Linux
+
+
+def run_benchmark(args):
+    sites = start_sites_stub(args.corpus, args.sites_port, args.site_latency, args.site_jitter)
+    openai = start_openai_stub(args.openai_port, args.openai_latency, rpm=args.openai_rpm)
+    wiki = start_mediawiki_stub(args.wiki_port, args.wiki_latency, edits_per_minute=args.edits_per_minute)
+    workdir = tempfile.mkdtemp(prefix='ief-benchmark-')
+    print(f"Serving {len(sites.urls)} sites, working in {workdir}")
+
+    os.makedirs(os.path.join(workdir, 'resources'))
+    pd.DataFrame({'Name': list(sites.urls), 'Website': list(sites.urls.values())}).to_csv(
+        os.path.join(workdir, 'resources/mixed_data.csv'), index=False)
+    env = dict(os.environ, TELEMETRY='on', PYTHONUNBUFFERED='1',
+               OPENAI_BASE_URL=f"http://127.0.0.1:{args.openai_port}/v1", OPENAI_API_KEY='stub',
+               MIRAHEZE_API_URL=f"http://127.0.0.1:{args.wiki_port}/w/api.php",
+               MIRAHEZE_CONSUMER_KEY='stub', MIRAHEZE_CONSUMER_SECRET='stub',
+               MIRAHEZE_ACCESS_TOKEN='stub', MIRAHEZE_ACCESS_SECRET='stub')
+
+    setup = set()
+    for stage in args.stages:
+        while stage in REQUIRES and REQUIRES[stage] not in args.stages:
+            stage = REQUIRES[stage]
+            setup.add(stage)
+
+    results = {}
+    failed = set()
+    try:
+        for stage in STAGES:
+            if stage not in setup and stage not in args.stages:
+                continue
+            if REQUIRES.get(stage) in failed:
+                # Its inputs are missing, so measuring it would compare an empty run with the baseline
+                print(f"Skipping {stage}: {REQUIRES[stage]} failed")
+                failed.add(stage)
+                if stage in args.stages:
+                    results[stage] = {'exit_code': None, 'failed_input': REQUIRES[stage]}
+                continue
+            if stage in setup:
+                print(f"Running {stage} to prepare the inputs...", flush=True)
+                result = run_stage(stage, workdir, env, timeout=args.stage_timeout)
+                if result['exit_code'] != 0:
+                    failed.add(stage)
+                    print(f"{stage} exited with status {result['exit_code']}"
+                          f"{' after timing out' if result['timed_out'] else ''}, see {workdir}/logs/{stage}.log")
+                continue
+            print(f"Running {stage}...", flush=True)
+            result = run_stage(stage, workdir, env, timeout=args.stage_timeout)
+            result['items'] = count_outputs(stage, workdir, wiki)
+            result['items_per_second'] = round(result['items'] / result['seconds'], 3) if result['seconds'] else 0
+            result.update(phase_latency(stage, workdir) or {})
+            results[stage] = result
+            if result['exit_code'] != 0:
+                failed.add(stage)
+                print(f"{stage} exited with status {result['exit_code']}"
+                      f"{' after timing out' if result['timed_out'] else ''}, see {workdir}/logs/{stage}.log")
+    finally:
+        sites.shutdown()
+        openai.shutdown()
+        wiki.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'sites': len(sites.urls), 'python': platform.python_version(),
+            'cpus': os.cpu_count(), 'stages': results}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Table of every compared metric against the baseline; a regression is a change for the worse beyond tolerance."""
+    rows = []
+    for stage, result in results['stages'].items():
+        base = baseline['stages'].get(stage, {}) if baseline else {}
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            value, previous = result.get(metric), base.get(metric)
+            change = (value - previous) / previous if value is not None and previous else None
+            regression = change is not None and (-change if higher_is_better else change) > tolerance
+            rows.append({'stage': stage, 'metric': metric, 'value': value, 'baseline': previous,
+                         'change': f"{change:+.0%}" if change is not None else '',
+                         'regression': 'REGRESSION' if regression else ''})
+    return pd.DataFrame(rows).set_index(['stage', 'metric'])
+
+
+def print_results(results):
+    table = pd.DataFrame.from_dict(results['stages'], orient='index')
+    columns = ['exit_code', 'timed_out', 'failed_input', 'items', 'seconds', 'items_per_second', 'p50', 'p95', 'max', 'cpu_seconds', 'max_rss_mb']
+    with pd.option_context('display.width', 160, 'display.max_columns', 20):
+        print(f"\nStages ({results['sites']} sites)\n{table.reindex(columns=columns).to_string()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline scripts against local site fixtures and API stubs")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='Stages to measure; the stages they read from run first')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='Site corpus directory')
+    parser.add_argument('--sites', type=int, default=SITE_COUNT, help='Number of sites to generate')
+    parser.add_argument('--regenerate', action='store_true', help='Generate the corpus again, even if it exists')
+    parser.add_argument('--record', type=int, metavar='N', help='Add N archived pages of real projects to the corpus')
+    parser.add_argument('--site-latency', type=float, default=0.05, help='Seconds added to every site response')
+    parser.add_argument('--site-jitter', type=float, default=0.05, help='Extra random site latency, in seconds')
+    parser.add_argument('--openai-latency', type=float, default=0.2, help='Seconds added to every completion')
+    parser.add_argument('--openai-rpm', type=int, default=500, help='OpenAI stub requests per minute')
+    parser.add_argument('--wiki-latency', type=float, default=0.1, help='Seconds added to every wiki edit')
+    parser.add_argument('--edits-per-minute', type=int, default=600, help='MediaWiki stub edits per minute')
+    parser.add_argument('--sites-port', type=int, default=8003)
+    parser.add_argument('--openai-port', type=int, default=8001)
+    parser.add_argument('--wiki-port', type=int, default=8002)
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline results to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='Relative change for the worse reported as a regression (0.2 = 20%%)')
+    parser.add_argument('--stage-timeout', type=float, default=STAGE_TIMEOUT,
+                        help='Seconds after which a stage is killed and counted as failed')
+    parser.add_argument('--keep', action='store_true', help='Keep the working directory with the outputs and logs')
+    args = parser.parse_args()
+
+    if args.regenerate and os.path.isdir(args.corpus):
+        shutil.rmtree(args.corpus)
+    if not os.path.exists(os.path.join(args.corpus, 'sites.json')):
+        generate_corpus(args.corpus, args.sites)
+    if args.record:
+        record_archived_pages(args.record, args.corpus)
+
+    results = run_benchmark(args)
+    write_file(RESULTS_FILE, json.dumps(results, indent=1))
+    print_results(results)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    table = compare(results, baseline, args.tolerance)
+    if baseline:
+        with pd.option_context('display.width', 160):
+            print(f"\nCompared with the baseline from {baseline['created']}\n{table.to_string()}")
+    failed = [stage for stage, result in results['stages'].items() if result['exit_code'] != 0]
+    if failed:
+        print(f"\nFailed stages: {', '.join(failed)}" + (", not saving a baseline" if args.save_baseline else ''))
+        sys.exit(1)
+    if args.save_baseline:
+        write_file(args.baseline, json.dumps(results, indent=1))
+        print(f"\nSaved the results as the baseline in {args.baseline}")
+    elif baseline and (table['regression'] != '').any():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,118 +1,246 @@
-from unicodedata import category
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
+import argparse
+import asyncio
 import csv
-import time
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import re
 import logging
+from urllib.parse import urljoin
+
+from driver_pool import DriverPool, build_chrome_options
+from readiness import reset_network_log, wait_for_page
+from frontier import CrawlFrontier
+from static_fetch import fetch_static_pages, parse_html
+from telemetry import span
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+CARBONCOPY_URL = "https://carboncopy.news/projects"
+CARBONCOPY_CSV = 'resources/carboncopy_projects.csv'
+LISTING_CHECKPOINT = 'resources/carboncopy_listing.jsonl'
+DETAILS_CHECKPOINT = 'resources/carboncopy_details.jsonl'
+MAX_WORKERS = 5
+# Every project page is on carboncopy.news, so its politeness limits bound the harvest
+DETAIL_PER_HOST = 4
+DETAIL_DELAY = 0.25
+
+# Reads every project row of the current listing page in a single round trip
+LISTING_ROWS_SCRIPT = """
+return Array.from(document.querySelectorAll('tr')).slice(1).map(function (row) {
+    var cells = row.querySelectorAll('td');
+    if (cells.length < 5) return null;
+    var image = cells[0].querySelector('img');
+    var link = cells[1].querySelector('a');
+    if (!link) return null;
+    return {
+        'Project image': image ? image.src : null,
+        'Project name': link.textContent.trim(),
+        'Project link': link.href,
+        'Description': cells[2].innerText.trim()
+    };
+}).filter(function (row) { return row !== null; });
+"""
+
 def setup_driver():
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    return webdriver.Chrome(options=chrome_options)
+    return webdriver.Chrome(options=build_chrome_options())
 
 def get_total_projects(driver):
     title = driver.find_element(By.TAG_NAME, "h1").text
     match = re.search(r'\((\d+)\)', title)
     return int(match.group(1)) if match else None
 
-def scrape_projects(url):
+def read_checkpoint(path):
+    rows = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # Partial last line from an interrupted run
+    except FileNotFoundError:
+        pass
+    return rows
+
+def append_checkpoint(path, row):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        f.flush()
+
+def collect_listing(url):
+    """Walk the paginated listing once, without opening any project page.
+
+    Returns (rows, complete); complete is False when the walk stopped on an
+    error before the last page.
+    """
     driver = setup_driver()
-    projects = []
+    projects = {}
+    complete = False
 
     try:
         driver.get(url)
         logging.info(f"Navigated to URL: {url}")
-        
+
         total_projects = get_total_projects(driver)
-        logging.info(f"Total projects to scrape: {total_projects}")
-        
-        with tqdm(total=total_projects, desc="Scraping projects", ncols=100) as pbar:
+        logging.info(f"Total projects listed: {total_projects}")
+
+        with tqdm(total=total_projects, desc="Collecting listing", ncols=100) as pbar:
             while True:
                 try:
-                    WebDriverWait(driver, 20).until(
-                        EC.presence_of_element_located((By.TAG_NAME, "table"))
-                    )
-                    logging.info("Table element found on the page")
-                    
-                    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    time.sleep(2)
-                    
-                    rows = driver.find_elements(By.TAG_NAME, "tr")
-                    logging.info(f"Found {len(rows)} rows in the table")
-                    
-                    for row in rows[1:]:  # Skip header row
-                        try:
-                            columns = row.find_elements(By.TAG_NAME, "td")
-                            if len(columns) >= 5:
-                                image = columns[0].find_element(By.TAG_NAME, "img").get_attribute("src")
-                                name_element = columns[1].find_element(By.TAG_NAME, "a")
-                                name = name_element.text.strip()
-                                project_link = name_element.get_attribute("href")
-                                description = columns[2].text.strip()
-                                
-                                # Navigate to the project page
-                                driver.get(project_link)
-                                logging.info(f"Navigated to project page: {project_link}")
-                                
-                                # Extract website URL
-                                website_url = None
-                                try:
-                                    globe_icon = WebDriverWait(driver, 10).until(
-                                        EC.presence_of_element_located((By.CSS_SELECTOR, "i.bi.bi-globe"))
-                                    )
-                                    website_link = globe_icon.find_element(By.XPATH, "..")
-                                    website_url = website_link.get_attribute('href')
-                                except:
-                                    logging.warning(f"Could not find website for project: {name}")
-                                
-                                # Navigate back to the main page
-                                driver.back()
-                                
-                                projects.append({
-                                    'Project image': image,
-                                    'Project name': name,
-                                    'Project link': project_link,
-                                    'Description': description,
-                                    'Website': website_url
-                                })
-                                pbar.update(1)
-                        except Exception as e:
-                            logging.error(f"Error processing a row: {str(e)}")
-                    
+                    with span('listing_page', url=driver.current_url) as fields:
+                        WebDriverWait(driver, 20).until(
+                            EC.presence_of_element_located((By.TAG_NAME, "table"))
+                        )
+                        wait_for_page(driver, driver.current_url, scroll=False)
+
+                        rows = driver.execute_script(LISTING_ROWS_SCRIPT)
+                        fields['rows'] = len(rows)
+                    new_rows = [row for row in rows if row['Project link'] not in projects]
+                    logging.info(f"Found {len(rows)} rows on the page, {len(new_rows)} new")
+                    if not new_rows:
+                        logging.info("Listing page did not change, stopping")
+                        complete = True
+                        break
+                    for row in new_rows:
+                        projects[row['Project link']] = row
+                    pbar.update(len(new_rows))
+
                     next_button = WebDriverWait(driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, "//button[@aria-label='Next']"))
+                        EC.presence_of_element_located((By.XPATH, "//button[@aria-label='Next']"))
                     )
                     if not next_button.is_enabled():
                         logging.info("Reached the last page")
+                        complete = True
                         break
+                    first_row = driver.find_elements(By.TAG_NAME, "tr")[1]
+                    reset_network_log(driver)
                     next_button.click()
                     logging.info("Clicked the 'Next' button")
-                    time.sleep(2)  # Wait for the page to load
+                    # Wait for the table to re-render instead of reading the old rows again
+                    WebDriverWait(driver, 10).until(EC.staleness_of(first_row))
                 except TimeoutException:
                     logging.error("Timeout waiting for elements on the page")
                     break
-                except NoSuchElementException:
-                    logging.error("Could not find the 'Next' button")
+                except (NoSuchElementException, IndexError):
+                    logging.error("Could not find the 'Next' button or table rows")
                     break
                 except Exception as e:
-                    logging.error(f"Unexpected error during scraping: {str(e)}")
+                    logging.error(f"Unexpected error during listing: {str(e)}")
                     break
-                
     except Exception as e:
         logging.error(f"Unexpected error: {str(e)}")
     finally:
         driver.quit()
-    
+
+    logging.info(f"Total projects listed: {len(projects)}")
+    return list(projects.values()), complete
+
+def find_website_link(html):
+    """href of the link wrapping the globe icon on a project page, if any."""
+    for node in parse_html(html).iter():
+        classes = node.attrs.get('class', '').split()
+        if node.tag == 'i' and 'bi-globe' in classes:
+            parent = node.parent
+            while parent is not None and parent.tag != 'a':
+                parent = parent.parent
+            if parent is not None and parent.attrs.get('href'):
+                return parent.attrs['href']
+    return None
+
+def fetch_website_static(project_links):
+    """Fetch project pages over plain HTTP; returns {link: website or None}."""
+    frontier = CrawlFrontier(per_host=DETAIL_PER_HOST, delay=DETAIL_DELAY)
+    results = asyncio.run(fetch_static_pages(project_links, check=None, frontier=frontier))
+    websites = {}
+    for link, (page, _) in results.items():
+        website = find_website_link(page['html']) if page is not None else None
+        websites[link] = urljoin(link, website) if website else None
+    return websites
+
+def fetch_website_browser(project_link, pool):
+    with pool.driver() as driver, span('project_page', url=project_link) as fields:
+        driver.get(project_link)
+        try:
+            globe_icon = WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "i.bi.bi-globe"))
+            )
+        except TimeoutException:
+            fields['outcome'] = 'no website'
+            return None
+        return globe_icon.find_element(By.XPATH, "..").get_attribute('href')
+
+def harvest_websites(listing, checkpoint=DETAILS_CHECKPOINT, workers=MAX_WORKERS):
+    """Resolve the website of every listed project, checkpointing each one as it is found.
+
+    Pages without a website are not checkpointed, so they are tried again on the next run.
+    """
+    done = {row['Project link']: row for row in read_checkpoint(checkpoint) if row.get('Website')}
+    pending = [row['Project link'] for row in listing if row['Project link'] not in done]
+    logging.info(f"{len(done)} project pages already harvested, {len(pending)} to fetch")
+    if not pending:
+        return done
+
+    static_websites = fetch_website_static(pending)
+    browser_links = []
+    for link in pending:
+        if static_websites.get(link):
+            done[link] = {'Project link': link, 'Website': static_websites[link], 'Tier': 'http'}
+            append_checkpoint(checkpoint, done[link])
+        else:
+            browser_links.append(link)
+    logging.info(f"{len(pending) - len(browser_links)} websites found over HTTP, "
+                 f"{len(browser_links)} project pages need the browser")
+
+    if browser_links:
+        with DriverPool(size=workers) as pool, ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_link = {executor.submit(fetch_website_browser, link, pool): link for link in browser_links}
+            for future in tqdm(as_completed(future_to_link), total=len(future_to_link),
+                               desc="Fetching project pages", ncols=100):
+                link = future_to_link[future]
+                try:
+                    website = future.result()
+                except WebDriverException as e:
+                    logging.error(f"Error loading project page {link}: {str(e)}")
+                    continue  # Not checkpointed, so the next run retries it
+                done[link] = {'Project link': link, 'Website': website, 'Tier': 'browser'}
+                if website is None:
+                    logging.warning(f"Could not find website for project page: {link}")
+                else:
+                    append_checkpoint(checkpoint, done[link])
+
+    return done
+
+def scrape_projects(url, refresh_listing=False, workers=MAX_WORKERS):
+    os.makedirs(os.path.dirname(LISTING_CHECKPOINT), exist_ok=True)
+
+    listing = [] if refresh_listing else read_checkpoint(LISTING_CHECKPOINT)
+    if refresh_listing and os.path.exists(DETAILS_CHECKPOINT):
+        # Websites may have changed since they were harvested, so every project page is fetched again
+        os.remove(DETAILS_CHECKPOINT)
+    if listing:
+        logging.info(f"Reusing {len(listing)} listed projects from {LISTING_CHECKPOINT}")
+    else:
+        listing, complete = collect_listing(url)
+        if complete:
+            # Written under a temporary name so an interrupted write never looks like a finished listing
+            temp_path = LISTING_CHECKPOINT + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for row in listing:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            os.replace(temp_path, LISTING_CHECKPOINT)
+        else:
+            logging.warning(f"Listing stopped early after {len(listing)} projects; not checkpointing it, "
+                            f"so the next run walks the listing again")
+
+    websites = harvest_websites(listing, workers=workers)
+    projects = [dict(row, Website=websites.get(row['Project link'], {}).get('Website')) for row in listing]
     logging.info(f"Total projects scraped: {len(projects)}")
     return projects
 
@@ -120,13 +248,17 @@ def save_to_csv(projects, filename):
     with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
         fieldnames = ['Project image', 'Project name', 'Project link', 'Description', 'Website']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
+
         writer.writeheader()
         for project in projects:
             writer.writerow(project)
 
 if __name__ == "__main__":
-    url = "https://carboncopy.news/projects"
-    projects = scrape_projects(url)
-    save_to_csv(projects, 'resources/carboncopy_projects.csv')
-    print(f"\nScraped {len(projects)} projects and saved to carboncopy_projects.csv")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Export the projects listed on carboncopy.news")
+    parser.add_argument('--refresh-listing', action='store_true', help='Walk the listing and fetch every project page again instead of reusing the checkpoints')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Chrome drivers for pages that need the browser')
+    args = parser.parse_args()
+
+    projects = scrape_projects(CARBONCOPY_URL, refresh_listing=args.refresh_listing, workers=args.workers)
+    save_to_csv(projects, CARBONCOPY_CSV)
+    print(f"\nScraped {len(projects)} projects and saved to carboncopy_projects.csv")
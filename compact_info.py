@@ -0,0 +1,147 @@
+"""Shrink scraped info files before they are sent to the LLM.
+
+Reads info/*.txt and writes info_compact/*.txt with repeated lines removed,
+boilerplate shared across many sites (cookie banners, footers, navigation)
+stripped and the result truncated to a token budget. Tokens are counted with
+tiktoken when it is installed, otherwise estimated at ~4 characters per token.
+A per-project report of tokens saved goes to resources/compaction_report.csv.
+"""
+import argparse
+import csv
+import glob
+import os
+import re
+from collections import Counter
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+INFO_DIR = 'info'
+COMPACT_DIR = 'info_compact'
+REPORT_CSV = 'resources/compaction_report.csv'
+TOKEN_BUDGET = 1500
+MODEL = "gpt-4o-mini"
+# A line is boilerplate when it shows up on at least this many sites and this share of all sites
+BOILERPLATE_MIN_SITES = 5
+BOILERPLATE_MIN_SHARE = 0.02
+
+SECTION_HEADINGS = ('Headers:', 'Main Content:', 'About Section:', 'Mission/Vision:')
+METADATA_PREFIXES = ('Project Name:', 'Website:', 'Meta Description:', 'Page Title:')
+
+
+def get_token_counter(model=MODEL):
+    """Return a function counting tokens the way the model's tokenizer does (or an estimate)."""
+    if tiktoken is None:
+        return lambda text: len(text) // 4 + 1
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def normalize_line(line):
+    return re.sub(r'\s+', ' ', line).strip().lower()
+
+
+def is_structural(line):
+    """Headings and metadata lines are never deduplicated or treated as boilerplate."""
+    stripped = line.strip()
+    return stripped in SECTION_HEADINGS or stripped.startswith(METADATA_PREFIXES)
+
+
+def boilerplate_lines(texts, min_sites=BOILERPLATE_MIN_SITES, min_share=BOILERPLATE_MIN_SHARE):
+    """Normalized lines that appear on enough different sites to be template text."""
+    document_frequency = Counter()
+    for text in texts:
+        document_frequency.update({normalize_line(line) for line in text.splitlines()
+                                   if line.strip() and not is_structural(line)})
+    threshold = max(min_sites, min_share * len(texts))
+    return {line for line, count in document_frequency.items() if count >= threshold}
+
+
+def compact_text(text, boilerplate, count_tokens, token_budget=TOKEN_BUDGET):
+    """Return (compacted text, stats) for one info file."""
+    stats = {'Duplicate Lines': 0, 'Boilerplate Lines': 0, 'Truncated Lines': 0}
+    seen = set()
+    kept = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if is_structural(line):
+            kept.append(line.strip())
+            continue
+        normalized = normalize_line(line)
+        if normalized in seen:
+            stats['Duplicate Lines'] += 1
+            continue
+        seen.add(normalized)
+        if normalized in boilerplate:
+            stats['Boilerplate Lines'] += 1
+            continue
+        kept.append(line.strip())
+
+    # Drop section headings left without any content
+    kept = [line for i, line in enumerate(kept)
+            if line not in SECTION_HEADINGS or (i + 1 < len(kept) and kept[i + 1] not in SECTION_HEADINGS)]
+
+    output, used = [], 0
+    for i, line in enumerate(kept):
+        tokens = count_tokens(line + "\n")
+        if used + tokens > token_budget:
+            stats['Truncated Lines'] = len(kept) - i
+            break
+        output.append(line)
+        used += tokens
+
+    compacted = "\n".join(output) + "\n"
+    stats['Tokens Before'] = count_tokens(text)
+    stats['Tokens After'] = count_tokens(compacted)
+    stats['Tokens Saved'] = stats['Tokens Before'] - stats['Tokens After']
+    return compacted, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact info/*.txt into info_compact/*.txt for summarization")
+    parser.add_argument('--token-budget', type=int, default=TOKEN_BUDGET, help='Maximum tokens kept per project')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(INFO_DIR, '*.txt')))
+    texts = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            texts[path] = f.read()
+
+    boilerplate = boilerplate_lines(list(texts.values()))
+    count_tokens = get_token_counter()
+    if tiktoken is None:
+        print("tiktoken is not installed, estimating tokens from character counts")
+
+    os.makedirs(COMPACT_DIR, exist_ok=True)
+    os.makedirs(os.path.dirname(REPORT_CSV), exist_ok=True)
+
+    total_before = total_after = 0
+    with open(REPORT_CSV, 'w', newline='', encoding='utf-8') as report_file:
+        fieldnames = ['File', 'Tokens Before', 'Tokens After', 'Tokens Saved',
+                      'Duplicate Lines', 'Boilerplate Lines', 'Truncated Lines']
+        writer = csv.DictWriter(report_file, fieldnames=fieldnames)
+        writer.writeheader()
+
+        for path, text in texts.items():
+            compacted, stats = compact_text(text, boilerplate, count_tokens, args.token_budget)
+            with open(os.path.join(COMPACT_DIR, os.path.basename(path)), 'w', encoding='utf-8') as f:
+                f.write(compacted)
+            writer.writerow(dict(stats, File=os.path.basename(path)))
+            total_before += stats['Tokens Before']
+            total_after += stats['Tokens After']
+
+    saved = total_before - total_after
+    share = saved / total_before if total_before else 0
+    print(f"Compacted {len(texts)} files: {total_before} -> {total_after} tokens ({saved} saved, {share:.0%}), "
+          f"{len(boilerplate)} boilerplate lines found. Report saved to {REPORT_CSV}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,98 +1,364 @@
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-import time
+import argparse
+import asyncio
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urljoin, urlsplit
+
+import httpx
+
+from driver_pool import DEFAULT_USER_AGENT, DriverPool
+from crawl import visit_site, setup_wait_logging
+from static_fetch import extract_page, fetch_static_pages, fetch_tiered, write_fetch_stats
+from frontier import add_frontier_arguments, frontier_from_args, registered_domain, state_priority
+from resource_policy import add_resource_arguments
+from state_store import StateStore
+from csv_writer import QueuedCsvWriter
+from telemetry import span
+from work_queue import WorkQueue, add_worker_arguments, run_worker
+
+MAX_WORKERS = 5
+QUEUE = "contacts"
+
+CONTACT_FIELDS = ["Project Name", "Email", "Socials", "Platforms", "Error"]
+SOCIAL_PLATFORMS = {
+    'twitter': ('twitter.com', 'x.com'),
+    'facebook': ('facebook.com', 'fb.com'),
+    'instagram': ('instagram.com',),
+    'linkedin': ('linkedin.com',),
+    'youtube': ('youtube.com', 'youtu.be'),
+    'github': ('github.com',),
+    'telegram': ('t.me', 'telegram.me'),
+    'discord': ('discord.gg', 'discord.com', 'discordapp.com'),
+    'medium': ('medium.com',),
+    'reddit': ('reddit.com',),
+    'tiktok': ('tiktok.com',),
+}
+# Share buttons point at the platform but aren't the project's own account
+SHARE_PATH = re.compile(r'^/(intent|share|sharer|sharing|home\?status)', re.I)
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+CFEMAIL_PATTERN = re.compile(r'data-cfemail="([0-9a-fA-F]+)"')
+CONTACT_PAGE_PATTERN = re.compile(r'/(contact|about|team|impressum|imprint)', re.I)
+MAX_CONTACT_PAGES = 2
+# Seconds allowed for following a site's contact/about links
+CONTACT_PAGE_BUDGET = 8
+# Threads fetching the contact/about pages of sites loaded in Chrome
+FOLLOW_UP_WORKERS = 8
+
+# Reads every link, Cloudflare-protected email and the visible text in one round trip
+PAGE_CONTACTS_SCRIPT = """
+return {
+    hrefs: Array.from(document.querySelectorAll('a[href]')).map(function (a) { return a.href; }),
+    cfemails: Array.from(document.querySelectorAll('[data-cfemail]')).map(function (e) { return e.getAttribute('data-cfemail'); }),
+    text: document.body ? document.body.innerText : ''
+};
+"""
 
-def scrape_contact_info(index, website, project_name):
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--start-maximized")
-    chrome_options.add_argument("--disable-notifications")
-    chrome_options.add_argument("--disable-popup-blocking")
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--disable-webgl")
-    chrome_options.add_argument("--disable-extensions")
-    chrome_options.add_argument("--log-level=3")
-    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    chrome_options.add_argument("user-agent=Mozilla/5.0")
-
-    driver = webdriver.Chrome(options=chrome_options)
+def find_emails(text):
+    """Extract emails from page text and filter out image filenames."""
+    raw_emails = set(EMAIL_PATTERN.findall(text))
+    return {email for email in raw_emails if not re.search(r'\d+x\d+|\.(png|jpg|jpeg|gif|bmp|svg|webp)$', email, re.I)}
 
+def decode_cfemail(encoded):
+    """Decode an email obfuscated by Cloudflare's email protection."""
     try:
-        driver.get(website)
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-
-        # Scroll to ensure full content is loaded
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(5)
-
-        # Extract emails and filter out image filenames
-        raw_emails = set(re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', driver.page_source))
-        valid_emails = {email for email in raw_emails if not re.search(r'\d+x\d+|\.(png|jpg|jpeg|gif|bmp|svg)$', email)}
-        email = '; '.join(valid_emails) if valid_emails else None
-
-        # Extract social media links
-        social_links = driver.find_elements(By.XPATH, "//a[contains(@href, 'facebook.com') or "
-                                                      "contains(@href, 'twitter.com') or "
-                                                      "contains(@href, 'instagram.com') or "
-                                                      "contains(@href, 'linkedin.com') or "
-                                                      "contains(@href, 'youtube.com')]")
-        social_sites = [link.get_attribute('href') for link in social_links]
-        socials_string = '; '.join(social_sites)
-
-        return {
-            "Project Name": project_name,
-            "Email": email,
-            "Socials": socials_string
-        }
-
-    except Exception as e:
-        return {
-            "Project Name": project_name,
-            "Email": None,
-            "Socials": '',
-            "Error": str(e)
-        }
+        key = int(encoded[:2], 16)
+        return ''.join(chr(int(encoded[i:i + 2], 16) ^ key) for i in range(2, len(encoded), 2))
+    except ValueError:
+        return ''
 
-    finally:
-        driver.quit()
+def social_platform(url):
+    """Platform name for a link to a social profile, or None."""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    host = re.sub(r'^(www|m|mobile)\.', '', host)
+    if SHARE_PATH.match(parts.path):
+        return None
+    for platform, domains in SOCIAL_PLATFORMS.items():
+        if any(host == domain or host.endswith('.' + domain) for domain in domains):
+            return platform
+    return None
+
+def collect_contacts(hrefs, text, cfemails=()):
+    """Return (emails, {social url: platform}) from a page's links, visible text and Cloudflare emails."""
+    emails = set()
+    socials = {}
+    for href in hrefs:
+        if href.lower().startswith('mailto:'):
+            address = unquote(href[len('mailto:'):].split('?', 1)[0])
+            emails.update(part.strip() for part in address.split(','))
+        elif '/cdn-cgi/l/email-protection#' in href:
+            emails.add(decode_cfemail(href.split('#', 1)[1]))
+        else:
+            platform = social_platform(href)
+            if platform:
+                socials.setdefault(href.rstrip('/'), platform)
+    emails.update(decode_cfemail(encoded) for encoded in cfemails)
+    emails.update(find_emails(text))
+    return {email for email in emails if EMAIL_PATTERN.fullmatch(email)}, socials
+
+def contacts_from_html(html, base_url):
+    page = extract_page(html)
+    hrefs = [urljoin(base_url, href) for href in page['links']]
+    return collect_contacts(hrefs, page['text'], CFEMAIL_PATTERN.findall(html))
+
+def contact_page_links(hrefs, website):
+    """Up to MAX_CONTACT_PAGES same-site links to contact/about pages."""
+    domain = registered_domain(website)
+    links = []
+    for href in hrefs:
+        url = urljoin(website, href).split('#', 1)[0]
+        if (url.startswith('http') and url.rstrip('/') != website.rstrip('/') and url not in links
+                and registered_domain(url) == domain and CONTACT_PAGE_PATTERN.search(urlsplit(url).path)):
+            links.append(url)
+            if len(links) == MAX_CONTACT_PAGES:
+                break
+    return links
+
+def fetch_contact_pages(urls, frontier=None, budget=CONTACT_PAGE_BUDGET):
+    """Fetch contact/about pages one after another until the time budget runs out.
+
+    With a frontier, each request waits for a slot of its domain, so the
+    per-host limit and crawl delay also apply to these pages.
+    """
+    deadline = time.monotonic() + budget
+    pages = {}
+    with httpx.Client(headers={"User-Agent": DEFAULT_USER_AGENT}, follow_redirects=True) as client:
+        for url in urls:
+            if frontier is not None and not frontier.acquire(url, timeout=deadline - time.monotonic()):
+                break
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                with span('contact_page', url=url) as fields:
+                    response = client.get(url, timeout=remaining)
+                    fields['status'] = response.status_code
+            except httpx.HTTPError:
+                continue
+            finally:
+                if frontier is not None:
+                    frontier.done(url)
+            if response.status_code < 400 and 'html' in response.headers.get('content-type', ''):
+                pages[url] = response.text
+    return pages
+
+def build_contact_row(project_name, emails, socials):
+    return {
+        "Project Name": project_name,
+        "Email": '; '.join(sorted(emails)) if emails else None,
+        "Socials": '; '.join(socials),
+        "Platforms": '; '.join(sorted(set(socials.values())))
+    }
+
+def merge_contacts(contacts, extra_pages):
+    """Add the contacts found on followed pages to (emails, socials)."""
+    emails, socials = contacts
+    for url, html in extra_pages.items():
+        page_emails, page_socials = contacts_from_html(html, url)
+        emails |= page_emails
+        for link, platform in page_socials.items():
+            socials.setdefault(link, platform)
+    return emails, socials
+
+def extract_page_contacts(driver, website, project_name):
+    """Collect emails and social media links from an already-loaded page.
+
+    Returns (contacts, contact/about links to follow). The links are fetched by
+    ContactFollowUps once the driver is back in the pool.
+    """
+    found = driver.execute_script(PAGE_CONTACTS_SCRIPT)
+    contacts = collect_contacts(found['hrefs'], found['text'], found['cfemails'])
+    return contacts, contact_page_links(found['hrefs'], driver.current_url or website)
+
+def extract_static_contact_info(page, website, project_name, extra_pages=None):
+    """Collect emails and social media links from a page fetched over plain HTTP."""
+    hrefs = [urljoin(website, href) for href in page['links']]
+    contacts = collect_contacts(hrefs, page['text'], CFEMAIL_PATTERN.findall(page['html']))
+    return build_contact_row(project_name, *merge_contacts(contacts, extra_pages or {}))
+
+def fetch_static_contact_pages(static_pages, frontier):
+    """Fetch the contact/about pages of every statically scraped site in one batch.
+
+    Returns {website: {url: html}}.
+    """
+    links = {website: contact_page_links(page['links'], website) for website, page in static_pages.items()}
+    urls = [url for website_links in links.values() for url in website_links]
+    results = asyncio.run(fetch_static_pages(urls, timeout=CONTACT_PAGE_BUDGET, check=None, frontier=frontier))
+    return {website: {url: results[url][0]['html'] for url in website_links
+                      if url in results and results[url][0] is not None}
+            for website, website_links in links.items()}
+
+def error_row(project_name, error):
+    return {
+        "Project Name": project_name,
+        "Email": None,
+        "Socials": '',
+        "Error": str(error)
+    }
+
+def scrape_contact_info(index, website, project_name, pool):
+    """Contacts and links to follow of a page loaded in Chrome, or an error row."""
+    result = visit_site(pool, website, project_name, {"contacts": extract_page_contacts})["contacts"]
+    if isinstance(result, Exception):
+        return error_row(project_name, result)
+    return result
+
+class ContactFollowUps:
+    """Fetches the contact/about pages found by the browser on a few threads, without holding a driver.
+
+    Requests go through the frontier's per-host slots. emit(row) is called from
+    those threads once a project's pages are in.
+    """
+
+    def __init__(self, frontier, emit, workers=FOLLOW_UP_WORKERS):
+        self.frontier = frontier
+        self.emit = emit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='contact-pages')
 
+    def submit(self, project_name, found):
+        contacts, links = found
 
-df = pd.read_csv('resources/mixed_data.csv')
+        def finish(future):
+            try:
+                self.emit(build_contact_row(project_name, *merge_contacts(contacts, future.result())))
+            except Exception as e:
+                self.emit(error_row(project_name, e))
 
-# Ensure output directory exists
-os.makedirs('resources', exist_ok=True)
+        self._executor.submit(fetch_contact_pages, links, self.frontier).add_done_callback(finish)
 
-# Filter out rows with missing Website or Name
-valid_rows = df.dropna(subset=['Website', 'Name'])
+    def close(self):
+        """Wait until every submitted project has been emitted."""
+        self._executor.shutdown(wait=True)
 
-# Output CSV setup
-output_csv = 'resources/contact_info.csv'
+    def __enter__(self):
+        return self
 
-# Open the CSV file in append mode and write the headers if file doesn't exist
-if not os.path.exists(output_csv):
-    with open(output_csv, mode='w', newline='', encoding='utf-8') as f:
-        f.write("Project Name,Email,Socials\n")
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
-with ThreadPoolExecutor(max_workers=5) as executor:
-    future_to_website = {executor.submit(scrape_contact_info, index, row['Website'], row['Name']): row['Website']
-                         for index, row in valid_rows.iterrows()}
+def open_contact_writer(output_csv, restart=False):
+    """Start the contacts CSV writer; returns (writer, names of projects already exported).
 
-    with tqdm(total=len(future_to_website), desc="Scraping contact info", 
-              bar_format="{l_bar}\033[95m{bar}\033[0m{r_bar}") as pbar:
-        for future in as_completed(future_to_website):
-            result = future.result()
+    Rows of projects that failed last time are dropped so they are retried.
+    """
+    if restart and os.path.exists(output_csv):
+        os.remove(output_csv)
+    writer = QueuedCsvWriter(output_csv, CONTACT_FIELDS)
+    exported = writer.resume("Project Name", drop=lambda row: row.get("Error"))
+    return writer.start(), exported
+
+
+def scrape_rows(valid_rows, frontier, pool, args, emit, stats_csv=None):
+    """Scrape the contacts of every row, over HTTP when possible, handing each row to emit()."""
+    # Order by when the info stage last crawled each project
+    with StateStore() as store:
+        priorities = {row['Website']: state_priority(store, "info", row['Name'], args.order) for _, row in valid_rows.iterrows()}
+
+    # Fast path: sites whose links are in the initial HTML don't need Chrome
+    static_pages, browser_websites, stats = fetch_tiered(valid_rows['Website'], frontier=frontier, priority=priorities.get)
+    if stats_csv is not None:
+        write_fetch_stats(stats, stats_csv)
+    print(f"{len(static_pages)} sites scraped over HTTP, {len(browser_websites)} need a browser")
+
+    # Follow the contact/about links of the static sites in one more batch
+    extra_pages = fetch_static_contact_pages(static_pages, frontier)
+    for _, row in valid_rows[valid_rows['Website'].isin(static_pages)].iterrows():
+        emit(extract_static_contact_info(static_pages[row['Website']], row['Website'], row['Name'],
+                                         extra_pages.get(row['Website'])))
+
+    browser_rows = valid_rows[valid_rows['Website'].isin(browser_websites)]
+
+    for index, row in browser_rows.iterrows():
+        frontier.add(row['Website'], item=(index, row['Website'], row['Name']), priority=priorities[row['Website']])
+
+    with tqdm(total=len(browser_rows), desc="Scraping contact info",
+              bar_format="{l_bar}\033[95m{bar}\033[0m{r_bar}") as pbar, ContactFollowUps(frontier, emit) as follow_ups:
+        for (_, _, project_name), result in frontier.run(lambda item: scrape_contact_info(*item, pool), args.workers):
+            if isinstance(result, dict):
+                emit(result)
+            else:
+                follow_ups.submit(project_name, result)
 
-            # Write the result directly to the CSV file row-by-row
-            with open(output_csv, mode='a', newline='', encoding='utf-8') as f:
-                f.write(f"{result['Project Name']},{result['Email']},{result['Socials']}\n")
-            
             pbar.update(1)
+
+def collect_queue_results(output_csv):
+    """Merge the rows committed to the work queue by every worker into the contacts CSV.
+
+    Rows already in the file for the same projects are replaced; the others,
+    e.g. from runs without --worker, are kept. Returns the number of rows merged.
+    """
+    rows = []
+    with WorkQueue() as work_queue:
+        if not work_queue.drained(QUEUE):
+            print(f"Queue not finished yet ({work_queue.counts(QUEUE)}); collect again once the workers are done")
+        for project_name, status, result, error in work_queue.finished(QUEUE):
+            rows.append(result if status == 'done' else {"Project Name": project_name, "Socials": '', "Error": error})
+    names = {row["Project Name"] for row in rows}
+    writer = QueuedCsvWriter(output_csv, CONTACT_FIELDS)
+    writer.resume("Project Name", drop=lambda row: row.get("Project Name") in names)
+    with writer:
+        for row in rows:
+            writer.write(row)
+    return writer.rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape contact emails and social links into resources/contact_info.csv")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Number of concurrent Chrome drivers')
+    parser.add_argument('--restart', action='store_true', help='Start a new contacts CSV instead of resuming the existing one')
+    add_frontier_arguments(parser)
+    add_worker_arguments(parser)
+    parser.add_argument('--collect', action='store_true',
+                        help='Merge the rows committed by queue workers into the contacts CSV, without scraping')
+    add_resource_arguments(parser)
+    args = parser.parse_args()
+
+    setup_wait_logging()
+
+    # Ensure output directory exists
+    os.makedirs('resources', exist_ok=True)
+
+    # Output CSV setup
+    output_csv = 'resources/contact_info.csv'
+    frontier = frontier_from_args(args)
+
+    if args.collect:
+        print(f"{collect_queue_results(output_csv)} contact rows from the work queue merged into {output_csv}")
+        return
+
+    if args.worker:
+        # Rows are committed to the queue with their task; only `--collect` writes them to the CSV, so the file has one writer
+        def scrape_tasks(tasks):
+            rows = []
+            scrape_rows(pd.DataFrame([task.payload for task in tasks]), frontier, pool, args, rows.append)
+            return {row["Project Name"]: (False, row["Error"]) if row.get("Error") else (True, row) for row in rows}
+
+        with DriverPool(size=args.workers, policy=args.policy, max_rss_mb=args.max_chrome_mb) as pool:
+            run_worker(QUEUE, scrape_tasks, args)
+        print(f"Run `python contact_export.py --collect` once every worker is done to write {output_csv}")
+        return
+
+    df = pd.read_csv('resources/mixed_data.csv')
+
+    # Filter out rows with missing Website or Name
+    valid_rows = df.dropna(subset=['Website', 'Name'])
+
+    # One writer thread owns the CSV; projects already in it are skipped
+    writer, exported = open_contact_writer(output_csv, restart=args.restart)
+    print(f"Skipping {valid_rows['Name'].isin(exported).sum()} projects already in {output_csv}")
+    valid_rows = valid_rows[~valid_rows['Name'].isin(exported)]
+
+    try:
+        with DriverPool(size=args.workers, policy=args.policy, max_rss_mb=args.max_chrome_mb) as pool:
+            scrape_rows(valid_rows, frontier, pool, args, writer.write, 'resources/contact_fetch_stats.csv')
+    finally:
+        # Flush whatever is still queued, even when interrupted
+        writer.close()
+    print(f"{writer.rows_written} contact rows written to {output_csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Load every project website once and run several extractors on the rendered page.
+
+Each extractor is a plain function `extractor(driver, website, project_name)`
+that reads from the already-loaded page. `info_export`, `contact_export` and
+`image_export` provide the extractors and reuse `visit_site` for their own
+single-purpose runs.
+"""
+import pandas as pd
+from tqdm import tqdm
+import argparse
+import logging
+import os
+
+from driver_pool import DriverPool
+from frontier import add_frontier_arguments, frontier_from_args, state_priority
+from readiness import reset_network_log, wait_for_page
+from resource_policy import TrafficCounter, add_resource_arguments, apply_policy, driver_rss_mb
+from state_store import StateStore
+from telemetry import record, span
+
+MAX_WORKERS = 5
+PAGE_WAIT_LOG = 'resources/page_waits.log'
+
+def load_page(driver, website, policy=None):
+    """Navigate to the website and wait until it has settled, lazy-loaded content included.
+
+    With a resource policy, the resources it blocks aren't downloaded and the
+    page's traffic and the driver's memory use are recorded.
+    """
+    if policy is not None:
+        apply_policy(driver, policy)
+    traffic = TrafficCounter()
+    reset_network_log(driver)
+    with span('navigate', url=website):
+        driver.get(website)
+    with span('wait', url=website):
+        waits = wait_for_page(driver, website, traffic=traffic)
+    if policy is not None:
+        record('page_resources', url=website, policy=policy, requests=traffic.requests, bytes=traffic.bytes,
+               blocked=traffic.blocked, bytes_saved=traffic.bytes_saved(), rss_mb=driver_rss_mb(driver))
+    return waits
+
+def visit_site(pool, website, project_name, extractors):
+    """Load the website once and run every extractor on it.
+
+    Returns a dict mapping extractor name to its result, or to the exception
+    it raised. A failed page load is reported for every extractor.
+    """
+    results = {}
+    try:
+        with pool.driver() as driver:
+            load_page(driver, website, pool.policy)
+            for name, extractor in extractors.items():
+                try:
+                    with span('extract', url=website, extractor=name):
+                        results[name] = extractor(driver, website, project_name)
+                except Exception as e:
+                    results[name] = e
+    except Exception as e:
+        for name in extractors:
+            results.setdefault(name, e)
+    return results
+
+def setup_wait_logging():
+    """Log the per-page readiness waits to a file so tqdm output stays readable."""
+    os.makedirs(os.path.dirname(PAGE_WAIT_LOG), exist_ok=True)
+    logging.basicConfig(filename=PAGE_WAIT_LOG, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def default_extractors():
+    """The info, contacts and screenshot extractors, in the order they must run.
+
+    The screenshot captures beyond the viewport, which can re-layout the
+    page, so it always runs last. It only returns the captured tiles; they are
+    encoded in image_export's encoder processes.
+    """
+    from info_export import extract_project_info
+    from contact_export import extract_page_contacts
+    from image_export import capture_screenshot_tiles
+
+    return {
+        "info": extract_project_info,
+        "contacts": extract_page_contacts,
+        "screenshot": capture_screenshot_tiles,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl every project website once and run the selected extractors.")
+    parser.add_argument("--extractors", nargs="+", choices=["info", "contacts", "screenshot"],
+                        default=["info", "contacts", "screenshot"], help="Extractors to run on each page")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Number of concurrent Chrome drivers")
+    add_frontier_arguments(parser)
+    # Screenshots need every resource; text and contacts don't
+    add_resource_arguments(parser, policy=None)
+    args = parser.parse_args()
+    policy = args.policy or ('full' if 'screenshot' in args.extractors else 'text')
+
+    from concurrent.futures import ProcessPoolExecutor
+    from contextlib import ExitStack
+    from contact_export import ContactFollowUps, error_row, open_contact_writer
+    from image_export import ENCODE_WORKERS, REPORT_CSV, ScreenshotEncoder, load_parked_hashes, open_screenshot_report
+
+    setup_wait_logging()
+
+    extractors = {name: extractor for name, extractor in default_extractors().items() if name in args.extractors}
+
+    df = pd.read_csv('resources/mixed_data.csv')
+
+    os.makedirs('info', exist_ok=True)
+    os.makedirs('screenshots/thumbs', exist_ok=True)
+
+    # Filter out rows with missing Website or Name
+    valid_rows = df.dropna(subset=['Website', 'Name'])
+
+    output_csv = 'resources/contact_info.csv'
+    writer, exported = open_contact_writer(output_csv) if "contacts" in extractors else (None, set())
+
+    # Order by when the info stage last crawled each project
+    frontier = frontier_from_args(args)
+    with StateStore() as store:
+        for _, row in valid_rows.iterrows():
+            frontier.add(row['Website'], item=(row['Website'], row['Name']),
+                         priority=state_priority(store, "info", row['Name'], args.order))
+
+    with ExitStack() as stack:
+        pool = stack.enter_context(DriverPool(size=args.workers, policy=policy, max_rss_mb=args.max_chrome_mb))
+        follow_ups = None
+        if "contacts" in extractors:
+            def emit(row):
+                # Projects already in the CSV from an earlier run keep their row
+                if row["Project Name"] not in exported:
+                    writer.write(row)
+
+            follow_ups = stack.enter_context(ContactFollowUps(frontier, emit))
+        encoder = None
+        if "screenshot" in extractors:
+            # Same path as image_export: encoded in other processes, hashed against the last capture and parked check
+            encoders = stack.enter_context(ProcessPoolExecutor(max_workers=ENCODE_WORKERS))
+            report = open_screenshot_report()
+            stack.callback(report.close)
+            encoder = ScreenshotEncoder(encoders, 2 * ENCODE_WORKERS, stack.enter_context(StateStore()), report,
+                                        load_parked_hashes())
+        with tqdm(total=len(valid_rows), desc="Crawling projects",
+                  bar_format="{l_bar}\033[96m{bar}\033[0m{r_bar}") as pbar:
+            for (website, project_name), results in frontier.run(
+                    lambda item: visit_site(pool, *item, extractors), args.workers):
+                if follow_ups is not None:
+                    contacts = results["contacts"]
+                    if isinstance(contacts, Exception):
+                        emit(error_row(project_name, contacts))
+                    else:
+                        follow_ups.submit(project_name, contacts)
+
+                if encoder is not None:
+                    screenshot = results["screenshot"]
+                    if isinstance(screenshot, Exception):
+                        encoder.failed(project_name, website, screenshot)
+                    else:
+                        encoder.submit(*screenshot)
+
+                for name, result in results.items():
+                    if isinstance(result, Exception):
+                        tqdm.write(f"{name} failed for {project_name}: {result}")
+
+                pbar.update(1)
+
+        if encoder is not None:
+            encoder.flush()
+            print(encoder.summary(REPORT_CSV))
+
+    if writer is not None:
+        writer.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Single-threaded, crash-safe CSV output for the exporters.
+
+Worker threads hand rows to `QueuedCsvWriter.write`, which only puts them on a
+queue. One writer thread owns the file. It writes rows in batches with the csv
+module (so commas and quotes in values are escaped) and flushes and fsyncs
+after each batch. A truncated last line left by a crash is dropped when the
+file is reopened, and `resume` reports which keys are already present so a
+rerun can skip them.
+"""
+import csv
+import os
+import queue
+import threading
+import time
+
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 1.0
+
+_STOP = object()
+
+
+class QueuedCsvWriter:
+    def __init__(self, path, fieldnames, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = None
+
+    def resume(self, key, drop=None):
+        """Prepare an existing file for appending and return the set of `key` values already in it.
+
+        Rows for which drop(row) is true (e.g. failed attempts) are removed so
+        they can be written again. The file is rewritten, atomically, when rows
+        are dropped, the header differs or the last line was cut off.
+        """
+        if not os.path.exists(self.path):
+            return set()
+
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            content = f.read()
+        complete = content.endswith('\n') or not content
+        reader = csv.DictReader(content.splitlines(keepends=True))
+        rows = list(reader)
+        if not complete and rows:
+            rows.pop()  # Partial row from an interrupted write
+
+        kept = [row for row in rows if drop is None or not drop(row)]
+        if len(kept) != len(rows) or not complete or reader.fieldnames != self.fieldnames:
+            temp_path = f'{self.path}.tmp'
+            with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fieldnames, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(kept)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        return {row.get(key) for row in kept}
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='csv-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def write(self, row):
+        """Queue a row; safe to call from any thread."""
+        if self._error is not None:
+            raise self._error
+        self._queue.put(row)
+
+    def _run(self):
+        try:
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fieldnames, extrasaction='ignore')
+                if new_file:
+                    writer.writeheader()
+                    f.flush()
+                stopping = False
+                while not stopping:
+                    batch = []
+                    deadline = time.monotonic() + self.flush_interval
+                    while len(batch) < self.batch_size:
+                        try:
+                            row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                        except queue.Empty:
+                            break
+                        if row is _STOP:
+                            stopping = True
+                            break
+                        batch.append(row)
+                    if batch:
+                        writer.writerows(batch)
+                        f.flush()
+                        os.fsync(f.fileno())
+                        self.rows_written += len(batch)
+        except Exception as e:
+            # Surfaced to the producers on their next write() and on close()
+            self._error = e
+
+    def close(self):
+        """Write everything still queued and wait for the writer thread to finish."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
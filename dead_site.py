@@ -0,0 +1,330 @@
+"""Cheap local check for dead sites, run before anything is sent to the LLM.
+
+A good share of the scraped sites are 404s, parked or for-sale domains, bot
+challenges or empty pages, which the summary prompt turns into "NO INFO" after
+a full API call. Rules catch the obvious cases. A TF-IDF + logistic regression
+model, trained on past summary results (no_info = dead, done = alive), scores
+the rest. gen_summary.py skips a site when a rule fires or the model's
+probability reaches the threshold picked here.
+
+`python dead_site.py` cross-validates rules and model against the labels in
+the state store, writes the precision/recall report, trains the final model
+on every label and lists the verdict for every project.
+"""
+import argparse
+import csv
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from compact_info import INFO_DIR
+from state_store import StateStore
+
+SUMMARY_STAGE = "summary"
+MODEL_PATH = 'resources/dead_site_model.npz'
+REPORT_CSV = 'resources/dead_site_report.csv'
+PREDICTIONS_CSV = 'resources/dead_sites.csv'
+
+# The model only skips a site when its cross-validated precision is at least this high
+TARGET_PRECISION = 0.98
+# ... and never below this probability, where the extra skips are mostly mistakes
+MIN_THRESHOLD = 0.5
+FOLDS = 5
+MIN_LABELS = 50
+MAX_FEATURES = 20000
+MIN_DF = 2
+EPOCHS = 300
+LEARNING_RATE = 0.05
+L2 = 1e-4
+
+# Below this many words a page has nothing to summarize; below SHORT_PAGE_WORDS the
+# error and parking phrases are trusted (a real site can mention "404" or "for sale")
+MIN_CONTENT_WORDS = 12
+SHORT_PAGE_WORDS = 150
+
+METADATA_PREFIXES = ('Project Name:', 'Website:')
+ERROR_PATTERN = re.compile(
+    r"\b(?:404|403 forbidden|500 internal server error|502 bad gateway|503 service (?:temporarily )?unavailable|"
+    r"page not found|not found|site not found|account (?:has been )?suspended|website (?:has )?expired|"
+    r"this site can.t be reached|web server is down|invalid ssl certificate|origin dns error)\b", re.I)
+PARKED_PATTERN = re.compile(
+    r"(?:domain (?:name )?(?:is |may be )?for sale|buy this domain|this domain is parked|domain parking|"
+    r"parked (?:free|domain)|hugedomains|sedo\b|dan\.com|afternic|get this domain|"
+    r"this domain has been registered|domain is available)", re.I)
+CHALLENGE_PATTERN = re.compile(
+    r"(?:just a moment\.\.\.|checking your browser|attention required|verify you are human|enable cookies)", re.I)
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9']+|\d{3}")
+
+
+def info_file(project_name):
+    """Raw scrape written by info_export.py (the classifier looks at it before compaction)."""
+    return os.path.join(INFO_DIR, f"{project_name.replace(' ', '_')}.txt")
+
+
+def read_info(project_name):
+    try:
+        with open(info_file(project_name), 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def page_text(info):
+    """Info text without the project name and website lines, which say nothing about the page."""
+    return "\n".join(line for line in info.splitlines() if not line.startswith(METADATA_PREFIXES))
+
+
+def page_title(info):
+    for line in info.splitlines():
+        if line.startswith('Page Title:'):
+            return line[len('Page Title:'):].strip()
+    return ''
+
+
+def rule_verdict(info):
+    """Reason the page is obviously dead, or None when the rules can't tell."""
+    if info is None or not info.strip():
+        return 'no info'
+    text = page_text(info)
+    words = len(TOKEN_PATTERN.findall(text.lower()))
+    if words < MIN_CONTENT_WORDS:
+        return 'too little text'
+    if words < SHORT_PAGE_WORDS:
+        if PARKED_PATTERN.search(text):
+            return 'parked domain'
+        if CHALLENGE_PATTERN.search(text):
+            return 'bot challenge'
+        if ERROR_PATTERN.search(page_title(info)) or ERROR_PATTERN.search(text[:500]):
+            return 'error page'
+    return None
+
+
+def tokenize(text):
+    """Words, three-digit codes (404, 503, ...) and word bigrams."""
+    words = TOKEN_PATTERN.findall(text.lower())
+    return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+
+def _dot(matrix, weights):
+    """matrix @ weights for the (rows, columns, values, n_rows) sparse layout used here."""
+    rows, columns, values, n_rows = matrix
+    return np.bincount(rows, weights=values * weights[columns], minlength=n_rows)
+
+
+def _dot_transposed(matrix, vector, n_columns):
+    """matrix.T @ vector."""
+    rows, columns, values, _ = matrix
+    return np.bincount(columns, weights=values * vector[rows], minlength=n_columns)
+
+
+class DeadSiteModel:
+    """TF-IDF features and an L2-regularized logistic regression, both in numpy."""
+
+    def __init__(self, vocabulary=None, idf=None, weights=None, bias=0.0, threshold=math.inf):
+        self.vocabulary = vocabulary or {}
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+
+    def _matrix(self, texts):
+        """Sublinear TF-IDF rows, L2-normalized, in coordinate form."""
+        rows, columns, counts = [], [], []
+        for row, text in enumerate(texts):
+            term_counts = Counter(token for token in tokenize(text) if token in self.vocabulary)
+            rows.extend([row] * len(term_counts))
+            columns.extend(self.vocabulary[token] for token in term_counts)
+            counts.extend(term_counts.values())
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        values = (1.0 + np.log(np.asarray(counts, dtype=np.float64))) * self.idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(texts)))
+        values = values / np.maximum(norms, 1e-12)[rows]
+        return rows, columns, values, len(texts)
+
+    def fit(self, texts, labels, epochs=EPOCHS, learning_rate=LEARNING_RATE, l2=L2):
+        document_frequency = Counter()
+        for text in texts:
+            document_frequency.update(set(tokenize(text)))
+        terms = [term for term, count in document_frequency.most_common(MAX_FEATURES) if count >= MIN_DF]
+        self.vocabulary = {term: i for i, term in enumerate(sorted(terms))}
+        df = np.array([document_frequency[term] for term in sorted(terms)], dtype=np.float64)
+        self.idf = np.log((1 + len(texts)) / (1 + df)) + 1
+
+        matrix = self._matrix(texts)
+        labels = np.asarray(labels, dtype=np.float64)
+        # Balanced class weights, so the share of dead sites in the corpus doesn't bias the model
+        positives = max(labels.sum(), 1)
+        negatives = max(len(labels) - labels.sum(), 1)
+        sample_weights = np.where(labels == 1, len(labels) / (2 * positives), len(labels) / (2 * negatives))
+
+        # Full-batch Adam on the weighted log loss
+        n_columns = len(self.vocabulary)
+        self.weights = np.zeros(n_columns)
+        self.bias = 0.0
+        moment = np.zeros(n_columns + 1)
+        velocity = np.zeros(n_columns + 1)
+        for step in range(1, epochs + 1):
+            error = (self._sigmoid(_dot(matrix, self.weights) + self.bias) - labels) * sample_weights / len(labels)
+            gradient = np.append(_dot_transposed(matrix, error, n_columns) + l2 * self.weights, error.sum())
+            moment = 0.9 * moment + 0.1 * gradient
+            velocity = 0.999 * velocity + 0.001 * gradient ** 2
+            update = learning_rate * (moment / (1 - 0.9 ** step)) / (np.sqrt(velocity / (1 - 0.999 ** step)) + 1e-8)
+            self.weights -= update[:-1]
+            self.bias -= update[-1]
+        return self
+
+    @staticmethod
+    def _sigmoid(z):
+        return 1 / (1 + np.exp(-np.clip(z, -30, 30)))
+
+    def predict_proba(self, texts):
+        """Probability that each page is dead."""
+        return self._sigmoid(_dot(self._matrix(texts), self.weights) + self.bias)
+
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        terms = np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str)
+        np.savez_compressed(path, terms=terms, idf=self.idf, weights=self.weights,
+                            bias=self.bias, threshold=self.threshold)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """The saved model, or None when dead_site.py hasn't been trained yet."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            vocabulary = {term: i for i, term in enumerate(data['terms'].tolist())}
+            return cls(vocabulary, data['idf'], data['weights'], float(data['bias']), float(data['threshold']))
+
+
+def classify(info, model=None):
+    """(reason, probability) for one info text; reason is None when the site should be summarized."""
+    reason = rule_verdict(info)
+    if reason is not None or model is None:
+        return reason, None
+    probability = float(model.predict_proba([page_text(info)])[0])
+    return ('model' if probability >= model.threshold else None), probability
+
+
+def load_labels(names, store):
+    """{name: 1 if the LLM answered NO INFO, 0 if it wrote a summary} from the state store."""
+    labels = {}
+    for name in names:
+        state = store.get(name, SUMMARY_STAGE)
+        if state is not None and state['status'] in ('done', 'no_info'):
+            labels[name] = int(state['status'] == 'no_info')
+    return labels
+
+
+def cross_validate(texts, labels, folds=FOLDS):
+    """Out-of-fold dead probabilities for every labelled text."""
+    order = np.random.default_rng(0).permutation(len(texts))
+    probabilities = np.zeros(len(texts))
+    for fold in np.array_split(order, folds):
+        test = set(fold.tolist())
+        train = [i for i in order if i not in test]
+        model = DeadSiteModel().fit([texts[i] for i in train], [labels[i] for i in train])
+        probabilities[fold] = model.predict_proba([texts[i] for i in fold])
+    return probabilities
+
+
+def choose_threshold(probabilities, labels, target_precision=TARGET_PRECISION):
+    """Lowest probability threshold (at least MIN_THRESHOLD) whose held-out precision reaches the target."""
+    order = np.argsort(-probabilities)
+    true_positives = np.cumsum(labels[order])
+    precision = true_positives / np.arange(1, len(order) + 1)
+    # Only thresholds at the end of a run of equal probabilities are real cut points
+    cut = np.append(probabilities[order][1:] != probabilities[order][:-1], True)
+    meeting = np.flatnonzero((precision >= target_precision) & cut & (probabilities[order] >= MIN_THRESHOLD))
+    return float(probabilities[order][meeting[-1]]) if len(meeting) else math.inf
+
+
+def score(method, predicted, labels, threshold=None):
+    true_positives = int(np.sum(predicted & (labels == 1)))
+    false_positives = int(np.sum(predicted & (labels == 0)))
+    false_negatives = int(np.sum(~predicted & (labels == 1)))
+    return {
+        'Method': method,
+        'Threshold': '' if threshold is None else f'{threshold:.3f}',
+        'Skipped': int(predicted.sum()),
+        'True Positives': true_positives,
+        'False Positives': false_positives,
+        'False Negatives': false_negatives,
+        'Precision': round(true_positives / max(true_positives + false_positives, 1), 3),
+        'Recall': round(true_positives / max(true_positives + false_negatives, 1), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and evaluate the dead-site check used by gen_summary.py")
+    parser.add_argument('--target-precision', type=float, default=TARGET_PRECISION,
+                        help='Precision the model must reach on held-out labels before it may skip sites')
+    parser.add_argument('--folds', type=int, default=FOLDS, help='Cross-validation folds')
+    args = parser.parse_args()
+
+    names = pd.read_csv('resources/mixed_data.csv')['Name'].dropna().tolist()
+    infos = {name: read_info(name) for name in names}
+    with StateStore() as store:
+        labels = load_labels(names, store)
+    print(f"{len(labels)} labelled projects ({sum(labels.values())} NO INFO) out of {len(names)}")
+
+    model = None
+    rows = []
+    if len(labels) < MIN_LABELS or len(set(labels.values())) < 2:
+        print(f"Need at least {MIN_LABELS} labels of both kinds to train the model, only the rules will be used")
+    else:
+        labelled = list(labels)
+        label_array = np.array([labels[name] for name in labelled])
+        rule_dead = np.array([rule_verdict(infos[name]) is not None for name in labelled])
+        rows.append(score('rules', rule_dead, label_array))
+
+        # The model is only consulted for pages the rules let through, so it is trained and tuned on those
+        rest = [i for i, dead in enumerate(rule_dead) if not dead]
+        texts = [page_text(infos[labelled[i]]) for i in rest]
+        probabilities = cross_validate(texts, label_array[rest], args.folds)
+        threshold = choose_threshold(probabilities, label_array[rest], args.target_precision)
+        model_dead = np.zeros(len(labelled), dtype=bool)
+        model_dead[rest] = probabilities >= threshold
+        half = np.zeros(len(labelled), dtype=bool)
+        half[rest] = probabilities >= 0.5
+        rows.append(score('model', half, label_array, 0.5))
+        rows.append(score('model', model_dead, label_array, threshold))
+        rows.append(score('rules + model', rule_dead | model_dead, label_array, threshold))
+
+        model = DeadSiteModel(threshold=threshold).fit(texts, label_array[rest])
+        model.save()
+        print(f"Model with {len(model.vocabulary)} features saved to {MODEL_PATH}"
+              + ("" if math.isfinite(threshold) else f" (never reached {args.target_precision:.0%} precision, "
+                                                    "so it will not skip any site)"))
+
+    os.makedirs(os.path.dirname(REPORT_CSV), exist_ok=True)
+    if rows:
+        with open(REPORT_CSV, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        for row in rows:
+            print(f"{row['Method']:>14} {row['Threshold']:>6}: skips {row['Skipped']}, "
+                  f"precision {row['Precision']:.3f}, recall {row['Recall']:.3f}")
+        print(f"Cross-validated report saved to {REPORT_CSV}")
+
+    skipped = 0
+    with open(PREDICTIONS_CSV, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['Name', 'Label', 'Reason', 'Probability'])
+        writer.writeheader()
+        for name in names:
+            reason, probability = classify(infos[name], model)
+            skipped += reason is not None
+            label = labels.get(name)
+            writer.writerow({'Name': name, 'Label': '' if label is None else ('NO INFO' if label else 'summary'),
+                             'Reason': reason or '', 'Probability': '' if probability is None else f'{probability:.3f}'})
+    print(f"{skipped} of {len(names)} projects would be skipped, verdicts saved to {PREDICTIONS_CSV}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Project deduplication for export_unique.
+
+Websites are reduced to a canonical key with vectorized pandas string
+operations (scheme, www., default ports, fragments, tracking parameters,
+trailing slashes and IDN hosts), so `https://x.io`, `http://www.x.io/` and
+`x.io/?utm_source=...` collapse into one project. Optional fuzzy name
+matching only compares names that sort next to each other, which keeps it
+fast on large inputs. Every dropped row is written to a merge report.
+"""
+from difflib import SequenceMatcher
+
+import pandas as pd
+
+TRACKING_PARAMS = r'utm_[a-z0-9_]*|fbclid|gclid|dclid|msclkid|yclid|mc_cid|mc_eid|igshid|_ga|_gl|ref|ref_src'
+NAME_STOPWORDS = r'\b(the|inc|ltd|llc|gmbh|co|corp|foundation|project|protocol|network|dao)\b'
+FUZZY_THRESHOLD = 0.92
+NEIGHBOURHOOD_WINDOW = 5
+
+
+def _to_idna(key):
+    host, sep, rest = key.partition('/')
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        pass
+    return host + sep + rest
+
+
+def canonicalize_urls(urls):
+    """Canonical dedupe key for every URL in a Series (NaN for missing/blank URLs)."""
+    keys = urls.astype('string').str.strip().str.lower()
+    keys = keys.str.replace(r'^[a-z][a-z0-9+.-]*://', '', regex=True)       # scheme
+    keys = keys.str.replace(r'^[^/@]*@', '', regex=True)                     # credentials
+    keys = keys.str.replace(r'#.*$', '', regex=True)                         # fragment
+    keys = keys.str.replace(r'^www\d*\.', '', regex=True)                     # www., www2.
+    keys = keys.str.replace(r'^([^/:?]+):(80|443)(?=[/?]|$)', r'\1', regex=True)  # default ports
+    keys = keys.str.replace(r'^([^/?]+?)\.(?=[/?]|$)', r'\1', regex=True)     # trailing dot in host
+    keys = keys.str.replace(rf'(?<=[?&])(?:{TRACKING_PARAMS})(?:=[^&]*)?(?:&|$)', '', regex=True)
+    keys = keys.str.replace(r'[?&]+$', '', regex=True)                        # empty query
+    keys = keys.str.replace(r'/index\.(?:html?|php)(?=\?|$)', '', regex=True)
+    keys = keys.str.replace(r'/+(?=\?|$)', '', regex=True)                    # trailing slashes
+
+    # Internationalized hosts are rare, so encode just those rows
+    non_ascii = keys.str.contains(r'[^\x00-\x7f]', regex=True, na=False)
+    if non_ascii.any():
+        keys[non_ascii] = keys[non_ascii].map(_to_idna)
+
+    return keys.mask(keys.fillna('') == '')
+
+
+def normalize_names(names):
+    """Lower-cased names without punctuation, common suffixes or spaces."""
+    normalized = names.astype('string').str.lower()
+    normalized = normalized.str.replace(r'[^\w\s]', ' ', regex=True)
+    normalized = normalized.str.replace(NAME_STOPWORDS, ' ', regex=True)
+    return normalized.str.replace(r'\s+', '', regex=True)
+
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def fuzzy_name_pairs(names, threshold=FUZZY_THRESHOLD, window=NEIGHBOURHOOD_WINDOW):
+    """(i, j, score) pairs of index labels whose normalized names are similar.
+
+    Uses a sorted-neighbourhood index: names are sorted (once as-is and once
+    reversed, to catch differences at either end) and each one is only
+    compared with the next `window` names, instead of all pairs.
+    """
+    normalized = normalize_names(names).fillna('')
+    normalized = normalized[normalized != '']
+    digits = normalized.str.replace(r'\D', '', regex=True)
+    pairs = {}
+    for sort_key in (normalized, normalized.str[::-1]):
+        labels = sort_key.sort_values(kind='stable').index.to_list()
+        values = normalized[labels].to_list()
+        numbers = digits[labels].to_list()
+        for a in range(len(labels)):
+            matcher = SequenceMatcher(None, b=values[a])
+            for b in range(a + 1, min(a + 1 + window, len(labels))):
+                # "Fund 2" and "Fund 3" are different projects however similar the names are
+                if numbers[a] != numbers[b]:
+                    continue
+                matcher.set_seq1(values[b])
+                if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                    continue
+                score = matcher.ratio()
+                if score >= threshold:
+                    pairs[tuple(sorted((labels[a], labels[b])))] = score
+    return [(i, j, score) for (i, j), score in pairs.items()]
+
+
+def dedupe_projects(df, fuzzy=False, threshold=FUZZY_THRESHOLD):
+    """Drop duplicate projects, keeping the first occurrence (so earlier sources win).
+
+    Expects Name, Description, Website and Source columns. Returns
+    (unique DataFrame, merge report DataFrame).
+    """
+    df = df.reset_index(drop=True)
+    df['URL Key'] = canonicalize_urls(df['Website'])
+    df = df[df['URL Key'].notna()].reset_index(drop=True)
+
+    # Exact matches on the canonical URL: every row points at the first row with its key
+    first = df.groupby('URL Key', sort=False).cumcount() == 0
+    keeper = df.index.to_series().where(first).groupby(df['URL Key']).transform('first').astype(int)
+    reasons = pd.Series('url', index=df.index)
+    scores = pd.Series(1.0, index=df.index)
+
+    if fuzzy:
+        parents = list(range(len(df)))
+        candidates = df.index[first]
+        for i, j, score in fuzzy_name_pairs(df.loc[candidates, 'Name'], threshold):
+            root_i, root_j = _find(parents, i), _find(parents, j)
+            if root_i != root_j:
+                keep, drop = min(root_i, root_j), max(root_i, root_j)
+                parents[drop] = keep
+                scores[drop] = score
+        # Re-point every row of a merged URL group at the group it was merged into
+        remap = {df.at[i, 'URL Key']: _find(parents, i) for i in candidates if _find(parents, i) != i}
+        merged = df['URL Key'].isin(remap)
+        keeper[merged] = df.loc[merged, 'URL Key'].map(remap).astype(int)
+        reasons[merged] = 'name'
+
+    dropped = keeper != df.index.to_series()
+    report = pd.DataFrame({
+        'Kept Name': df.loc[keeper[dropped], 'Name'].to_numpy(),
+        'Kept Website': df.loc[keeper[dropped], 'Website'].to_numpy(),
+        'Kept Source': df.loc[keeper[dropped], 'Source'].to_numpy(),
+        'Dropped Name': df.loc[dropped, 'Name'].to_numpy(),
+        'Dropped Website': df.loc[dropped, 'Website'].to_numpy(),
+        'Dropped Source': df.loc[dropped, 'Source'].to_numpy(),
+        'Reason': reasons[dropped].to_numpy(),
+        'Score': scores[dropped].round(3).to_numpy(),
+        'URL Key': df.loc[dropped, 'URL Key'].to_numpy(),
+    })
+    return df.loc[~dropped].drop(columns=['URL Key']), report
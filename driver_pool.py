@@ -0,0 +1,183 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import WebDriverException
+
+from resource_policy import MemoryWatchdog
+from telemetry import span
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+DEFAULT_WINDOW_SIZE = (1920, 1080)
+
+
+def build_chrome_options(user_agent=DEFAULT_USER_AGENT):
+    """Build the headless Chrome options shared by all exporters."""
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--start-maximized")
+    chrome_options.add_argument("--disable-notifications")
+    chrome_options.add_argument("--disable-popup-blocking")
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument("--disable-software-rasterizer")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--log-level=3")  # Only show fatal errors
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    chrome_options.add_argument(f"user-agent={user_agent}")
+    # Network events are read back from the performance log to detect network idle
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    return chrome_options
+
+
+class DriverPool:
+    """A fixed-size pool of Chrome drivers that worker threads borrow per page.
+
+    Drivers are started lazily, health-checked before being handed out, reset
+    (cookies, storage, window size) after every page and recycled after
+    `max_pages` pages or as soon as they stop responding. `policy` is the
+    resource policy pages are loaded with (see resource_policy.py); with
+    `max_rss_mb`, a watchdog kills drivers whose processes use more memory.
+    """
+
+    def __init__(self, size=5, max_pages=50, window_size=DEFAULT_WINDOW_SIZE, options_factory=build_chrome_options,
+                 policy=None, max_rss_mb=None):
+        self.size = size
+        self.max_pages = max_pages
+        self.window_size = window_size
+        self.options_factory = options_factory
+        self.policy = policy
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._pages = {}
+        self._drivers = {}
+        self._discarded = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._watchdog = MemoryWatchdog(self, max_rss_mb).start() if max_rss_mb else None
+
+    def _start_driver(self):
+        with span('driver_start'):
+            driver = webdriver.Chrome(options=self.options_factory())
+            driver.set_window_size(*self.window_size)
+        with self._lock:
+            self._pages[id(driver)] = 0
+            self._drivers[id(driver)] = driver
+        return driver
+
+    def _quit_driver(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+            self._drivers.pop(id(driver), None)
+            self._discarded.discard(id(driver))
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.debug(f"Error quitting driver: {str(e)}")
+
+    def _is_healthy(self, driver):
+        try:
+            driver.execute_script("return 1")
+            return bool(driver.window_handles)
+        except WebDriverException:
+            return False
+
+    def _reset(self, driver):
+        """Clear per-site state so the next page starts from a clean browser.
+
+        The HTTP cache is kept, so assets shared between sites (fonts, JS from
+        CDNs) are not downloaded again; it goes away when the driver is recycled.
+        """
+        try:
+            driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+        except WebDriverException:
+            pass
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.get("about:blank")
+        driver.set_window_size(*self.window_size)
+
+    def acquire(self):
+        """Borrow a healthy driver, starting a new one if none is idle."""
+        if self._closed:
+            raise RuntimeError("DriverPool is closed")
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._start_driver()
+                if id(driver) not in self._discarded and self._is_healthy(driver):
+                    return driver
+                logging.warning("Discarding unresponsive Chrome driver")
+                self._quit_driver(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, crashed=False):
+        """Return a driver to the pool, recycling it if it is worn out or broken."""
+        try:
+            with self._lock:
+                self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+                pages = self._pages[id(driver)]
+
+            if (self._closed or pages >= self.max_pages or id(driver) in self._discarded
+                    or (crashed and not self._is_healthy(driver))):
+                self._quit_driver(driver)
+                return
+
+            try:
+                self._reset(driver)
+            except WebDriverException as e:
+                logging.warning(f"Could not reset Chrome driver, recycling it: {str(e)}")
+                self._quit_driver(driver)
+                return
+
+            self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        """Context manager that borrows a driver for the duration of one page."""
+        driver = self.acquire()
+        crashed = True
+        try:
+            yield driver
+            crashed = False
+        finally:
+            self.release(driver, crashed=crashed)
+
+    def drivers(self):
+        """Every running driver, idle or borrowed."""
+        with self._lock:
+            return list(self._drivers.values())
+
+    def discard(self, driver):
+        """Quit a driver instead of reusing it when it is next released or handed out."""
+        with self._lock:
+            self._discarded.add(id(driver))
+
+    def close(self):
+        """Quit every idle driver; borrowed drivers are quit when released."""
+        self._closed = True
+        if self._watchdog is not None:
+            self._watchdog.stop()
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit_driver(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
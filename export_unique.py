@@ -1,75 +1,63 @@
-import csv
+import argparse
 import pandas as pd
 
-def read_carboncopy_csv(file_path):
-    data = []
-    with open(file_path, 'r', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            data.append({
-                'Name': row['Project name'],
-                'Description': row['Description'],
-                'Website': row['Website']
-            })
-    return data
-
-def read_positiveblockchain_csv(file_path):
-    df = pd.read_csv(file_path)
-    data = []
-    for _, row in df.iterrows():
-        data.append({
-            'Name': row['Project name'],
-            'Description': row['DESCRIPTION SHORT = VALUE PROPOSITION IN A TWEET'],
-            'Website': row['Website']
-        })
-    return data
+from dedupe import FUZZY_THRESHOLD, dedupe_projects
 
-def combine_and_save(carboncopy_data, positiveblockchain_data, output_file):
-    # Filter carboncopy_data
-    cc_dict = {
-        item['Website'].lower(): item 
-        for item in carboncopy_data 
-        if item.get('Website') and isinstance(item['Website'], str)
-    }
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
 
-    # Filter positiveblockchain_data
-    pb_dict = {
-        item['Website'].lower(): item 
-        for item in positiveblockchain_data 
-        if item.get('Website') and isinstance(item['Website'], str)
-    }
+CARBONCOPY_CSV = 'resources/carboncopy_projects.csv'
+POSITIVEBLOCKCHAIN_CSV = 'resources/PositiveBlockchain_data.csv'
+OUTPUT_CSV = 'resources/mixed_data.csv'
+MERGE_REPORT = 'resources/merge_report.csv'
 
-    # Combine the datasets
-    mixed_data = list(cc_dict.values()) + [
-        item for item in pb_dict.values() 
-        if item['Website'].lower() not in cc_dict
-    ]
 
-    # Remove duplicates based on Website (case-insensitive)
-    unique_data = {}
-    for item in mixed_data:
-        website_lower = item['Website'].lower() if item['Website'] else item['Name'].lower()
-        if website_lower not in unique_data:
-            unique_data[website_lower] = item
-    
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['Name', 'Description', 'Website']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        for item in unique_data.values():
-            writer.writerow(item)
+def _read_projects(file_path, columns, source):
+    df = pd.read_csv(file_path, usecols=list(columns), dtype=str, engine=CSV_ENGINE)
+    df = df.rename(columns=columns)[['Name', 'Description', 'Website']]
+    df['Source'] = source
+    return df
 
-def main():
-    carboncopy_file = 'resources/carboncopy_projects.csv'
-    positiveblockchain_file = 'resources/PositiveBlockchain_data.csv'
-    output_file = 'resources/mixed_data.csv'
+def read_carboncopy_csv(file_path):
+    return _read_projects(file_path, {
+        'Project name': 'Name',
+        'Description': 'Description',
+        'Website': 'Website'
+    }, 'carboncopy')
 
-    carboncopy_data = read_carboncopy_csv(carboncopy_file)
-    positiveblockchain_data = read_positiveblockchain_csv(positiveblockchain_file)
+def read_positiveblockchain_csv(file_path):
+    return _read_projects(file_path, {
+        'Project name': 'Name',
+        'DESCRIPTION SHORT = VALUE PROPOSITION IN A TWEET': 'Description',
+        'Website': 'Website'
+    }, 'positiveblockchain')
+
+def combine_and_save(carboncopy_data, positiveblockchain_data, output_file, fuzzy=False,
+                     threshold=FUZZY_THRESHOLD, report_file=MERGE_REPORT):
+    # Carboncopy comes first so its entry wins when both sources list a project
+    mixed_data = pd.concat([carboncopy_data, positiveblockchain_data], ignore_index=True)
+    unique_data, report = dedupe_projects(mixed_data, fuzzy=fuzzy, threshold=threshold)
+
+    unique_data[['Name', 'Description', 'Website']].to_csv(output_file, index=False, encoding='utf-8')
+    report.to_csv(report_file, index=False, encoding='utf-8')
+    return unique_data, report
 
-    combine_and_save(carboncopy_data, positiveblockchain_data, output_file)
-    print(f"Combined data saved to {output_file}")
+def main():
+    parser = argparse.ArgumentParser(description="Combine the carboncopy and PositiveBlockchain project lists")
+    parser.add_argument('--fuzzy', action='store_true', help='Also merge projects with near-identical names')
+    parser.add_argument('--threshold', type=float, default=FUZZY_THRESHOLD, help='Name similarity needed to merge (0-1)')
+    args = parser.parse_args()
+
+    carboncopy_data = read_carboncopy_csv(CARBONCOPY_CSV)
+    positiveblockchain_data = read_positiveblockchain_csv(POSITIVEBLOCKCHAIN_CSV)
+
+    unique_data, report = combine_and_save(carboncopy_data, positiveblockchain_data, OUTPUT_CSV,
+                                           fuzzy=args.fuzzy, threshold=args.threshold)
+    print(f"Combined data saved to {OUTPUT_CSV}: {len(unique_data)} projects, "
+          f"{len(report)} duplicates merged (see {MERGE_REPORT})")
 
 if __name__ == "__main__":
     main()
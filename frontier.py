@@ -0,0 +1,314 @@
+"""Per-domain crawl frontier shared by the exporters.
+
+URLs are queued per registered domain, so sites that share a host
+(medium.com, linktr.ee, notion.site, ...) are fetched a few at a time and
+spaced out by a per-domain delay, honouring robots.txt Crawl-delay. Domains
+are independent of each other, so the global number of workers can be much
+higher than the per-host limit. Within the frontier, lower priorities are
+fetched first; `state_priority` orders projects never-crawled-first or
+stale-first from the state store.
+"""
+import asyncio
+import heapq
+import ipaddress
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from driver_pool import DEFAULT_USER_AGENT
+
+PER_HOST_CONCURRENCY = 2
+HOST_DELAY = 1.0
+MAX_CRAWL_DELAY = 30.0
+ROBOTS_TIMEOUT = 10
+ROBOTS_CONCURRENCY = 32
+ORDERS = ('input', 'never', 'stale')
+
+# Second-level suffixes under which the registered domain has three labels
+MULTI_PART_SUFFIXES = {'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au', 'co.nz', 'co.jp',
+                       'co.in', 'com.br', 'com.cn', 'com.mx', 'com.sg', 'com.tr', 'co.za', 'com.ar', 'co.kr'}
+
+
+def registered_domain(url):
+    """Approximate registered domain (eTLD+1) of a URL, e.g. 'foo.notion.site' -> 'notion.site'."""
+    host = urlsplit(url if '://' in url else f'//{url}').hostname or ''
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.rstrip('.').split('.')
+    if len(labels) > 2 and '.'.join(labels[-2:]) in MULTI_PART_SUFFIXES:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def add_frontier_arguments(parser):
+    """Add the shared politeness and ordering options to an exporter's argument parser."""
+    parser.add_argument('--order', choices=ORDERS, default='input',
+                        help='Crawl order: input file order, never-crawled first, or least recently crawled first')
+    parser.add_argument('--per-host', type=int, default=PER_HOST_CONCURRENCY,
+                        help='Maximum concurrent requests per registered domain')
+    parser.add_argument('--host-delay', type=float, default=HOST_DELAY,
+                        help='Minimum seconds between requests to the same registered domain')
+    parser.add_argument('--ignore-robots', action='store_true', help='Do not read Crawl-delay from robots.txt')
+
+
+def frontier_from_args(args):
+    """Build a CrawlFrontier from the options added by add_frontier_arguments."""
+    return CrawlFrontier(per_host=args.per_host, delay=args.host_delay, robots=not args.ignore_robots)
+
+
+def state_priority(store, stage, project, order):
+    """Frontier priority of a project for the given --order, based on its state-store record."""
+    if order == 'input' or store is None:
+        return 0
+    state = store.get(project, stage)
+    if order == 'never':
+        return 0 if state is None else 1
+    return state['updated_at'] if state is not None else 0
+
+
+class CrawlFrontier:
+    """Thread-safe per-domain queues with per-host concurrency and delay limits."""
+
+    def __init__(self, per_host=PER_HOST_CONCURRENCY, delay=HOST_DELAY, max_delay=MAX_CRAWL_DELAY, robots=True):
+        self.per_host = per_host
+        self.delay = delay
+        self.max_delay = max_delay
+        self.robots = robots
+
+        self._queues = {}
+        self._in_flight = {}
+        self._next_allowed = {}
+        self._delays = {}
+        # Every domain with queued URLs is 'ready' (in _ready, keyed by its best URL),
+        # 'delayed' (in _delayed, keyed by when it may be fetched again) or 'full'
+        self._status = {}
+        self._ready = []
+        self._delayed = []
+        self._queued = 0
+        self._robots_origins = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        with self._condition:
+            return self._queued
+
+    def add(self, url, item=None, priority=0):
+        """Queue a URL; `item` is handed back with it (defaults to the URL)."""
+        domain = registered_domain(url)
+        with self._condition:
+            entries = self._queues.setdefault(domain, [])
+            heapq.heappush(entries, (priority, next(self._counter), url, url if item is None else item))
+            self._queued += 1
+            if self._status.get(domain, 'ready') == 'ready':
+                self._schedule(domain, time.monotonic())
+            self._add_robots_origin(url, domain)
+            self._condition.notify_all()
+
+    def _add_robots_origin(self, url, domain):
+        parts = urlsplit(url)
+        if parts.scheme and parts.netloc:
+            self._robots_origins.setdefault(f'{parts.scheme}://{parts.netloc}', domain)
+
+    def domain_delay(self, domain):
+        return self._delays.get(domain, self.delay)
+
+    async def aload_robots(self, client=None):
+        """Read Crawl-delay from robots.txt for every origin not looked up yet."""
+        if not self.robots:
+            return
+        with self._condition:
+            origins = {origin: domain for origin, domain in self._robots_origins.items() if domain is not None}
+            for origin in origins:
+                self._robots_origins[origin] = None
+        if not origins:
+            return
+
+        own_client = client is None
+        if own_client:
+            client = httpx.AsyncClient(timeout=ROBOTS_TIMEOUT, follow_redirects=True,
+                                       headers={"User-Agent": DEFAULT_USER_AGENT})
+        semaphore = asyncio.Semaphore(ROBOTS_CONCURRENCY)
+
+        async def fetch(origin, domain):
+            async with semaphore:
+                try:
+                    response = await client.get(f'{origin}/robots.txt', timeout=ROBOTS_TIMEOUT)
+                except httpx.HTTPError:
+                    return
+            if response.status_code != 200:
+                return
+            parser = RobotFileParser()
+            parser.parse(response.text.splitlines())
+            crawl_delay = parser.crawl_delay(DEFAULT_USER_AGENT)
+            if crawl_delay:
+                with self._condition:
+                    self._delays[domain] = min(self.max_delay, max(self._delays.get(domain, self.delay),
+                                                                   float(crawl_delay)))
+        try:
+            await asyncio.gather(*(fetch(origin, domain) for origin, domain in origins.items()))
+        finally:
+            if own_client:
+                await client.aclose()
+
+    def load_robots(self, urls=()):
+        """Read Crawl-delay for queued URLs and `urls`; returns at once when every origin was looked up already."""
+        if not self.robots:
+            return
+        with self._condition:
+            for url in urls:
+                self._add_robots_origin(url, registered_domain(url))
+            if all(domain is None for domain in self._robots_origins.values()):
+                return
+        asyncio.run(self.aload_robots())
+
+    def _schedule(self, domain, now):
+        """Put a domain in the state matching its queue, in-flight count and delay."""
+        entries = self._queues.get(domain)
+        if not entries:
+            self._queues.pop(domain, None)
+            self._status.pop(domain, None)
+        elif self._in_flight.get(domain, 0) >= self.per_host:
+            self._status[domain] = 'full'
+        elif self._next_allowed.get(domain, 0) > now:
+            self._status[domain] = 'delayed'
+            heapq.heappush(self._delayed, (self._next_allowed[domain], domain))
+        else:
+            self._status[domain] = 'ready'
+            heapq.heappush(self._ready, (entries[0][:2], domain))
+
+    def _pop_ready(self):
+        """Pop the best URL whose domain may be fetched now.
+
+        Returns (entry, None), (None, seconds to wait) or (None, None) once
+        the frontier is empty. Must be called with the lock held.
+        """
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            ready_at, domain = heapq.heappop(self._delayed)
+            if self._status.get(domain) == 'delayed' and self._next_allowed.get(domain) == ready_at:
+                self._schedule(domain, now)
+
+        while self._ready:
+            key, domain = heapq.heappop(self._ready)
+            entries = self._queues.get(domain)
+            # Skip heap entries left behind when a domain's best URL or state changed
+            if self._status.get(domain) != 'ready' or not entries or entries[0][:2] != key:
+                continue
+            _, _, url, item = heapq.heappop(entries)
+            self._queued -= 1
+            self._in_flight[domain] = self._in_flight.get(domain, 0) + 1
+            self._next_allowed[domain] = now + self.domain_delay(domain)
+            self._schedule(domain, now)
+            return (url, item), None
+
+        if not self._queued:
+            return None, None
+        if self._delayed:
+            return None, max(0.0, self._delayed[0][0] - now)
+        return None, 0.05  # Every queued domain is at its concurrency limit
+
+    def get(self, timeout=None):
+        """Block until a URL may be fetched; returns (url, item), or None when nothing is left."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                entry, wait = self._pop_ready()
+                if entry is not None or wait is None:
+                    return entry
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return None
+                self._condition.wait(wait)
+
+    async def aget(self):
+        """asyncio version of `get`."""
+        while True:
+            with self._condition:
+                entry, wait = self._pop_ready()
+            if entry is not None or wait is None:
+                return entry
+            await asyncio.sleep(wait)
+
+    def acquire(self, url, timeout=None):
+        """Take a slot for a URL fetched outside the queue, e.g. a page linked from a crawled one.
+
+        Waits for the domain's concurrency limit and delay like queued URLs do.
+        Returns False when no slot was free within `timeout`; a slot that was
+        taken is released with `done`.
+        """
+        domain = registered_domain(url)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                full = self._in_flight.get(domain, 0) >= self.per_host
+                if not full and self._next_allowed.get(domain, 0) <= now:
+                    self._in_flight[domain] = self._in_flight.get(domain, 0) + 1
+                    self._next_allowed[domain] = now + self.domain_delay(domain)
+                    # Queued URLs of the domain now wait for this slot and delay too
+                    if domain in self._status:
+                        self._schedule(domain, now)
+                    return True
+                # A full domain waits for `done` to notify; a delayed one until its delay has passed
+                wait = None if full else self._next_allowed[domain] - now
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return False
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._condition.wait(wait)
+
+    def done(self, url):
+        """Mark a URL returned by `get` or `acquire` as finished, freeing a slot for its domain."""
+        domain = registered_domain(url)
+        with self._condition:
+            self._in_flight[domain] = max(0, self._in_flight.get(domain, 0) - 1)
+            if self._status.get(domain) == 'full':
+                self._schedule(domain, time.monotonic())
+            self._condition.notify_all()
+
+    def run(self, function, workers):
+        """Call function(item) for every queued URL on `workers` threads.
+
+        Yields (item, result) as calls finish; an exception raised by the call
+        is yielded as the result.
+        """
+        if self.robots:
+            self.load_robots()
+        results = queue.Queue()
+
+        def worker():
+            while True:
+                entry = self.get()
+                if entry is None:
+                    break
+                url, item = entry
+                try:
+                    results.put((item, function(item)))
+                except Exception as e:
+                    results.put((item, e))
+                finally:
+                    self.done(url)
+            results.put(None)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(workers):
+                executor.submit(worker)
+            finished = 0
+            while finished < workers:
+                result = results.get()
+                if result is None:
+                    finished += 1
+                else:
+                    yield result
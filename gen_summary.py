@@ -1,22 +1,29 @@
 import pandas as pd
 import os
-from openai import OpenAI
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-import time
-import re
+import argparse
+import asyncio
+from collections import Counter
+
+from compact_info import COMPACT_DIR
+from dead_site import DeadSiteModel, classify, read_info as read_raw_info
+from project_files import SUMMARY_DIR, project_file_name, summary_path
+from state_store import StateStore, add_state_arguments, hash_text
+from summary_cache import SummaryCache
+from summary_batch import run_batch, POLL_INTERVAL as BATCH_POLL_INTERVAL
+from summary_engine import SummaryEngine, DEFAULT_RPM, DEFAULT_TPM, INITIAL_CONCURRENCY
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize the OpenAI client with the API key from environment variable
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+STAGE = "summary"
+SCREENSHOT_STAGE = "screenshot"
+MODEL = "gpt-4o-mini"
+SYSTEM_MESSAGE = "You are a helpful assistant that summarizes project information."
+PROMPT_TEMPLATE = """Generate a concise two-paragraph summary of the project based on the scraped data below. The first paragraph should focus on the project's mission and key features. The second paragraph should highlight any unique technologies, solutions, or partnerships. If the data is incomplete, irrelevant, or contains errors (e.g., 404 page, domain for sale), return "NO INFO". Provide only the summary or "NO INFO".
 
-def sanitize_file_name(file_name):
-    # Replace or remove special characters
-    sanitized_name = re.sub(r'[<>:"/\\|?*]', '_', file_name)
-    return sanitized_name
+{project_info}"""
 
 def read_project_info(file_path):
     try:
@@ -29,57 +36,137 @@ def read_project_info(file_path):
         print(f"Error reading file {file_path}: {str(e)}")
         return None
 
-def generate_summary(project_name, project_info):
-    if project_info is None:
-        return project_name, "NO INFO"
-
-    try:
-        prompt = f"""Generate a concise two-paragraph summary of the project based on the scraped data below. The first paragraph should focus on the project's mission and key features. The second paragraph should highlight any unique technologies, solutions, or partnerships. If the data is incomplete, irrelevant, or contains errors (e.g., 404 page, domain for sale), return "NO INFO". Provide only the summary or "NO INFO".
-
-{project_info}"""
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes project information."},
-                {"role": "user", "content": prompt}
-            ]
-            )
-
-        return project_name, response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Error generating summary for {project_name}: {str(e)}")
-        return project_name, "ERROR"
-
-def process_project(project_name, project_info_path):
-    project_info = read_project_info(project_info_path)
-    return generate_summary(project_name, project_info)
+def summary_input_hash(project_info):
+    """Hash of everything that determines a summary: model, prompts and scraped info."""
+    return hash_text(MODEL, SYSTEM_MESSAGE, PROMPT_TEMPLATE, project_info)
+
+def info_path(project_name):
+    """Prefer the compacted info written by compact_info.py, falling back to the raw scrape.
+
+    A compacted file older than the raw scrape is stale and ignored.
+    """
+    file_name = project_file_name(project_name)
+    compact_path = os.path.join(COMPACT_DIR, file_name)
+    raw_path = os.path.join('info', file_name)
+    if os.path.exists(compact_path) and (not os.path.exists(raw_path)
+                                         or os.path.getmtime(compact_path) >= os.path.getmtime(raw_path)):
+        return compact_path
+    return raw_path
+
+def skip_reason(store, project_name, model=None, include_parked=False, dead_check=True):
+    """Why a site should not be sent to the API at all, or None.
+
+    Sites that are obviously dead would only come back as NO INFO. image_export
+    flags parked or "for sale" screenshots; dead_site.py checks the scraped text.
+    """
+    if not include_parked and (store.get(project_name, SCREENSHOT_STAGE) or {}).get('status') == 'parked':
+        return 'parked screenshot'
+    if dead_check:
+        return classify(read_raw_info(project_name), model)[0]
+    return None
+
+def record_summary(store, project_name, input_hash, summary):
+    """Save a summary result and record it in the state store; returns True when a summary was written."""
+    if summary not in ["NO INFO", "ERROR"]:
+        output_file = summary_path(project_name)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(summary)
+        store.mark_done(project_name, STAGE, input_hash, hash_text(summary))
+        print(f"\nSummary for {project_name} saved to {output_file}")
+        return True
+    if summary == "NO INFO":
+        store.mark_done(project_name, STAGE, input_hash, None, status="no_info")
+    else:
+        store.mark_failed(project_name, STAGE, input_hash, summary)
+    print(f"\nNo valid information found for {project_name}")
+    return False
+
+def record_skipped(store, project_name, input_hash):
+    # Not recorded as no_info, so dead_site.py doesn't train on its own verdicts and the site is checked again next run
+    store.mark_done(project_name, STAGE, input_hash, None, status="skipped")
 
 def main():
-    df = pd.read_csv('resources/mixed_data.csv')
-
-    os.makedirs('summaries', exist_ok=True)
+    parser = argparse.ArgumentParser(description="Generate project summaries from info/PROJECT_NAME.txt")
+    add_state_arguments(parser)
+    parser.add_argument('--concurrency', type=int, default=INITIAL_CONCURRENCY,
+                        help='Initial number of concurrent requests (adjusted automatically)')
+    parser.add_argument('--rpm', type=int, default=DEFAULT_RPM, help='Requests per minute allowed until the API reports its limit')
+    parser.add_argument('--tpm', type=int, default=DEFAULT_TPM, help='Tokens per minute allowed until the API reports its limit')
+    parser.add_argument('--batch', action='store_true',
+                        help='Submit all prompts as one Batch API job instead of calling the API interactively')
+    parser.add_argument('--poll-interval', type=int, default=BATCH_POLL_INTERVAL, help='Seconds between batch status checks')
+    parser.add_argument('--no-cache', action='store_true', help='Call the API even when a cached response exists')
+    parser.add_argument('--clear-cache', action='store_true', help='Empty the summary cache before running')
+    parser.add_argument('--invalidate-cache', action='store_true',
+                        help='Drop cached responses generated with a different model or prompt')
+    parser.add_argument('--include-parked', action='store_true',
+                        help='Also summarize sites whose screenshot matches a parked-domain template')
+    parser.add_argument('--no-dead-check', action='store_true',
+                        help='Send every site to the API, even ones dead_site.py flags as dead')
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else SummaryCache(MODEL, SYSTEM_MESSAGE, PROMPT_TEMPLATE)
+    if cache is not None:
+        if args.clear_cache:
+            print(f"Cleared {cache.clear()} cached summaries")
+        elif args.invalidate_cache:
+            print(f"Dropped {cache.invalidate_old_prompts()} summaries cached for older prompts")
+        cache.evict()
 
-    projects = [(row['Name'], f'info/{sanitize_file_name(row["Name"].replace(" ", "_"))}.txt') for _, row in df.iterrows()]
-
-
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        
-        future_to_project = {executor.submit(process_project, name, info_path): name for name, info_path in projects}
+    df = pd.read_csv('resources/mixed_data.csv')
 
-        with tqdm(total=len(future_to_project), desc="Generating summaries", 
-                  bar_format="{l_bar}\033[92m{bar}\033[0m{r_bar}") as pbar:
-            for future in as_completed(future_to_project):
-                project_name, summary = future.result()
-                if summary not in ["NO INFO", "ERROR"]:
-                    sanitized_project_name = sanitize_file_name(project_name.replace(" ", "_"))
-                    output_file = f'summaries/{sanitized_project_name}.txt'
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        f.write(summary)
-                    print(f"\nSummary for {project_name} saved to {output_file}")
-                else:
-                    print(f"\nNo valid information found for {project_name}")
-                pbar.update(1)
+    os.makedirs(SUMMARY_DIR, exist_ok=True)
+
+    projects = [(row['Name'], info_path(row['Name'])) for _, row in df.iterrows()]
+
+    # Only summarize projects whose scraped info or prompt changed since the last run
+    store = StateStore()
+    pending = {}
+    for name, file_path in projects:
+        project_info = read_project_info(file_path)
+        input_hash = summary_input_hash(project_info)
+        if store.needs_run(name, STAGE, input_hash, force=args.force, since=args.since, output_path=summary_path(name)):
+            pending[name] = (project_info, input_hash)
+    print(f"Skipping {len(projects) - len(pending)} projects with up-to-date summaries")
+
+    model = None
+    if not args.no_dead_check:
+        model = DeadSiteModel.load()
+        if model is None:
+            print("No dead-site model trained yet (run dead_site.py), using its rules only")
+    skipped = {}
+    for name in pending:
+        reason = skip_reason(store, name, model, include_parked=args.include_parked, dead_check=not args.no_dead_check)
+        if reason is not None:
+            skipped[name] = reason
+    for reason, count in Counter(skipped.values()).most_common():
+        print(f"Skipping {count} sites: {reason}")
+
+    with tqdm(total=len(pending), desc="Generating summaries",
+              bar_format="{l_bar}\033[92m{bar}\033[0m{r_bar}") as pbar:
+
+        def handle_result(project_name, summary):
+            record_summary(store, project_name, pending[project_name][1], summary)
+            pbar.update(1)
+
+        for name in skipped:
+            record_skipped(store, name, pending[name][1])
+            pbar.update(1)
+        summarize = {name: value for name, value in pending.items() if name not in skipped}
+
+        if args.batch:
+            run_batch({name: project_info for name, (project_info, _) in summarize.items()}, handle_result,
+                      MODEL, SYSTEM_MESSAGE, PROMPT_TEMPLATE, api_key=os.getenv("OPENAI_API_KEY"), cache=cache,
+                      poll_interval=args.poll_interval)
+        else:
+            engine = SummaryEngine(MODEL, SYSTEM_MESSAGE, PROMPT_TEMPLATE, api_key=os.getenv("OPENAI_API_KEY"), cache=cache,
+                                   rpm=args.rpm, tpm=args.tpm, initial_concurrency=args.concurrency)
+            asyncio.run(engine.run([(name, project_info) for name, (project_info, _) in summarize.items()], handle_result))
+            print(engine.stats())
+    store.close()
+    if cache is not None:
+        print(cache.stats())
+        cache.close()
 
 if __name__ == "__main__":
     main()
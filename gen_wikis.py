@@ -6,7 +6,17 @@ from tqdm import tqdm
 import time
 import re
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth1Session
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+import difflib
+import argparse
+import threading
+
+from project_files import summary_path
+from state_store import StateStore, add_state_arguments, hash_text
+from telemetry import record, span
 
 # Load environment variables
 load_dotenv()
@@ -16,7 +26,19 @@ CONSUMER_SECRET = os.getenv("MIRAHEZE_CONSUMER_SECRET")
 ACCESS_TOKEN = os.getenv("MIRAHEZE_ACCESS_TOKEN")
 ACCESS_SECRET = os.getenv("MIRAHEZE_ACCESS_SECRET")
 
-API_URL = "https://impact.miraheze.org/w/api.php"
+API_URL = os.getenv("MIRAHEZE_API_URL", "https://impact.miraheze.org/w/api.php")
+STAGE = "wiki"
+HEADERS = {
+    "User-Agent": "IERetrv/1.0 (impactevaluationfoundation@gmail.com)"
+}
+EDIT_SUMMARY = "Creating an IEF Article automatically"
+EDIT_WORKERS = 4
+# Ask MediaWiki to refuse edits while replication lag is above this many seconds
+MAXLAG = 5
+MAX_ATTEMPTS = 5
+# Titles per action=query request; 50 is the limit for non-bot accounts
+REVISION_BATCH = 50
+REQUEST_TIMEOUT = 30
 
 def create_oauth_session():
     """Create an OAuth1 session using the access token and secret."""
@@ -27,7 +49,7 @@ def create_oauth_session():
         resource_owner_secret=ACCESS_SECRET
     )
 
-def get_csrf_token(oauth_session):
+def get_csrf_token(oauth_session, api_url=API_URL):
     """Fetch the CSRF token required for editing a wiki page."""
     params = {
         "action": "query",
@@ -35,54 +57,225 @@ def get_csrf_token(oauth_session):
         "format": "json"
     }
 
-    headers = {
-        "User-Agent": "IERetrv/1.0 (impactevaluationfoundation@gmail.com)"
-    }
-
-    response = oauth_session.get(API_URL, params=params, headers=headers)
-    
-    print(f"Response Status Code: {response.status_code}")
-    print(f"Response Content: {response.text}")
-
+    response = oauth_session.get(api_url, params=params, headers=HEADERS, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
-    
+
     data = response.json()
     return data["query"]["tokens"]["csrftoken"]
 
-def create_wiki_page(title, content, oauth_session):
-    """Create or edit a wiki page with authentication."""
-    
-    csrf_token = get_csrf_token(oauth_session)
-
-    data = {
-        "action": "edit",
-        "title": title,
-        "text": content,
-        "summary": "Creating an IEF Article automatically",
-        "format": "json",
-        "token": csrf_token
-    }
-    
-    headers = {
-        "User-Agent": "IERetrv/1.0 (impactevaluationfoundation@gmail.com)"
-    }
+def retry_delay(response, result=None, attempt=0):
+    """Seconds to wait before retrying, preferring the server's Retry-After/lag hints."""
+    if response is not None and response.headers.get("Retry-After"):
+        try:
+            return float(response.headers["Retry-After"])
+        except ValueError:
+            pass
+    if result and result.get("error", {}).get("lag") is not None:
+        return max(1.0, float(result["error"]["lag"]))
+    return min(60, 2 ** attempt)
+
+class WikiPublisher:
+    """Publishes pages concurrently over one pooled session with a cached CSRF token.
+
+    The token is fetched once and only refreshed when the API answers
+    `badtoken`. Edits carry `maxlag`, and lag or rate-limit responses are
+    retried after the delay the server asks for.
+    """
+
+    def __init__(self, oauth_session, api_url=API_URL, max_workers=EDIT_WORKERS, maxlag=MAXLAG):
+        self.session = oauth_session
+        self.api_url = api_url
+        self.max_workers = max_workers
+        self.maxlag = maxlag
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token = None
+        self._token_lock = threading.Lock()
+
+    def token(self, stale=None):
+        """Return the cached CSRF token, fetching a new one if there is none or it equals `stale`."""
+        with self._token_lock:
+            if self._token is None or self._token == stale:
+                self._token = get_csrf_token(self.session, self.api_url)
+            return self._token
+
+    def edit(self, title, content, summary=EDIT_SUMMARY, baserevid=None, create_only=False):
+        """Create or edit a page. Returns 'created', 'edited', 'unchanged', 'conflict' or 'failed'.
+
+        With `baserevid` the edit is rejected as a conflict if the page changed
+        since that revision; with `create_only` it is rejected if the page exists.
+        """
+        with span('wiki_edit', title=title) as fields:
+            outcome = self._edit(title, content, summary, baserevid, create_only)
+            fields['outcome'] = outcome
+            if outcome in ("conflict", "failed"):
+                fields['error'] = outcome
+            return outcome
+
+    def _edit(self, title, content, summary, baserevid, create_only):
+        for attempt in range(MAX_ATTEMPTS):
+            token = self.token()
+            data = {
+                "action": "edit",
+                "title": title,
+                "text": content,
+                "summary": summary,
+                "format": "json",
+                "maxlag": self.maxlag,
+                "token": token
+            }
+            if baserevid is not None:
+                data["baserevid"] = baserevid
+                data["nocreate"] = 1
+            if create_only:
+                data["createonly"] = 1
+
+            try:
+                response = self.session.post(self.api_url, data=data, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                print(f"Error creating wiki page for {title}: {str(e)}")
+                record('wiki_retry', title=title, error=type(e).__name__)
+                time.sleep(retry_delay(None, attempt=attempt))
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                record('wiki_retry', title=title, error=f"http {response.status_code}")
+                time.sleep(retry_delay(response, attempt=attempt))
+                continue
+
+            try:
+                response.raise_for_status()
+                result = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Error creating wiki page for {title}: {str(e)}")
+                print(f"Response content: {response.text}")
+                return "failed"
+
+            error = result.get("error", {}).get("code")
+            if error == "badtoken":
+                self.token(stale=token)
+                continue
+            if error in ("maxlag", "ratelimited"):
+                record('wiki_retry', title=title, error=error)
+                time.sleep(retry_delay(response, result, attempt))
+                continue
+            if error in ("editconflict", "articleexists", "missingtitle"):
+                print(f"Edit conflict for {title}, page changed since it was read")
+                return "conflict"
+            if error:
+                print(f"Error creating wiki page for {title}: {result['error'].get('info', error)}")
+                return "failed"
+
+            edit = result.get("edit", {})
+            if edit.get("result") != "Success":
+                print(f"Unexpected response for {title}: {result}")
+                return "failed"
+            if "nochange" in edit:
+                return "unchanged"
+            return "created" if "new" in edit else "edited"
+
+        print(f"Error creating wiki page for {title}: gave up after {MAX_ATTEMPTS} attempts")
+        return "failed"
 
-    try:
-        response = oauth_session.post(API_URL, data=data, headers=headers)
-        response.raise_for_status()
+    def query(self, params):
+        """Run a read-only API query, retrying on lag and rate limits."""
+        params = dict(params, format="json", formatversion=2, maxlag=self.maxlag)
+        for attempt in range(MAX_ATTEMPTS):
+            response = self.session.get(self.api_url, params=params, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 429 or response.status_code >= 500:
+                time.sleep(retry_delay(response, attempt=attempt))
+                continue
+            response.raise_for_status()
+            result = response.json()
+            if result.get("error", {}).get("code") in ("maxlag", "ratelimited"):
+                time.sleep(retry_delay(response, result, attempt))
+                continue
+            if "error" in result:
+                raise RuntimeError(f"Query failed: {result['error'].get('info')}")
+            return result
+        raise RuntimeError(f"Query failed after {MAX_ATTEMPTS} attempts")
 
-        result = response.json()
-        if "error" in result:
-            print(f"Error creating wiki page for {title}: {result['error']['info']}")
-        elif "edit" in result and result["edit"]["result"] == "Success":
-            print(f"Successfully created page: {title}")
+    def fetch_revisions(self, titles):
+        """Current content and revision id of each title, REVISION_BATCH titles per request.
+
+        Returns {title: (revid, content)}, with None for pages that don't exist.
+        """
+        revisions = {}
+        titles = list(dict.fromkeys(titles))
+        for start in range(0, len(titles), REVISION_BATCH):
+            batch = titles[start:start + REVISION_BATCH]
+            result = self.query({
+                "action": "query",
+                "prop": "revisions",
+                "rvprop": "ids|content",
+                "rvslots": "main",
+                "titles": "|".join(batch)
+            })["query"]
+
+            # Map MediaWiki's normalized titles (e.g. underscores to spaces) back to ours
+            original = {title: title for title in batch}
+            for normalized in result.get("normalized", []):
+                original[normalized["to"]] = normalized["from"]
+
+            for page in result.get("pages", []):
+                title = original.get(page["title"], page["title"])
+                if page.get("missing") or not page.get("revisions"):
+                    revisions[title] = None
+                else:
+                    revision = page["revisions"][0]
+                    revisions[title] = (revision["revid"], revision["slots"]["main"].get("content", ""))
+        return revisions
+
+    def publish(self, pages, on_result):
+        """Edit (key, title, content[, edit options]) pages with bounded concurrency.
+
+        Calls on_result(key, title, outcome) as each edit finishes.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            future_to_page = {}
+            for key, title, content, *options in pages:
+                future = executor.submit(self.edit, title, content, **(options[0] if options else {}))
+                future_to_page[future] = (key, title)
+            for future in as_completed(future_to_page):
+                key, title = future_to_page[future]
+                on_result(key, title, future.result())
+
+def plan_sync(pages, revisions):
+    """Compare local (key, title, content) pages with the wiki.
+
+    Returns a list of (action, key, title, content, baserevid) with action
+    'create', 'edit' or 'skip'. MediaWiki strips trailing whitespace when it
+    saves, so content is compared without it.
+    """
+    plan = []
+    for key, title, content in pages:
+        remote = revisions.get(title)
+        if remote is None:
+            plan.append(("create", key, title, content, None))
+        elif remote[1].rstrip() == content.rstrip():
+            plan.append(("skip", key, title, content, remote[0]))
         else:
-            print(f"Unexpected response for {title}: {result}")
+            plan.append(("edit", key, title, content, remote[0]))
+    return plan
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error creating wiki page for {title}: {str(e)}")
-        if hasattr(e, "response") and e.response is not None:
-            print(f"Response content: {e.response.text}")
+def print_plan(plan, revisions, show_diff=False):
+    """Print the planned creates and edits, optionally with a diff for each edit."""
+    for action, _, title, content, baserevid in plan:
+        if action == "create":
+            print(f"CREATE {title}")
+        elif action == "edit":
+            diff = list(difflib.unified_diff(revisions[title][1].rstrip().splitlines(), content.rstrip().splitlines(),
+                                             f"{title} (r{baserevid})", f"{title} (local)", lineterm=""))
+            added = sum(1 for line in diff if line.startswith("+") and not line.startswith("+++"))
+            removed = sum(1 for line in diff if line.startswith("-") and not line.startswith("---"))
+            print(f"EDIT   {title} (+{added} -{removed} lines, base r{baserevid})")
+            if show_diff:
+                print("\n".join(diff))
+    counts = Counter(action for action, *_ in plan)
+    print(f"{counts['create']} to create, {counts['edit']} to edit, {counts['skip']} unchanged")
 
 def sanitize_title(title):
     """Sanitize the title to remove special characters."""
@@ -99,37 +292,94 @@ def generate_wiki_content(project_name, summary, website):
 """
     return content
 
+def build_wiki_page(project_name, website):
+    """(title, content, input_hash) of a project's wiki page, or None when it has no summary yet."""
+    if not os.path.exists(summary_path(project_name)):
+        return None
+    with open(summary_path(project_name), "r", encoding="utf-8") as f:
+        summary = f.read()
+
+    # Generate wiki content
+    wiki_content = generate_wiki_content(sanitize_title(project_name), summary, website)
+    title = f"Articles:{sanitize_title(project_name)}"
+    return title, wiki_content, hash_text(title, wiki_content)
+
+def record_outcome(store, project_name, input_hash, outcome):
+    if outcome in ("created", "edited", "unchanged"):
+        store.mark_done(project_name, STAGE, input_hash, input_hash)
+    else:
+        store.mark_failed(project_name, STAGE, input_hash, outcome)
+
 def main():
+    parser = argparse.ArgumentParser(description="Publish project summaries as wiki pages")
+    add_state_arguments(parser)
+    parser.add_argument("--workers", type=int, default=EDIT_WORKERS, help="Number of concurrent edits")
+    parser.add_argument("--sync", action="store_true",
+                        help="Compare with the pages currently on the wiki and only create or edit real differences")
+    parser.add_argument("--dry-run", action="store_true", help="Print the planned changes without editing anything")
+    parser.add_argument("--diff", action="store_true", help="With --dry-run, also print a diff for every edit")
+    args = parser.parse_args()
+
     # Read the CSV file
     df = pd.read_csv("resources/mixed_data.csv")
 
     # Create a directory to store wiki pages locally
     os.makedirs("wiki_pages", exist_ok=True)
-    
-    # Create OAuth session for subsequent requests
-    oauth_session = create_oauth_session()
 
-    for _, row in tqdm(
-        df.iterrows(), total=len(df), desc="Processing projects", leave=False
-    ):
+    # Pages whose content was already published unchanged are skipped
+    store = StateStore()
+
+    pages = []
+    input_hashes = {}
+    for _, row in df.iterrows():
         project_name = row["Name"]
-        website = row["Website"]
-        summary_file = f"summaries/{sanitize_title(project_name)}.txt"
-        
-        if os.path.exists(summary_file):
-            with open(summary_file, "r", encoding="utf-8") as f:
-                summary = f.read()
-
-            # Generate wiki content
-            wiki_content = generate_wiki_content(
-                sanitize_title(project_name), summary, website
-            )
-
-            # Create the wiki page
-            create_wiki_page(f"Articles:{sanitize_title(project_name)}", wiki_content, oauth_session)
-
-            # Small delay
-            time.sleep(1)
+        page = build_wiki_page(project_name, row["Website"])
+        if page is None:
+            continue
+        title, wiki_content, input_hash = page
+        # In sync mode the wiki itself decides what changed, so every page is compared
+        if args.sync or store.needs_run(project_name, STAGE, input_hash, force=args.force, since=args.since):
+            pages.append((project_name, title, wiki_content))
+            input_hashes[project_name] = input_hash
+
+    # Create OAuth session for subsequent requests
+    publisher = WikiPublisher(create_oauth_session(), max_workers=args.workers)
+    outcomes = Counter()
+
+    if args.sync:
+        revisions = publisher.fetch_revisions([title for _, title, _ in pages])
+        plan = plan_sync(pages, revisions)
+        print_plan(plan, revisions, show_diff=args.diff and args.dry_run)
+        pages = []
+        for action, project_name, title, content, baserevid in plan:
+            if action == "skip":
+                outcomes["unchanged"] += 1
+                if not args.dry_run:
+                    store.mark_done(project_name, STAGE, input_hashes[project_name], input_hashes[project_name])
+            elif action == "create":
+                pages.append((project_name, title, content, {"create_only": True}))
+            else:
+                pages.append((project_name, title, content, {"baserevid": baserevid}))
+    elif args.dry_run:
+        for _, title, _ in pages:
+            print(f"PUBLISH {title}")
+
+    if args.dry_run:
+        print(f"Dry run: {len(pages)} pages would be published")
+        store.close()
+        return
+
+    with tqdm(total=len(pages), desc="Publishing pages", leave=False) as pbar:
+
+        def handle_result(project_name, title, outcome):
+            outcomes[outcome] += 1
+            record_outcome(store, project_name, input_hashes[project_name], outcome)
+            pbar.update(1)
+
+        publisher.publish(pages, handle_result)
+
+    print(", ".join(f"{count} {outcome}" for outcome, count in outcomes.items()) or "Nothing to publish")
+    store.close()
 
 if __name__ == "__main__":
     main()
@@ -1,76 +1,361 @@
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from tqdm import tqdm
-import time
+import argparse
+import base64
+import glob
+import io
 import os
+import shutil
+import time
+
+from PIL import Image
+
+from driver_pool import DriverPool
+from crawl import visit_site, setup_wait_logging
+from csv_writer import QueuedCsvWriter
+from frontier import add_frontier_arguments, frontier_from_args, state_priority
+from resource_policy import add_resource_arguments
+from state_store import StateStore, hash_text
+from telemetry import record
+from work_queue import add_worker_arguments, run_worker, worker_id
+
+MAX_WORKERS = 5
+ENCODE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+SCREENSHOT_DIR = 'screenshots'
+THUMBNAIL_DIR = 'screenshots/thumbs'
+REPORT_CSV = 'resources/screenshot_report.csv'
+PARKED_TEMPLATE_DIR = 'resources/parked_templates'
+STAGE = "screenshot"
+QUEUE = "screenshots"
+
+# Perceptual hashes: a 256-bit dHash of the whole capture for change detection
+# and a 64-bit dHash of the area above the fold for matching parked-domain templates
+PAGE_HASH_SIZE = 16
+FOLD_HASH_SIZE = 8
+# Maximum differing bits to still count as the same image
+CHANGE_THRESHOLD = 2
+PARKED_THRESHOLD = 10
+
+# Pages longer than this are cut off
+MAX_CAPTURE_HEIGHT = 8000
+WEBP_MAX_HEIGHT = 16383
+TILE_HEIGHT = 2000
+IMAGE_FORMAT = 'webp'
+IMAGE_QUALITY = 80
+THUMBNAIL_WIDTH = 480
+FORMAT_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+
+REPORT_FIELDS = ['Project Name', 'Website', 'Page Height', 'Captured Height', 'Tiles', 'Raw Bytes', 'Image Bytes',
+                 'Thumbnail Bytes', 'Chrome JS Heap MB', 'Encoder Peak RSS MB', 'Capture Seconds', 'Encode Seconds',
+                 'Status', 'Hash', 'Distance', 'Parked Match', 'File', 'Error']
+
+def screenshot_path(project_name, image_format=IMAGE_FORMAT, directory=SCREENSHOT_DIR):
+    # Use project_name for the filename, replacing spaces with underscores
+    return os.path.join(directory, f"{project_name.replace(' ', '_')}.{FORMAT_EXTENSIONS[image_format]}")
+
+def _js_heap_mb(driver):
+    metrics = driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]
+    used = next((metric["value"] for metric in metrics if metric["name"] == "JSHeapUsedSize"), 0)
+    return round(used / 1024 / 1024, 1)
+
+def capture_screenshot_tiles(driver, website, project_name, max_height=MAX_CAPTURE_HEIGHT, tile_height=TILE_HEIGHT):
+    """Capture the page as PNG tiles through CDP, without resizing the window.
+
+    Returns the tiles and the capture metrics for the report.
+    """
+    start = time.monotonic()
+    driver.execute_cdp_cmd("Performance.enable", {})
+    layout = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
+    content = layout.get("cssContentSize") or layout["contentSize"]
+    viewport = layout.get("cssLayoutViewport") or layout["layoutViewport"]
+    width = int(viewport["clientWidth"])
+    page_height = int(content["height"])
+    height = min(page_height, max_height)
+
+    tiles = []
+    for y in range(0, height, tile_height):
+        clip = {"x": 0, "y": y, "width": width, "height": min(tile_height, height - y), "scale": 1}
+        data = driver.execute_cdp_cmd("Page.captureScreenshot", {
+            "format": "png", "clip": clip, "captureBeyondViewport": True, "fromSurface": True
+        })["data"]
+        tiles.append(base64.b64decode(data))
+
+    metrics = {
+        'Project Name': project_name,
+        'Website': website,
+        'Page Height': page_height,
+        'Captured Height': height,
+        'Tiles': len(tiles),
+        'Raw Bytes': sum(len(tile) for tile in tiles),
+        'Chrome JS Heap MB': _js_heap_mb(driver),
+        'Capture Seconds': round(time.monotonic() - start, 3),
+    }
+    return tiles, metrics
 
-def capture_full_page_screenshot(index, website, project_name):
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--start-maximized")
-    chrome_options.add_argument("--disable-notifications")
-    chrome_options.add_argument("--disable-popup-blocking")
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-gpu')
-    chrome_options.add_argument("--disable-software-rasterizer")
-    chrome_options.add_argument("--disable-extensions")
-    chrome_options.add_argument("--log-level=3")  # Only show fatal errors
-    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-
-    driver = webdriver.Chrome(options=chrome_options)
+def dhash(image, hash_size):
+    """Difference hash: one bit per pixel pair of a downscaled grayscale image, as a hex string."""
+    pixels = list(image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (hash_size + 1) + col + 1])
+    return f'{bits:0{hash_size * hash_size // 4}x}'
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+def fold(image):
+    """The first 16:9 viewport of the page, padded with white when the page is shorter."""
+    height = round(image.width * 9 / 16)
+    if image.height >= height:
+        return image.crop((0, 0, image.width, height))
+    padded = Image.new('RGB', (image.width, height), 'white')
+    padded.paste(image.convert('RGB'), (0, 0))
+    return padded
+
+def load_parked_hashes(directory=PARKED_TEMPLATE_DIR):
+    """Fold hashes of the parked-domain / "for sale" template images, keyed by file name."""
+    hashes = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*'))):
+        try:
+            with Image.open(path) as image:
+                hashes[os.path.basename(path)] = dhash(fold(image), FOLD_HASH_SIZE)
+        except OSError:
+            continue
+    return hashes
+
+def _peak_rss_mb():
+    """Peak RSS of this long-lived encoder process so far (not of one encode), or None where `resource` is missing."""
     try:
-        driver.get(website)
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        
-        # Attempt to close cookie prompts (some websites open a cookie prompt)
-        # try:
-        #    cookie_buttons = driver.find_elements(By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'accept') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'agree') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'got it')]")
-        #    for button in cookie_buttons:
-        #        driver.execute_script("arguments[0].click();", button)
-        # except:
-        #    pass
-
-        # Get the height of the entire page
-        total_height = driver.execute_script("return document.body.parentNode.scrollHeight")
-        
-        # Set the viewport size to the full height
-        driver.set_window_size(1920, total_height)
-        
-        # Scroll to the bottom to ensure all elements are loaded
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(5)  # Wait for any lazy-loaded content
-        
-        # Use project_name for the filename, replacing spaces with underscores
-        filename = f"screenshots/{project_name.replace(' ', '_')}.png"
-        driver.get_screenshot_as_file(filename)
-        return f"Full page screenshot saved for {website} as {filename}"
-    except Exception as e:
-        return f"Error capturing {website}: {e}"
-    finally:
-        driver.quit()
-
-
-df = pd.read_csv('resources/mixed_data.csv')
-
-os.makedirs('screenshots', exist_ok=True)
-
-# Filter out rows with missing Website or Name
-valid_rows = df.dropna(subset=['Website', 'Name'])
-
-with ThreadPoolExecutor(max_workers=5) as executor:
-    future_to_website = {executor.submit(capture_full_page_screenshot, index, row['Website'], row['Name']): row['Website']
-                         for index, row in valid_rows.iterrows()}
-    
-    with tqdm(total=len(future_to_website), desc="Capturing screenshots", 
+        import resource  # Unix only
+    except ImportError:
+        return None
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def encode_screenshot(tiles, output_path, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY,
+                      thumbnail_path=None, thumbnail_width=THUMBNAIL_WIDTH, previous_hash=None, parked_hashes=None):
+    """Stitch PNG tiles into one image and save it (plus a thumbnail); runs in the encoder processes.
+
+    Nothing is written when the image looks the same as the one hashed last
+    time (previous_hash) and the file is still there.
+    """
+    start = time.monotonic()
+    images = [Image.open(io.BytesIO(tile)).convert('RGB') for tile in tiles]
+    width = max(image.width for image in images)
+    canvas = Image.new('RGB', (width, sum(image.height for image in images)), 'white')
+    y = 0
+    for image in images:
+        canvas.paste(image, (0, y))
+        y += image.height
+
+    if image_format == 'webp' and canvas.height > WEBP_MAX_HEIGHT:
+        canvas = canvas.crop((0, 0, width, WEBP_MAX_HEIGHT))
+
+    stats = {'Hash': dhash(canvas, PAGE_HASH_SIZE), 'Status': 'new', 'Distance': None, 'Parked Match': None,
+             'Image Bytes': None, 'Thumbnail Bytes': None}
+    fold_hash = dhash(fold(canvas), FOLD_HASH_SIZE)
+    for template, template_hash in (parked_hashes or {}).items():
+        if hamming_distance(fold_hash, template_hash) <= PARKED_THRESHOLD:
+            stats['Parked Match'] = template
+            break
+
+    if previous_hash is not None:
+        stats['Distance'] = hamming_distance(stats['Hash'], previous_hash)
+        stats['Status'] = 'changed'
+        if stats['Distance'] <= CHANGE_THRESHOLD and os.path.exists(output_path):
+            stats['Status'] = 'unchanged'
+            stats['Image Bytes'] = 0
+            stats['Encode Seconds'] = round(time.monotonic() - start, 3)
+            return stats
+
+    save_options = {'quality': quality} if image_format in ('webp', 'jpeg') else {'optimize': True}
+    canvas.save(output_path, format=image_format.upper(), **save_options)
+
+    stats['Image Bytes'] = os.path.getsize(output_path)
+    if thumbnail_path is not None:
+        thumbnail = fold(canvas)
+        thumbnail.thumbnail((thumbnail_width, thumbnail_width))
+        thumbnail.save(thumbnail_path, format=image_format.upper(), **save_options)
+        stats['Thumbnail Bytes'] = os.path.getsize(thumbnail_path)
+
+    stats['Encoder Peak RSS MB'] = _peak_rss_mb()
+    stats['Encode Seconds'] = round(time.monotonic() - start, 3)
+    return stats
+
+def capture_full_page_screenshot(index, website, project_name, pool, max_height=MAX_CAPTURE_HEIGHT):
+    """Load the page and capture its tiles; returns (tiles, metrics) or the error message."""
+    capture = lambda driver, website, project_name: capture_screenshot_tiles(driver, website, project_name, max_height)
+    result = visit_site(pool, website, project_name, {"screenshot": capture})["screenshot"]
+    if isinstance(result, Exception):
+        return f"Error capturing {website}: {result}"
+    return result
+
+
+class ScreenshotEncoder:
+    """Hands captured tiles to the encoder processes and records each result in the state store and report.
+
+    Captured tiles wait in memory, so only a few captures may queue per encoder
+    before submit() blocks on the oldest ones.
+    """
+
+    def __init__(self, encoders, max_pending, store, report, parked_hashes, image_format=IMAGE_FORMAT,
+                 quality=IMAGE_QUALITY, thumbnail_width=THUMBNAIL_WIDTH):
+        self.encoders = encoders
+        self.max_pending = max_pending
+        self.store = store
+        self.report = report
+        self.parked_hashes = parked_hashes
+        self.image_format = image_format
+        self.quality = quality
+        self.thumbnail_width = thumbnail_width
+        self.totals = {'Screenshots': 0, 'Raw Bytes': 0, 'Image Bytes': 0, 'unchanged': 0, 'parked': 0}
+        self.outcomes = {}
+        self._pending = {}
+
+    def submit(self, tiles, metrics):
+        project_name = metrics['Project Name']
+        output_path = screenshot_path(project_name, self.image_format)
+        thumbnail_path = screenshot_path(project_name, self.image_format, THUMBNAIL_DIR)
+        previous = self.store.get(project_name, STAGE)
+        previous_hash = previous['output_hash'] if previous and previous['status'] != 'failed' else None
+        future = self.encoders.submit(encode_screenshot, tiles, output_path, self.image_format, self.quality,
+                                      thumbnail_path, self.thumbnail_width, previous_hash, self.parked_hashes)
+        self._pending[future] = dict(metrics, File=output_path)
+        while len(self._pending) > self.max_pending:
+            done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._finish(future, self._pending.pop(future))
+
+    def failed(self, project_name, website, error):
+        """Record a page that couldn't be captured."""
+        self.report.write({'Project Name': project_name, 'Website': website, 'Error': str(error)})
+        self.store.mark_failed(project_name, STAGE, hash_text(project_name, website), error)
+        self.outcomes[project_name] = (False, str(error))
+
+    def _finish(self, future, metrics):
+        project_name = metrics['Project Name']
+        input_hash = hash_text(project_name, metrics['Website'])
+        try:
+            metrics.update(future.result())
+        except Exception as e:
+            metrics['Error'] = str(e)
+            self.store.mark_failed(project_name, STAGE, input_hash, e)
+            record('encode', url=metrics['Website'], error=type(e).__name__)
+            self.outcomes[project_name] = (False, str(e))
+        else:
+            # Encoding runs in another process, so its timings are recorded from the returned stats
+            record('capture', url=metrics['Website'], seconds=metrics.get('Capture Seconds'))
+            record('encode', url=metrics['Website'], seconds=metrics['Encode Seconds'], bytes=metrics['Image Bytes'])
+            self.totals['Screenshots'] += 1
+            self.totals['Raw Bytes'] += metrics['Raw Bytes']
+            self.totals['Image Bytes'] += metrics['Image Bytes']
+            # The screenshot stage's output hash is the perceptual hash; 'parked' lets gen_summary skip the site
+            status = 'parked' if metrics['Parked Match'] else ('unchanged' if metrics['Status'] == 'unchanged' else 'done')
+            self.totals[status] = self.totals.get(status, 0) + 1
+            self.store.mark_done(project_name, STAGE, input_hash, metrics['Hash'], status=status)
+            self.outcomes[project_name] = (True, status)
+        self.report.write(metrics)
+
+    def flush(self):
+        """Wait for every queued encode; returns and resets {project name: (success, result)}."""
+        for future in list(self._pending):
+            self._finish(future, self._pending.pop(future))
+        outcomes, self.outcomes = self.outcomes, {}
+        return outcomes
+
+    def summary(self, report_csv):
+        totals = self.totals
+        return (f"{totals['Screenshots']} screenshots taken ({totals['unchanged']} visually unchanged and not rewritten, "
+                f"{totals['parked']} matching a parked-domain template): {totals['Raw Bytes'] / 1e6:.1f} MB captured, "
+                f"{totals['Image Bytes'] / 1e6:.1f} MB written. Report saved to {report_csv}")
+
+
+def open_screenshot_report(report_csv=REPORT_CSV):
+    """Start a new screenshot report; it covers one run only."""
+    if os.path.exists(report_csv):
+        os.remove(report_csv)
+    return QueuedCsvWriter(report_csv, REPORT_FIELDS).start()
+
+
+def capture_rows(valid_rows, frontier, pool, encoder, store, args):
+    """Capture a screenshot of every row and encode it; returns {project name: (success, result)}."""
+    # Order by when the info stage last crawled each project
+    for index, row in valid_rows.iterrows():
+        frontier.add(row['Website'], item=(index, row['Website'], row['Name']),
+                     priority=state_priority(store, "info", row['Name'], args.order))
+
+    # Drivers only capture; stitching and encoding happen in separate processes
+    with tqdm(total=len(valid_rows), desc="Capturing screenshots",
               bar_format="{l_bar}\033[94m{bar}\033[0m{r_bar}") as pbar:
-        for future in as_completed(future_to_website):
-            result = future.result()
+        capture = lambda item: capture_full_page_screenshot(*item, pool, max_height=args.max_height)
+        for (index, website, project_name), result in frontier.run(capture, args.workers):
+            if isinstance(result, tuple):
+                encoder.submit(*result)
+            else:
+                encoder.failed(project_name, website, result)
             pbar.update(1)
 
+    return encoder.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture full-page screenshots into screenshots/PROJECT_NAME.webp")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Number of concurrent Chrome drivers')
+    parser.add_argument('--encoders', type=int, default=ENCODE_WORKERS, help='Number of image encoding processes')
+    parser.add_argument('--format', choices=list(FORMAT_EXTENSIONS), default=IMAGE_FORMAT, help='Image format')
+    parser.add_argument('--quality', type=int, default=IMAGE_QUALITY, help='WebP/JPEG quality (0-100)')
+    parser.add_argument('--max-height', type=int, default=MAX_CAPTURE_HEIGHT, help='Maximum captured page height in pixels')
+    parser.add_argument('--thumbnail-width', type=int, default=THUMBNAIL_WIDTH, help='Thumbnail width in pixels')
+    parser.add_argument('--mark-parked', nargs='+', metavar='PROJECT_NAME',
+                        help=f'Add the current screenshots of these projects to {PARKED_TEMPLATE_DIR} and exit')
+    add_frontier_arguments(parser)
+    add_worker_arguments(parser)
+    add_resource_arguments(parser, policy='full')
+    args = parser.parse_args()
+
+    if args.mark_parked:
+        os.makedirs(PARKED_TEMPLATE_DIR, exist_ok=True)
+        for project_name in args.mark_parked:
+            path = screenshot_path(project_name, args.format)
+            shutil.copy(path, PARKED_TEMPLATE_DIR)
+            print(f"Added {path} to the parked-domain templates")
+        return
+
+    setup_wait_logging()
+
+    os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+
+    frontier = frontier_from_args(args)
+    store = StateStore()
+
+    parked_hashes = load_parked_hashes()
+    print(f"Loaded {len(parked_hashes)} parked-domain templates from {PARKED_TEMPLATE_DIR}")
+
+    # The report covers this run only; each queue worker writes its own
+    report_csv = f"{os.path.splitext(REPORT_CSV)[0]}.{worker_id()}.csv" if args.worker else REPORT_CSV
+    report = open_screenshot_report(report_csv)
+
+    with DriverPool(size=args.workers, policy=args.policy, max_rss_mb=args.max_chrome_mb) as pool, \
+            ProcessPoolExecutor(max_workers=args.encoders) as encoders:
+        encoder = ScreenshotEncoder(encoders, 2 * args.encoders, store, report, parked_hashes,
+                                    args.format, args.quality, args.thumbnail_width)
+        if args.worker:
+            run_worker(QUEUE, lambda tasks: capture_rows(pd.DataFrame([task.payload for task in tasks]), frontier, pool,
+                                                         encoder, store, args), args)
+        else:
+            df = pd.read_csv('resources/mixed_data.csv')
+
+            # Filter out rows with missing Website or Name
+            valid_rows = df.dropna(subset=['Website', 'Name'])
+            capture_rows(valid_rows, frontier, pool, encoder, store, args)
+    report.close()
+    store.close()
+
+    print(encoder.summary(report_csv))
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,222 @@
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-import time
+import argparse
 import os
 
-def scrape_project_info(index, website, project_name):
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--start-maximized")
-    chrome_options.add_argument("--disable-notifications")
-    chrome_options.add_argument("--disable-popup-blocking")
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-gpu')
-    chrome_options.add_argument("--disable-software-rasterizer")
-    chrome_options.add_argument("--disable-extensions")
-    chrome_options.add_argument("--log-level=3")  # Only show fatal errors
-    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-
-    driver = webdriver.Chrome(options=chrome_options)
+from driver_pool import DriverPool
+from crawl import visit_site, setup_wait_logging
+from frontier import add_frontier_arguments, frontier_from_args, state_priority
+from page_archive import PageArchive
+from resource_policy import add_resource_arguments
+from static_fetch import extract_page, fetch_tiered, write_fetch_stats
+from state_store import StateStore, add_state_arguments, hash_file, hash_text
+from telemetry import span
+from work_queue import add_worker_arguments, run_worker
+
+MAX_WORKERS = 5
+STAGE = "info"
+# Fetch results meaning the page is byte-for-byte what we scraped last time
+UNCHANGED_CACHE = ('not modified', 'unchanged')
+
+def format_project_info(project_name, website, page):
+    """Build the info text from the fields collected off a page."""
+    # Extract relevant information
+    info = f"Project Name: {project_name}\n"
+    info += f"Website: {website}\n\n"
+
+    # Meta description
+    if page['meta_description'] is not None:
+        info += f"Meta Description: {page['meta_description']}\n\n"
+
+    # Title
+    info += f"Page Title: {page['title']}\n\n"
+
+    # All headers (h1, h2, h3)
+    info += "Headers:\n" + "\n".join([h for h in page['headers'] if h.strip()]) + "\n\n"
+
+    # Main content (paragraphs, lists, etc.)
+    info += "Main Content:\n" + "\n".join([text for text in page['main_content'] if text.strip()]) + "\n\n"
+
+    # About section (common in many websites)
+    if page['about_sections']:
+        info += "About Section:\n"
+        for section in page['about_sections'][:3]:  # Limit to first 3 matches
+            info += section + "\n\n"
+
+    # Mission or Vision statements
+    if page['mission_elements']:
+        info += "Mission/Vision:\n"
+        for element in page['mission_elements'][:2]:  # Limit to first 2 matches
+            info += element + "\n\n"
+
+    return info
+
+def info_path(project_name):
+    return f"info/{project_name.replace(' ', '_')}.txt"
+
+def save_project_info(project_name, website, info):
+    filename = info_path(project_name)
+    with span('write', url=website, output='info'), open(filename, 'w', encoding='utf-8') as f:
+        f.write(info)
+
+    return f"Information saved for {website} as {filename}"
+
+def extract_project_info(driver, website, project_name):
+    """Collect the info fields from an already-loaded page and save them to info/."""
+    page = {}
+
+    # Meta description
     try:
-        driver.get(website)
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        
-        # Scroll to the bottom to ensure all elements are loaded
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(5)  # Wait for any lazy-loaded content
-        
-        # Extract relevant information
-        info = f"Project Name: {project_name}\n"
-        info += f"Website: {website}\n\n"
-        
-        # Meta description
-        try:
-            meta_description = driver.find_element(By.XPATH, "//meta[@name='description']").get_attribute("content")
-            info += f"Meta Description: {meta_description}\n\n"
-        except:
-            pass
-        
-        # Title
-        info += f"Page Title: {driver.title}\n\n"
-        
-        # All headers (h1, h2, h3)
-        headers = driver.find_elements(By.XPATH, "//h1 | //h2 | //h3")
-        info += "Headers:\n" + "\n".join([h.text for h in headers if h.text.strip()]) + "\n\n"
-        
-        # Main content (paragraphs, lists, etc.)
-        main_content = driver.find_elements(By.XPATH, "//p | //ul | //ol")
-        info += "Main Content:\n" + "\n".join([elem.text for elem in main_content if elem.text.strip()]) + "\n\n"
-        
-        # About section (common in many websites)
-        about_sections = driver.find_elements(By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'about')]")
-        if about_sections:
-            info += "About Section:\n"
-            for section in about_sections[:3]:  # Limit to first 3 matches
-                info += section.text + "\n\n"
-        
-        # Mission or Vision statements
-        mission_elements = driver.find_elements(By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'mission') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'vision')]")
-        if mission_elements:
-            info += "Mission/Vision:\n"
-            for element in mission_elements[:2]:  # Limit to first 2 matches
-                info += element.text + "\n\n"
-        
-
-        filename = f"info/{project_name.replace(' ', '_')}.txt"
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(info)
-        
-        return f"Information saved for {website} as {filename}"
-    except Exception as e:
-        return f"Error scraping {website}: {e}"
-    finally:
-        driver.quit()
-
-df = pd.read_csv('resources/mixed_data.csv')
-
-
-os.makedirs('info', exist_ok=True)
-
-# Filter out rows with missing Website or Name
-valid_rows = df.dropna(subset=['Website', 'Name'])
-
-
-with ThreadPoolExecutor(max_workers=5) as executor:
-    future_to_website = {executor.submit(scrape_project_info, index, row['Website'], row['Name']): row['Website']
-                         for index, row in valid_rows.iterrows()}
-    
-   
-    with tqdm(total=len(future_to_website), desc="Scraping project info", 
+        page['meta_description'] = driver.find_element(By.XPATH, "//meta[@name='description']").get_attribute("content")
+    except:
+        page['meta_description'] = None
+
+    page['title'] = driver.title
+    page['headers'] = [h.text for h in driver.find_elements(By.XPATH, "//h1 | //h2 | //h3")]
+    page['main_content'] = [elem.text for elem in driver.find_elements(By.XPATH, "//p | //ul | //ol")]
+    page['about_sections'] = [section.text for section in driver.find_elements(By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'about')]")[:3]]
+    page['mission_elements'] = [element.text for element in driver.find_elements(By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'mission') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'vision')]")[:2]]
+
+    return save_project_info(project_name, website, format_project_info(project_name, website, page))
+
+def scrape_project_info(index, website, project_name, pool, archive=None):
+    extractors = {"info": extract_project_info}
+    if archive is not None:
+        extractors["archive"] = lambda driver, website, project_name: archive.save(website, driver.page_source, kind='rendered')
+    result = visit_site(pool, website, project_name, extractors)["info"]
+    if isinstance(result, Exception):
+        return False, f"Error scraping {website}: {result}"
+    return True, result
+
+def extract_offline(rows, archive, store, input_hashes):
+    """Rebuild info files from archived pages, preferring the Chrome-rendered copy."""
+    missing = 0
+    for _, row in tqdm(rows.iterrows(), total=len(rows), desc="Extracting from archive"):
+        html = archive.load(row['Website'], kind='rendered') or archive.load(row['Website'])
+        if html is None:
+            missing += 1
+            continue
+        info = format_project_info(row['Name'], row['Website'], extract_page(html))
+        save_project_info(row['Name'], row['Website'], info)
+        store.mark_done(row['Name'], STAGE, input_hashes[row['Name']], hash_text(info))
+    print(f"{len(rows) - missing} projects re-extracted, {missing} not in the archive")
+
+def pending_rows(rows, store, args):
+    """Rows that have to be (re)scraped, and the input hash of every row."""
+    input_hashes = {row['Name']: hash_text(row['Name'], row['Website']) for _, row in rows.iterrows()}
+    pending = rows['Name'].map(lambda name: store.needs_run(
+        name, STAGE, input_hashes[name], force=args.force, since=args.since, output_path=info_path(name))).astype(bool)
+    return rows[pending], input_hashes
+
+def scrape_rows(valid_rows, input_hashes, store, archive, frontier, pool, args, stats_csv=None):
+    """Scrape the info of every row, over HTTP when possible; returns {project name: (success, result)}."""
+    outcomes = {}
+    priorities = {row['Website']: state_priority(store, STAGE, row['Name'], args.order) for _, row in valid_rows.iterrows()}
+
+    # Fast path: sites whose text is in the initial HTML don't need Chrome.
+    # Requests are conditional on what the archive holds from the last run.
+    static_pages, browser_websites, stats = fetch_tiered(valid_rows['Website'], frontier=frontier,
+                                                         priority=priorities.get, archive=archive)
+    if stats_csv is not None:
+        write_fetch_stats(stats, stats_csv)
+    print(f"{len(static_pages)} sites scraped over HTTP, {len(browser_websites)} need a browser")
+
+    # Unchanged pages keep their info file, and the state store keeps the old
+    # output hash, so the summary and wiki stages skip them too
+    unchanged = set()
+    for _, row in valid_rows.iterrows():
+        website = row['Website']
+        if stats.get(website, {}).get('Cache') not in UNCHANGED_CACHE or not os.path.exists(info_path(row['Name'])):
+            continue
+        if website in browser_websites and archive.get(website, kind='rendered') is None:
+            continue
+        previous = store.get(row['Name'], STAGE)
+        output_hash = previous['output_hash'] if previous else hash_file(info_path(row['Name']))
+        store.mark_done(row['Name'], STAGE, input_hashes[row['Name']], output_hash, status='unchanged')
+        unchanged.add(row['Name'])
+        outcomes[row['Name']] = (True, 'unchanged')
+    print(f"{len(unchanged)} sites unchanged since the last scrape")
+    valid_rows = valid_rows[~valid_rows['Name'].isin(unchanged)]
+
+    for _, row in valid_rows[valid_rows['Website'].isin(static_pages)].iterrows():
+        info = format_project_info(row['Name'], row['Website'], static_pages[row['Website']])
+        save_project_info(row['Name'], row['Website'], info)
+        store.mark_done(row['Name'], STAGE, input_hashes[row['Name']], hash_text(info))
+        outcomes[row['Name']] = (True, 'done')
+
+    browser_rows = valid_rows[valid_rows['Website'].isin(browser_websites)]
+
+    for index, row in browser_rows.iterrows():
+        frontier.add(row['Website'], item=(index, row['Website'], row['Name']), priority=priorities[row['Website']])
+
+    with tqdm(total=len(browser_rows), desc="Scraping project info",
               bar_format="{l_bar}\033[95m{bar}\033[0m{r_bar}") as pbar:
-        for future in as_completed(future_to_website):
-            result = future.result()
+        for (index, website, project_name), (success, result) in frontier.run(
+                lambda item: scrape_project_info(*item, pool, archive), args.workers):
+            if success:
+                store.mark_done(project_name, STAGE, input_hashes[project_name], hash_file(info_path(project_name)))
+            else:
+                store.mark_failed(project_name, STAGE, input_hashes[project_name], result)
+            outcomes[project_name] = (success, 'done' if success else result)
             pbar.update(1)
+    return outcomes
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape project websites into info/PROJECT_NAME.txt")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='Number of concurrent Chrome drivers')
+    add_state_arguments(parser)
+    add_frontier_arguments(parser)
+    add_worker_arguments(parser)
+    add_resource_arguments(parser)
+    parser.add_argument('--offline', action='store_true',
+                        help='Re-extract info from the archived pages without touching the network')
+    args = parser.parse_args()
+
+    setup_wait_logging()
+
+    os.makedirs('info', exist_ok=True)
+    store = StateStore()
+    archive = PageArchive()
+    frontier = frontier_from_args(args)
+
+    if args.worker:
+        def scrape_tasks(tasks):
+            rows, input_hashes = pending_rows(pd.DataFrame([task.payload for task in tasks]), store, args)
+            outcomes = {task.key: (True, 'skipped') for task in tasks}
+            if len(rows):
+                outcomes.update(scrape_rows(rows, input_hashes, store, archive, frontier, pool, args))
+            return outcomes
+
+        with DriverPool(size=args.workers, policy=args.policy, max_rss_mb=args.max_chrome_mb) as pool:
+            run_worker(STAGE, scrape_tasks, args)
+        archive.close()
+        store.close()
+        return
+
+    df = pd.read_csv('resources/mixed_data.csv')
+
+    # Filter out rows with missing Website or Name
+    valid_rows = df.dropna(subset=['Website', 'Name'])
+
+    # Skip projects that were already scraped for the same website
+    pending, input_hashes = pending_rows(valid_rows, store, args)
+
+    if args.offline:
+        # Re-extraction is the point of --offline (e.g. after changing the extractor), so every project is redone
+        extract_offline(valid_rows, archive, store, input_hashes)
+        archive.close()
+        store.close()
+        return
+
+    print(f"Skipping {len(valid_rows) - len(pending)} projects scraped earlier")
+    valid_rows = pending
+
+    with DriverPool(size=args.workers, policy=args.policy, max_rss_mb=args.max_chrome_mb) as pool:
+        scrape_rows(valid_rows, input_hashes, store, archive, frontier, pool, args, 'resources/info_fetch_stats.csv')
+
+    archive.close()
+    store.close()
 
+if __name__ == "__main__":
+    main()
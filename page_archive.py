@@ -0,0 +1,121 @@
+"""On-disk archive of fetched pages with their HTTP validators.
+
+Bodies are stored gzip-compressed and content-addressed under
+archive/objects/ (identical pages are stored once). archive/index.db maps each
+URL to its latest body hash, ETag and Last-Modified. The static fetcher uses
+this to send conditional requests and to tell whether a page changed since the
+last run. Rendered HTML from Chrome is archived as well, under the 'rendered'
+kind, so the extractors can be re-run offline.
+"""
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+ARCHIVE_DIR = 'archive'
+
+
+class PageArchive:
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                status INTEGER,
+                content_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (url, kind)
+            )
+        ''')
+        self._conn.commit()
+
+    def _object_path(self, body_hash):
+        return os.path.join(self.root, 'objects', body_hash[:2], f'{body_hash}.gz')
+
+    def get(self, url, kind='http'):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, content_type, etag, last_modified, body_hash, fetched_at FROM pages WHERE url = ? AND kind = ?',
+                (url, kind)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('status', 'content_type', 'etag', 'last_modified', 'body_hash', 'fetched_at'), row))
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since headers for the archived copy of a URL."""
+        record = self.get(url)
+        if record is None or not os.path.exists(self._object_path(record['body_hash'])):
+            return {}
+        headers = {}
+        if record['etag']:
+            headers['If-None-Match'] = record['etag']
+        if record['last_modified']:
+            headers['If-Modified-Since'] = record['last_modified']
+        return headers
+
+    def load(self, url, kind='http'):
+        """Archived body of a URL as text, or None if it was never archived."""
+        record = self.get(url, kind)
+        if record is None:
+            return None
+        try:
+            with gzip.open(self._object_path(record['body_hash']), 'rb') as f:
+                return f.read().decode('utf-8', errors='replace')
+        except FileNotFoundError:
+            return None
+
+    def save(self, url, body, kind='http', status=200, content_type=None, etag=None, last_modified=None):
+        """Archive a body; returns True when it differs from the previously archived one."""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._object_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{threading.get_ident()}.tmp'
+            with gzip.open(temp_path, 'wb') as f:
+                f.write(body)
+            os.replace(temp_path, path)
+
+        previous = self.get(url, kind)
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO pages (url, kind, status, content_type, etag, last_modified, body_hash, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url, kind) DO UPDATE SET
+                    status = excluded.status,
+                    content_type = excluded.content_type,
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    body_hash = excluded.body_hash,
+                    fetched_at = excluded.fetched_at
+            ''', (url, kind, status, content_type, etag, last_modified, body_hash, time.time()))
+            self._conn.commit()
+        return previous is None or previous['body_hash'] != body_hash
+
+    def touch(self, url, kind='http'):
+        """Record that the archived copy was revalidated (e.g. after a 304)."""
+        with self._lock:
+            self._conn.execute('UPDATE pages SET fetched_at = ? WHERE url = ? AND kind = ?', (time.time(), url, kind))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,313 @@
+"""Run the whole workflow as one streaming pipeline.
+
+Instead of running each script over the full corpus before starting the
+next, projects flow through the scrape, summarize and publish stages one by
+one: a project is summarized as soon as its scrape finishes and published as
+soon as its summary is written. Every stage has its own worker threads and a
+bounded input queue, so a slow stage fills its queue and blocks the one
+before it (backpressure) instead of letting work pile up.
+
+The listing stage (c_copy_export + export_unique) is the exception: the
+deduplication needs every project at once, so it runs to completion first and
+the streaming starts from the resulting resources/mixed_data.csv. Each stage
+keeps using the state store, so up-to-date projects pass straight through and
+`--stages` can run any subset on its own (e.g. `--stages summarize publish`).
+"""
+import argparse
+import os
+import queue
+import statistics
+import threading
+import time
+from contextlib import ExitStack
+
+import pandas as pd
+from tqdm import tqdm
+
+from frontier import add_frontier_arguments, frontier_from_args, state_priority
+from resource_policy import add_resource_arguments
+from state_store import StateStore, add_state_arguments, hash_file, hash_text
+from telemetry import record
+
+STAGES = ('listing', 'scrape', 'summarize', 'publish')
+QUEUE_SIZE = 32
+SCRAPE_WORKERS = 5
+# How long a scrape worker waits for its domain's frontier slot before failing the project
+SCRAPE_SLOT_TIMEOUT = 600
+SUMMARIZE_WORKERS = 16
+PUBLISH_WORKERS = 4
+PROJECTS_CSV = 'resources/mixed_data.csv'
+
+_DONE = object()
+
+
+class Stage:
+    """One pipeline step: function(item) returns the items handed to the next stage."""
+
+    def __init__(self, name, function, workers=1):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.received = 0
+        self.passed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+
+
+def run_pipeline(items, stages, queue_size=QUEUE_SIZE):
+    """Stream items through the stages in order and return the latency of every item that made it through.
+
+    A stage function that raises is reported and its item dropped. Latency
+    is measured from when an item leaves `items` until it leaves the last
+    stage.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    lock = threading.Lock()
+    latencies = []
+    bars = [tqdm(desc=f"{stage.name:>9}", position=i, unit=" projects") for i, stage in enumerate(stages)]
+
+    def worker(index):
+        stage = stages[index]
+        while (entry := queues[index].get()) is not _DONE:
+            item, entered = entry
+            started = time.monotonic()
+            failed = False
+            try:
+                outputs = list(stage.function(item) or [])
+            except Exception as e:
+                tqdm.write(f"{stage.name} failed for {item.get('Name', item) if isinstance(item, dict) else item}: {e}")
+                outputs, failed = [], True
+            finished = time.monotonic()
+            for output in outputs:
+                if index + 1 < len(stages):
+                    queues[index + 1].put((output, entered))  # Blocks while the next stage is behind
+                else:
+                    with lock:
+                        latencies.append(time.monotonic() - entered)
+            with lock:
+                stage.received += 1
+                stage.passed += len(outputs)
+                stage.failed += failed
+                stage.busy += finished - started
+                stage.blocked += time.monotonic() - finished
+            bars[index].update(1)
+
+    # Daemon threads, so Ctrl-C stops the run; everything finished so far is in the state store
+    threads = [[threading.Thread(target=worker, args=(i,), name=f'{stage.name}-{n}', daemon=True)
+                for n in range(stage.workers)] for i, stage in enumerate(stages)]
+    for stage_threads in threads:
+        for thread in stage_threads:
+            thread.start()
+
+    try:
+        for item in items:
+            queues[0].put((item, time.monotonic()))
+    finally:
+        # Shut the stages down in order, each once everything upstream has drained into it
+        for stage, stage_queue, stage_threads in zip(stages, queues, threads):
+            for _ in stage_threads:
+                stage_queue.put(_DONE)
+            for thread in stage_threads:
+                thread.join()
+        for bar in bars:
+            bar.close()
+    return latencies
+
+
+def print_stage_stats(stages, elapsed, latencies):
+    print(f"\n{'stage':>9} {'workers':>7} {'in':>6} {'out':>6} {'failed':>6} {'busy':>7} {'blocked':>8}")
+    for stage in stages:
+        record('pipeline_stage', stage=stage.name, workers=stage.workers, received=stage.received, passed=stage.passed,
+               failed=stage.failed, busy_seconds=round(stage.busy, 3), blocked_seconds=round(stage.blocked, 3))
+        # Share of the workers' time spent working; 'blocked' is time spent waiting on the next stage
+        busy = stage.busy / (stage.workers * elapsed) if elapsed else 0
+        print(f"{stage.name:>9} {stage.workers:>7} {stage.received:>6} {stage.passed:>6} {stage.failed:>6} "
+              f"{busy:>7.0%} {stage.blocked:>7.1f}s")
+    if latencies:
+        print(f"{len(latencies)} projects through in {elapsed:.1f}s: first after {min(latencies):.1f}s, "
+              f"median latency {statistics.median(latencies):.1f}s")
+
+
+def run_listing(args):
+    """Refresh resources/mixed_data.csv from carboncopy.news and the PositiveBlockchain export."""
+    from c_copy_export import CARBONCOPY_URL, CARBONCOPY_CSV, scrape_projects, save_to_csv
+    from export_unique import (POSITIVEBLOCKCHAIN_CSV, OUTPUT_CSV, combine_and_save, read_carboncopy_csv,
+                               read_positiveblockchain_csv)
+
+    projects = scrape_projects(CARBONCOPY_URL, refresh_listing=args.refresh_listing, workers=args.scrape_workers)
+    save_to_csv(projects, CARBONCOPY_CSV)
+    unique_data, report = combine_and_save(read_carboncopy_csv(CARBONCOPY_CSV),
+                                           read_positiveblockchain_csv(POSITIVEBLOCKCHAIN_CSV), OUTPUT_CSV,
+                                           fuzzy=args.fuzzy)
+    print(f"{len(unique_data)} projects listed, {len(report)} duplicates merged")
+
+
+def scrape_stage(store, frontier, pool, archive, fetcher, force=False, since=None, slot_timeout=SCRAPE_SLOT_TIMEOUT):
+    """Scrape a project's website into info/, over HTTP (through the shared StaticFetcher) when possible and with Chrome otherwise."""
+    from info_export import (STAGE, UNCHANGED_CACHE, format_project_info, info_path, save_project_info,
+                             scrape_project_info)
+
+    def scrape_site(row):
+        name, website = row['Name'], row['Website']
+        input_hash = hash_text(name, website)
+        page, stats = fetcher.fetch(website)
+        if stats.get('Cache') in UNCHANGED_CACHE and os.path.exists(info_path(name)) and (
+                page is not None or archive.get(website, kind='rendered') is not None):
+            previous = store.get(name, STAGE)
+            output_hash = previous['output_hash'] if previous else hash_file(info_path(name))
+            store.mark_done(name, STAGE, input_hash, output_hash, status='unchanged')
+        elif page is not None:
+            info = format_project_info(name, website, page)
+            save_project_info(name, website, info)
+            store.mark_done(name, STAGE, input_hash, hash_text(info))
+        else:
+            success, result = scrape_project_info(None, website, name, pool, archive)
+            if not success:
+                store.mark_failed(name, STAGE, input_hash, result)
+                tqdm.write(result)
+                return []
+            store.mark_done(name, STAGE, input_hash, hash_file(info_path(name)))
+        return [row]
+
+    def scrape(row):
+        if pd.isna(row.get('Website')):
+            return []
+        if not store.needs_run(row['Name'], STAGE, hash_text(row['Name'], row['Website']), force=force, since=since,
+                               output_path=info_path(row['Name'])):
+            return [row]
+        # Each worker scrapes its own project once the shared frontier has a slot for its domain,
+        # so the per-domain limits and Crawl-delay hold across all workers
+        website = row['Website']
+        frontier.load_robots([website])  # Only fetches robots.txt the first time an origin comes up
+        if not frontier.acquire(website, timeout=slot_timeout):
+            error = f"No crawl slot for {website} within {slot_timeout} seconds"
+            store.mark_failed(row['Name'], STAGE, hash_text(row['Name'], row['Website']), error)
+            tqdm.write(error)
+            return []
+        try:
+            return scrape_site(row)
+        finally:
+            frontier.done(website)
+
+    return scrape
+
+
+def summarize_stage(store, engine, model, include_parked=False, dead_check=True, force=False, since=None):
+    """Summarize a project's info as soon as it is scraped."""
+    import gen_summary
+
+    def summarize(row):
+        name = row['Name']
+        project_info = gen_summary.read_project_info(gen_summary.info_path(name))
+        input_hash = gen_summary.summary_input_hash(project_info)
+        if not store.needs_run(name, gen_summary.STAGE, input_hash, force=force, since=since,
+                               output_path=gen_summary.summary_path(name)):
+            return [row]
+        if gen_summary.skip_reason(store, name, model, include_parked=include_parked, dead_check=dead_check):
+            gen_summary.record_skipped(store, name, input_hash)
+            return []
+        _, summary = engine.summarize_blocking(name, project_info)
+        return [row] if gen_summary.record_summary(store, name, input_hash, summary) else []
+
+    return summarize
+
+
+def publish_stage(store, publisher, force=False, since=None):
+    """Publish a project's wiki page as soon as its summary is written."""
+    from gen_wikis import STAGE, build_wiki_page, record_outcome
+
+    def publish(row):
+        page = build_wiki_page(row['Name'], row['Website'])
+        if page is None:
+            return []
+        title, content, input_hash = page
+        if not store.needs_run(row['Name'], STAGE, input_hash, force=force, since=since):
+            return [row]
+        outcome = publisher.edit(title, content)
+        record_outcome(store, row['Name'], input_hash, outcome)
+        return [row] if outcome in ("created", "edited", "unchanged") else []
+
+    return publish
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run listing, scraping, summarizing and publishing as one streaming pipeline")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES),
+                        help='Stages to run (always in pipeline order); projects come from resources/mixed_data.csv '
+                             'when the listing stage is left out')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                        help='Projects that may wait in front of each stage before the one before it blocks')
+    parser.add_argument('--scrape-workers', type=int, default=SCRAPE_WORKERS, help='Concurrent scrapes (and Chrome drivers)')
+    parser.add_argument('--summarize-workers', type=int, default=SUMMARIZE_WORKERS,
+                        help='Projects being summarized at once (the API concurrency still adapts below this)')
+    parser.add_argument('--publish-workers', type=int, default=PUBLISH_WORKERS, help='Concurrent wiki edits')
+    parser.add_argument('--refresh-listing', action='store_true', help='Walk the carboncopy listing again')
+    parser.add_argument('--fuzzy', action='store_true', help='Also merge projects with near-identical names')
+    parser.add_argument('--include-parked', action='store_true', help='Also summarize sites flagged as parked')
+    parser.add_argument('--no-dead-check', action='store_true', help='Send every site to the API')
+    add_state_arguments(parser)
+    add_frontier_arguments(parser)
+    add_resource_arguments(parser)
+    args = parser.parse_args()
+    selected = [name for name in STAGES if name in args.stages]
+
+    if 'listing' in selected:
+        run_listing(args)
+
+    store = StateStore()
+    rows = pd.read_csv(PROJECTS_CSV).dropna(subset=['Name']).to_dict('records')
+    if 'scrape' in selected and args.order != 'input':
+        rows.sort(key=lambda row: state_priority(store, 'info', row['Name'], args.order))
+
+    stages = []
+    with ExitStack() as stack:
+        if 'scrape' in selected:
+            from crawl import setup_wait_logging
+            from driver_pool import DriverPool
+            from page_archive import PageArchive
+            from static_fetch import StaticFetcher
+
+            setup_wait_logging()
+            os.makedirs('info', exist_ok=True)
+            pool = stack.enter_context(DriverPool(size=args.scrape_workers, policy=args.policy,
+                                                  max_rss_mb=args.max_chrome_mb))
+            archive = stack.enter_context(PageArchive())
+            fetcher = stack.enter_context(StaticFetcher(archive=archive))
+            stages.append(Stage('scrape', scrape_stage(store, frontier_from_args(args), pool, archive, fetcher,
+                                                       force=args.force, since=args.since), args.scrape_workers))
+        if 'summarize' in selected:
+            import gen_summary
+            from dead_site import DeadSiteModel
+            from summary_cache import SummaryCache
+            from summary_engine import SummaryEngine
+
+            os.makedirs('summaries', exist_ok=True)
+            cache = SummaryCache(gen_summary.MODEL, gen_summary.SYSTEM_MESSAGE, gen_summary.PROMPT_TEMPLATE)
+            cache.evict()
+            stack.callback(cache.close)
+            engine = SummaryEngine(gen_summary.MODEL, gen_summary.SYSTEM_MESSAGE, gen_summary.PROMPT_TEMPLATE,
+                                   api_key=os.getenv("OPENAI_API_KEY"), cache=cache,
+                                   max_concurrency=args.summarize_workers).start()
+            stack.callback(engine.stop)
+            model = None if args.no_dead_check else DeadSiteModel.load()
+            stages.append(Stage('summarize', summarize_stage(store, engine, model, include_parked=args.include_parked,
+                                                             dead_check=not args.no_dead_check,
+                                                             force=args.force, since=args.since),
+                                args.summarize_workers))
+        if 'publish' in selected:
+            from gen_wikis import WikiPublisher, create_oauth_session
+
+            publisher = WikiPublisher(create_oauth_session(), max_workers=args.publish_workers)
+            stages.append(Stage('publish', publish_stage(store, publisher, force=args.force, since=args.since),
+                                args.publish_workers))
+
+        if stages:
+            start = time.monotonic()
+            latencies = run_pipeline(rows, stages, queue_size=args.queue_size)
+            print_stage_stats(stages, time.monotonic() - start, latencies)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
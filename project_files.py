@@ -0,0 +1,20 @@
+"""File names of the per-project outputs shared between the stage scripts."""
+import re
+
+SUMMARY_DIR = 'summaries'
+
+
+def sanitize_file_name(file_name):
+    # Replace or remove special characters
+    sanitized_name = re.sub(r'[<>:"/\\|?*]', '_', file_name)
+    return sanitized_name
+
+
+def project_file_name(project_name):
+    """NAME.txt, with spaces and the characters removed by sanitize_file_name replaced by '_'."""
+    return f'{sanitize_file_name(project_name.replace(" ", "_"))}.txt'
+
+
+def summary_path(project_name):
+    """Summary written by gen_summary.py and published by gen_wikis.py."""
+    return f'{SUMMARY_DIR}/{project_file_name(project_name)}'
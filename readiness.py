@@ -0,0 +1,153 @@
+"""Adaptive page-readiness detection used instead of fixed time.sleep() waits.
+
+A page is considered ready once `document.readyState` is complete, lazy-loaded
+content has been scrolled into view, the network has gone idle (read from the
+Chrome performance log) and the DOM has stopped mutating. Every wait has an
+upper bound, and the time spent on each is logged per page so the bounds can
+be tuned.
+"""
+import json
+import logging
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+READY_STATE_TIMEOUT = 10
+SCROLL_TIMEOUT = 5
+SCROLL_STEP_PAUSE = 0.2
+SCROLL_MAX_STEPS = 30
+NETWORK_IDLE_TIMEOUT = 5
+NETWORK_QUIET_PERIOD = 0.5
+# Long-polling and analytics beacons often never finish, so tolerate a couple
+NETWORK_MAX_INFLIGHT = 2
+DOM_QUIET_TIMEOUT = 3
+DOM_QUIET_PERIOD = 0.5
+POLL_INTERVAL = 0.1
+
+logger = logging.getLogger("readiness")
+
+DOM_OBSERVER_SCRIPT = """
+if (!window.__iefObserver) {
+    window.__iefLastMutation = performance.now();
+    window.__iefObserver = new MutationObserver(function () { window.__iefLastMutation = performance.now(); });
+    window.__iefObserver.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return performance.now() - window.__iefLastMutation;
+"""
+
+SCROLL_SCRIPT = """
+window.scrollBy(0, window.innerHeight);
+return [window.scrollY + window.innerHeight, document.documentElement.scrollHeight];
+"""
+
+
+def reset_network_log(driver):
+    """Drop buffered performance log entries so idle detection only sees the next page."""
+    try:
+        driver.get_log('performance')
+    except WebDriverException:
+        pass
+
+
+def wait_for_ready_state(driver, timeout=READY_STATE_TIMEOUT):
+    """Wait until document.readyState is complete. Returns (seconds, settled)."""
+    start = time.monotonic()
+    while True:
+        try:
+            if driver.execute_script("return document.readyState") == "complete":
+                return time.monotonic() - start, True
+        except WebDriverException:
+            pass
+        if time.monotonic() - start >= timeout:
+            return time.monotonic() - start, False
+        time.sleep(POLL_INTERVAL)
+
+
+def scroll_lazy_content(driver, timeout=SCROLL_TIMEOUT, step_pause=SCROLL_STEP_PAUSE, max_steps=SCROLL_MAX_STEPS):
+    """Scroll one viewport at a time until the bottom stops moving. Returns (seconds, settled)."""
+    start = time.monotonic()
+    last_height = None
+    for _ in range(max_steps):
+        bottom, height = driver.execute_script(SCROLL_SCRIPT)
+        if bottom >= height and height == last_height:
+            return time.monotonic() - start, True
+        last_height = height
+        if time.monotonic() - start >= timeout:
+            break
+        time.sleep(step_pause)
+    return time.monotonic() - start, False
+
+
+def wait_for_network_idle(driver, timeout=NETWORK_IDLE_TIMEOUT, quiet_period=NETWORK_QUIET_PERIOD,
+                          max_inflight=NETWORK_MAX_INFLIGHT, traffic=None):
+    """Wait until at most max_inflight requests are pending for quiet_period seconds.
+
+    Uses the Network events Chrome writes to the performance log, which are
+    also handed to `traffic` (a resource_policy.TrafficCounter) when given.
+    Returns (seconds, settled); settled is None when the log isn't available.
+    """
+    start = time.monotonic()
+    last_activity = start
+    inflight = set()
+    while True:
+        try:
+            entries = driver.get_log('performance')
+        except WebDriverException:
+            return 0.0, None
+
+        for entry in entries:
+            message = json.loads(entry['message'])['message']
+            method = message.get('method')
+            request_id = message.get('params', {}).get('requestId')
+            if traffic is not None:
+                traffic.add(method, message.get('params', {}))
+            if method == 'Network.requestWillBeSent':
+                inflight.add(request_id)
+                last_activity = time.monotonic()
+            elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+                inflight.discard(request_id)
+                last_activity = time.monotonic()
+
+        now = time.monotonic()
+        if len(inflight) <= max_inflight and now - last_activity >= quiet_period:
+            return now - start, True
+        if now - start >= timeout:
+            return now - start, False
+        time.sleep(POLL_INTERVAL)
+
+
+def wait_for_dom_quiet(driver, timeout=DOM_QUIET_TIMEOUT, quiet_period=DOM_QUIET_PERIOD):
+    """Wait until no DOM mutation happened for quiet_period seconds. Returns (seconds, settled)."""
+    start = time.monotonic()
+    while True:
+        try:
+            since_mutation = driver.execute_script(DOM_OBSERVER_SCRIPT) / 1000
+        except WebDriverException:
+            return time.monotonic() - start, None
+        if since_mutation >= quiet_period:
+            return time.monotonic() - start, True
+        if time.monotonic() - start >= timeout:
+            return time.monotonic() - start, False
+        time.sleep(min(POLL_INTERVAL, quiet_period - since_mutation))
+
+
+def wait_for_page(driver, url, scroll=True, ready_timeout=READY_STATE_TIMEOUT, scroll_timeout=SCROLL_TIMEOUT,
+                  network_timeout=NETWORK_IDLE_TIMEOUT, dom_timeout=DOM_QUIET_TIMEOUT, traffic=None):
+    """Wait until the page has settled and log how long each check took.
+
+    Returns a dict mapping each check to (seconds, settled), plus 'total'.
+    """
+    start = time.monotonic()
+    waits = {'ready_state': wait_for_ready_state(driver, ready_timeout)}
+    if scroll:
+        waits['scroll'] = scroll_lazy_content(driver, scroll_timeout)
+    waits['network_idle'] = wait_for_network_idle(driver, network_timeout, traffic=traffic)
+    waits['dom_quiet'] = wait_for_dom_quiet(driver, dom_timeout)
+    waits['total'] = time.monotonic() - start
+
+    details = ', '.join(
+        f"{name}={seconds:.2f}s{'' if settled or settled is None else ' (timeout)'}"
+        for name, (seconds, settled) in waits.items() if name != 'total'
+    )
+    logger.info(f"Page ready in {waits['total']:.2f}s for {url}: {details}")
+    return waits
@@ -0,0 +1,185 @@
+"""What Chrome may download per page, and how much memory a driver may use.
+
+Text extraction (info, contacts) only needs the HTML, scripts and styles, so
+the 'text' policy blocks images, fonts, video and audio plus the usual ad and
+analytics domains with the CDP `Network.setBlockedURLs` command. Screenshots
+use the 'full' policy, which blocks nothing. The bytes each page transferred
+and the requests it had blocked are read from the Network events in the
+performance log. Blocked requests never download, so the bytes they saved
+are estimated from the average size of unblocked requests of the same type.
+
+A watchdog sums the RSS of every driver's process tree (chromedriver, the
+browser and its renderers, read from /proc) and kills the browser of a
+driver above --max-chrome-mb; the pool then replaces it. `python telemetry.py
+report` shows the per-policy traffic, savings and RSS.
+"""
+import logging
+import os
+import signal
+import threading
+
+from telemetry import record
+
+POLICIES = ('text', 'full')
+MAX_CHROME_MB = 1500
+WATCHDOG_INTERVAL = 2
+MEDIA_EXTENSIONS = ('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp',
+                    'woff', 'woff2', 'ttf', 'otf', 'eot',
+                    'mp4', 'webm', 'mov', 'm4v', 'mp3', 'ogg', 'wav', 'm4a')
+TRACKER_DOMAINS = ('google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+                   'googleadservices.com', 'adservice.google.com', 'connect.facebook.net', 'hotjar.com',
+                   'clarity.ms', 'segment.com', 'segment.io', 'mixpanel.com', 'amplitude.com', 'fullstory.com',
+                   'hs-analytics.net', 'hs-scripts.com', 'hsadspy.net', 'ads-twitter.com', 'analytics.twitter.com',
+                   'snap.licdn.com', 'px.ads.linkedin.com', 'quantserve.com', 'scorecardresearch.com',
+                   'taboola.com', 'outbrain.com', 'criteo.com', 'adnxs.com', 'mc.yandex.ru')
+# URL patterns for Network.setBlockedURLs ('*' matches anything). Extensions are
+# anchored to the end of the path so a site like www.movement.org isn't blocked.
+BLOCKED_URLS = {
+    'text': tuple(pattern for extension in MEDIA_EXTENSIONS for pattern in (f'*.{extension}', f'*.{extension}?*'))
+            + tuple(pattern for domain in TRACKER_DOMAINS for pattern in (f'*://{domain}/*', f'*.{domain}/*')),
+    'full': (),
+}
+# Bytes assumed per blocked request until requests of that type have been seen unblocked
+TYPICAL_BYTES = {'Image': 25000, 'Font': 35000, 'Media': 500000, 'Script': 40000, 'XHR': 2000, 'Fetch': 2000,
+                 'Ping': 500, 'Other': 5000}
+
+
+def add_resource_arguments(parser, policy='text'):
+    """Add the --policy and --max-chrome-mb options to an exporter's argument parser."""
+    parser.add_argument('--policy', choices=POLICIES, default=policy,
+                        help="Resources Chrome loads: 'text' blocks images, fonts, media and trackers, 'full' loads everything")
+    parser.add_argument('--max-chrome-mb', type=int, default=MAX_CHROME_MB,
+                        help='Kill and restart a Chrome driver whose processes use more memory than this (0 to disable)')
+
+
+def apply_policy(driver, policy):
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(BLOCKED_URLS[policy])})
+
+
+class TrafficCounter:
+    """Tallies the Network events of one page load; the size averages are shared by every page."""
+
+    _observed = {}  # resource type -> [requests, bytes] of unblocked requests
+    _observed_lock = threading.Lock()
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.blocked = 0
+        self.blocked_types = {}
+        self._types = {}
+
+    def add(self, method, params):
+        if method == 'Network.requestWillBeSent':
+            self.requests += 1
+            self._types[params.get('requestId')] = params.get('type', 'Other')
+        elif method == 'Network.loadingFinished':
+            size = params.get('encodedDataLength') or 0
+            self.bytes += size
+            resource_type = self._types.get(params.get('requestId'), 'Other')
+            with self._observed_lock:
+                observed = self._observed.setdefault(resource_type, [0, 0])
+                observed[0] += 1
+                observed[1] += size
+        elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+            resource_type = params.get('type') or self._types.get(params.get('requestId'), 'Other')
+            self.blocked += 1
+            self.blocked_types[resource_type] = self.blocked_types.get(resource_type, 0) + 1
+
+    def bytes_saved(self):
+        """Estimated bytes the blocked requests would have transferred."""
+        saved = 0
+        with self._observed_lock:
+            for resource_type, count in self.blocked_types.items():
+                requests, size = self._observed.get(resource_type, (0, 0))
+                average = size / requests if requests else TYPICAL_BYTES.get(resource_type, TYPICAL_BYTES['Other'])
+                saved += count * average
+        return int(saved)
+
+
+def _children():
+    """{pid: [child pids]} for every process, read from /proc."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # The command name may contain spaces, so split after its closing parenthesis
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def process_tree(pid):
+    """pid and all its descendants."""
+    children = _children()
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, ()))
+    return tree
+
+
+def _rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def driver_rss_mb(driver):
+    """RSS of chromedriver, the browser and its renderers in MB, or None where /proc isn't available."""
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is None or not os.path.isdir('/proc'):
+        return None
+    # Shared pages count in every process that maps them, so this overestimates a little
+    return round(sum(_rss_bytes(pid) for pid in process_tree(process.pid)) / 1024 / 1024, 1)
+
+
+def kill_browser(driver):
+    """SIGKILL the processes started by a driver's chromedriver, leaving chromedriver to report the crash."""
+    process = driver.service.process
+    for pid in process_tree(process.pid)[1:]:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+class MemoryWatchdog:
+    """Polls the RSS of every driver of a pool and kills the browsers above the limit."""
+
+    def __init__(self, pool, limit_mb, interval=WATCHDOG_INTERVAL):
+        self.pool = pool
+        self.limit_mb = limit_mb
+        self.interval = interval
+        self.kills = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='chrome-watchdog', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for driver in self.pool.drivers():
+                rss_mb = driver_rss_mb(driver)
+                if rss_mb is None or rss_mb <= self.limit_mb:
+                    continue
+                logging.warning(f"Chrome driver uses {rss_mb} MB (limit {self.limit_mb} MB), killing it")
+                record('driver_killed', policy=self.pool.policy, rss_mb=rss_mb, limit_mb=self.limit_mb)
+                self.kills += 1
+                self.pool.discard(driver)
+                kill_browser(driver)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,138 @@
+"""Local record of what each pipeline stage has already produced.
+
+Every (project, stage) pair stores the hash of its inputs, the hash of what it
+wrote, a status and a timestamp. Stages ask `needs_run` before doing any work,
+so unchanged projects are skipped and an interrupted run resumes where it
+stopped.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+STATE_DB = 'resources/pipeline_state.db'
+
+# Statuses that mean the stage finished for the recorded inputs
+# ('unchanged': re-fetched, but the source had not changed since the last run;
+#  'parked': the screenshot matched a parked-domain template)
+COMPLETE_STATUSES = ('done', 'no_info', 'unchanged', 'parked')
+
+
+def hash_text(*parts):
+    """Stable sha256 over one or more strings (None is treated as empty)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part if part is not None else '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    """sha256 of a file's contents, or None if it doesn't exist."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def parse_since(value):
+    """argparse type for --since: an ISO date or datetime, returned as a Unix timestamp."""
+    return datetime.fromisoformat(value).timestamp()
+
+
+def add_state_arguments(parser):
+    """Add the shared --force/--since overrides to a stage's argument parser."""
+    parser.add_argument('--force', action='store_true',
+                        help='Reprocess every project even if its inputs are unchanged')
+    parser.add_argument('--since', type=parse_since, metavar='DATE',
+                        help='Reprocess projects last processed before DATE (YYYY-MM-DD[THH:MM])')
+
+
+class StateStore:
+    """SQLite-backed (project, stage) state shared by all pipeline stages."""
+
+    def __init__(self, path=STATE_DB):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        # Several scraper workers may write at once (see work_queue.py)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS stage_state (
+                project TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                input_hash TEXT,
+                output_hash TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (project, stage)
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, project, stage):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT input_hash, output_hash, status, error, updated_at FROM stage_state WHERE project = ? AND stage = ?',
+                (project, stage)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('input_hash', 'output_hash', 'status', 'error', 'updated_at'), row))
+
+    def needs_run(self, project, stage, input_hash, force=False, since=None, output_path=None):
+        """Whether a stage has to (re)process a project.
+
+        True when forced, when the project was never completed, when its
+        inputs changed, when it was last processed before `since`, or when the
+        output file it produced has gone missing.
+        """
+        if force:
+            return True
+        state = self.get(project, stage)
+        if state is None or state['status'] not in COMPLETE_STATUSES:
+            return True
+        if state['input_hash'] != input_hash:
+            return True
+        if since is not None and state['updated_at'] < since:
+            return True
+        if output_path is not None and state['status'] in ('done', 'unchanged', 'parked') and not os.path.exists(output_path):
+            return True
+        return False
+
+    def _upsert(self, project, stage, input_hash, output_hash, status, error=None):
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO stage_state (project, stage, input_hash, output_hash, status, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (project, stage) DO UPDATE SET
+                    input_hash = excluded.input_hash,
+                    output_hash = excluded.output_hash,
+                    status = excluded.status,
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+            ''', (project, stage, input_hash, output_hash, status, error, time.time()))
+            self._conn.commit()
+
+    def mark_running(self, project, stage, input_hash):
+        self._upsert(project, stage, input_hash, None, 'running')
+
+    def mark_done(self, project, stage, input_hash, output_hash, status='done'):
+        self._upsert(project, stage, input_hash, output_hash, status)
+
+    def mark_failed(self, project, stage, input_hash, error):
+        self._upsert(project, stage, input_hash, None, 'failed', str(error))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
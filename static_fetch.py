@@ -0,0 +1,337 @@
+"""Plain-HTTP fast path for website scraping.
+
+Most project homepages ship their text in the initial HTML, so they are fetched
+with a pooled async HTTP client and parsed directly. Only pages that look
+JavaScript-rendered are handed to Selenium.
+"""
+import asyncio
+import csv
+import re
+import threading
+import time
+from html.parser import HTMLParser
+
+import httpx
+
+from driver_pool import DEFAULT_USER_AGENT
+from frontier import CrawlFrontier
+from telemetry import record
+
+# Per-host politeness is enforced by the frontier, so this only bounds open connections
+STATIC_CONCURRENCY = 64
+STATIC_TIMEOUT = 15
+MAX_BODY_BYTES = 5 * 1024 * 1024
+REQUEST_HEADERS = {"User-Agent": DEFAULT_USER_AGENT, "Accept": "text/html,application/xhtml+xml"}
+
+# Pages with less visible text than this are assumed to be rendered client-side
+MIN_TEXT_CHARS = 500
+SPA_MARKERS = ('id="root"', 'id="app"', 'id="__next"', 'id="___gatsby"', 'window.__NUXT__',
+               'ng-version=', 'data-reactroot', 'data-server-rendered')
+NOSCRIPT_MARKERS = ('enable javascript', 'javascript is required', 'javascript to run this app')
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+             'param', 'source', 'track', 'wbr'}
+HIDDEN_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'head'}
+BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt',
+              'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+              'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table',
+              'td', 'th', 'tr', 'ul'}
+
+
+class Node:
+    __slots__ = ('tag', 'attrs', 'children', 'parent')
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = dict(attrs or [])
+        self.children = []
+        self.parent = parent
+
+    def iter(self):
+        """Yield this node and every element below it, in document order."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed([child for child in node.children if isinstance(child, Node)]))
+
+    def own_text(self):
+        """Text directly inside this element, like XPath text()."""
+        return ' '.join(child for child in self.children if isinstance(child, str))
+
+    def text(self):
+        """Visible text of the element, with block elements on their own lines."""
+        parts = []
+        self._collect_text(parts)
+        text = ''.join(parts)
+        lines = (re.sub(r'[ \t\r\f\v]+', ' ', line).strip() for line in text.split('\n'))
+        return '\n'.join(line for line in lines if line)
+
+    def _collect_text(self, parts):
+        if self.tag in HIDDEN_TAGS:
+            return
+        block = self.tag in BLOCK_TAGS
+        if block:
+            parts.append('\n')
+        for child in self.children:
+            if isinstance(child, str):
+                parts.append(child)
+            else:
+                child._collect_text(parts)
+        if block:
+            parts.append('\n')
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('#document')
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, attrs, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Node(tag, attrs, self.current))
+
+    def handle_endtag(self, tag):
+        # Close the nearest matching open element; tolerate stray end tags
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(html):
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def extract_page(html):
+    """Pull the same fields from raw HTML that info_export reads from the rendered DOM."""
+    root = parse_html(html)
+    elements = list(root.iter())
+
+    meta_description = None
+    title = ''
+    links = []
+    for node in elements:
+        if node.tag == 'meta' and node.attrs.get('name', '').lower() == 'description' and meta_description is None:
+            meta_description = node.attrs.get('content')
+        elif node.tag == 'title' and not title:
+            title = node.text() or node.own_text().strip()
+        elif node.tag == 'a' and node.attrs.get('href'):
+            links.append(node.attrs['href'])
+
+    visible = [node for node in elements if not any(p.tag in HIDDEN_TAGS for p in _ancestors(node))]
+    body = next((node for node in elements if node.tag == 'body'), root)
+
+    return {
+        'meta_description': meta_description,
+        'title': title,
+        'headers': [node.text() for node in visible if node.tag in ('h1', 'h2', 'h3')],
+        'main_content': [node.text() for node in visible if node.tag in ('p', 'ul', 'ol')],
+        'about_sections': [node.text() for node in visible if 'about' in node.own_text().lower()],
+        'mission_elements': [node.text() for node in visible
+                             if 'mission' in node.own_text().lower() or 'vision' in node.own_text().lower()],
+        'links': links,
+        'text': body.text(),
+        'html': html,
+    }
+
+
+def _ancestors(node):
+    node = node.parent
+    while node is not None:
+        yield node
+        node = node.parent
+
+
+def needs_browser(html, page):
+    """Decide whether a statically fetched page must be rendered in Chrome.
+
+    Returns a short reason string, or None when the static HTML is good enough.
+    """
+    text = page['text']
+    if not text.strip():
+        return 'empty body'
+    lowered = html.lower()
+    for marker in NOSCRIPT_MARKERS:
+        if marker in lowered and len(text) < MIN_TEXT_CHARS * 2:
+            return 'noscript notice'
+    if len(text) < MIN_TEXT_CHARS:
+        if any(marker.lower() in lowered for marker in SPA_MARKERS):
+            return 'spa marker'
+        return 'too little text'
+    return None
+
+
+async def _fetch_one(client, semaphore, website, check, archive=None):
+    website, page, stats = await _fetch_page(client, semaphore, website, check, archive)
+    # Exceptions and HTTP errors are failures; a page sent on to the browser is not
+    failed = stats['Status'] is None or stats['Status'] >= 400
+    record('http_fetch', url=website, seconds=stats['Fetch Seconds'], status=stats['Status'], cache=stats['Cache'],
+           browser_reason=stats['Reason'] if page is None and not failed else None,
+           error=stats['Reason'] if failed else None)
+    return website, page, stats
+
+
+async def _fetch_page(client, semaphore, website, check, archive=None):
+    async with semaphore:
+        start = time.monotonic()
+        stats = {'Website': website, 'Status': None, 'Reason': None, 'Cache': None}
+        try:
+            headers = archive.conditional_headers(website) if archive is not None else {}
+            response = await client.get(website, headers=headers)
+            stats['Status'] = response.status_code
+            if response.status_code == 304 and archive is not None:
+                html = archive.load(website)
+                if html is None:
+                    stats['Reason'] = 'not modified, missing from archive'
+                    return website, None, stats
+                archive.touch(website)
+                stats['Cache'] = 'not modified'
+            else:
+                if response.status_code >= 400:
+                    stats['Reason'] = f'http {response.status_code}'
+                    return website, None, stats
+                content_type = response.headers.get('content-type', '')
+                if 'html' not in content_type:
+                    stats['Reason'] = f'content type {content_type or "unknown"}'
+                    return website, None, stats
+                body = response.content[:MAX_BODY_BYTES]
+                html = body.decode(response.encoding or 'utf-8', errors='replace')
+                if archive is not None:
+                    previous = archive.get(website)
+                    changed = archive.save(website, html, status=response.status_code, content_type=content_type,
+                                           etag=response.headers.get('etag'),
+                                           last_modified=response.headers.get('last-modified'))
+                    stats['Cache'] = 'new' if previous is None else ('changed' if changed else 'unchanged')
+        except (httpx.HTTPError, UnicodeError, ValueError) as e:
+            stats['Reason'] = f'{type(e).__name__}'
+            return website, None, stats
+        finally:
+            stats['Fetch Seconds'] = round(time.monotonic() - start, 3)
+
+        page = extract_page(html)
+        stats['Text Chars'] = len(page['text'])
+        stats['Reason'] = check(html, page) if check is not None else None
+        return website, (None if stats['Reason'] else page), stats
+
+
+async def fetch_static_pages(websites, concurrency=STATIC_CONCURRENCY, timeout=STATIC_TIMEOUT, check=needs_browser,
+                             frontier=None, priority=None, archive=None):
+    """Fetch every website over one pooled HTTP client, politely per domain.
+
+    Returns {website: (page or None, stats)}; page is None when the site has to
+    go through the browser, as decided by `check` (None keeps every page).
+    Websites are scheduled through `frontier` (a default one if not given) with
+    priority(website) as their priority. With a PageArchive, requests are
+    conditional and stats['Cache'] says whether the page changed.
+    """
+    frontier = frontier if frontier is not None else CrawlFrontier()
+    for website in websites:
+        frontier.add(website, priority=priority(website) if priority is not None else 0)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results = {}
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, headers=REQUEST_HEADERS, follow_redirects=True) as client:
+        await frontier.aload_robots(client)
+
+        async def worker():
+            while (entry := await frontier.aget()) is not None:
+                url, website = entry
+                try:
+                    _, page, stats = await _fetch_one(client, semaphore, website, check, archive)
+                    results[website] = (page, stats)
+                finally:
+                    frontier.done(url)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+class StaticFetcher:
+    """One pooled HTTP client on a background event loop, for callers that fetch one site at a time from threads.
+
+    `fetch` returns (page or None, stats) like one entry of `fetch_static_pages`;
+    the callers do their own scheduling.
+    """
+
+    def __init__(self, concurrency=STATIC_CONCURRENCY, timeout=STATIC_TIMEOUT, check=needs_browser, archive=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.check = check
+        self.archive = archive
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='static-fetch', daemon=True)
+        self._thread.start()
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+
+        async def open_client():
+            # Created on the loop, so the connection pool belongs to it
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            return httpx.AsyncClient(limits=limits, timeout=self.timeout, headers=REQUEST_HEADERS,
+                                     follow_redirects=True)
+
+        self._client = asyncio.run_coroutine_threadsafe(open_client(), self._loop).result()
+        return self
+
+    def fetch(self, website):
+        _, page, stats = asyncio.run_coroutine_threadsafe(
+            _fetch_one(self._client, self._semaphore, website, self.check, self.archive), self._loop).result()
+        return page, stats
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def fetch_tiered(websites, concurrency=STATIC_CONCURRENCY, frontier=None, priority=None, archive=None):
+    """Run the static tier for all websites.
+
+    Returns (static_pages, browser_websites, stats) where static_pages maps
+    website to parsed page, browser_websites lists sites that need Selenium and
+    stats maps website to a per-site stats row with the chosen tier.
+    """
+    results = asyncio.run(fetch_static_pages(list(dict.fromkeys(websites)), concurrency,
+                                             frontier=frontier, priority=priority, archive=archive))
+    static_pages, browser_websites, stats = {}, [], {}
+    for website, (page, row) in results.items():
+        row['Tier'] = 'http' if page is not None else 'browser'
+        stats[website] = row
+        if page is not None:
+            static_pages[website] = page
+        else:
+            browser_websites.append(website)
+    return static_pages, browser_websites, stats
+
+
+def write_fetch_stats(stats, output_csv):
+    """Save the per-site tier stats so we can see how many sites needed Chrome."""
+    fieldnames = ['Website', 'Tier', 'Reason', 'Status', 'Cache', 'Text Chars', 'Fetch Seconds']
+    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for row in stats.values():
+            writer.writerow(row)
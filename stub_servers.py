@@ -0,0 +1,529 @@
+"""Local stand-ins for the external APIs, for trying the pipeline without network access or cost.
+
+    python stub_servers.py openai --port 8001 --rpm 60 --latency 0.3
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python gen_summary.py
+
+    python stub_servers.py mediawiki --port 8002 --lag-rate 0.1
+    MIRAHEZE_API_URL=http://127.0.0.1:8002/w/api.php python gen_wikis.py
+
+    python stub_servers.py sites --corpus resources/benchmark_sites
+"""
+import argparse
+import email.policy
+import json
+import mimetypes
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class SlidingWindow:
+    """Count of units consumed over the last 60 seconds."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.events = deque()
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        while self.events and now - self.events[0][0] >= 60:
+            self.events.popleft()
+
+    def used(self, now):
+        self._expire(now)
+        return sum(amount for _, amount in self.events)
+
+    def try_consume(self, amount):
+        """Consume amount if it fits; returns (ok, remaining, seconds until the oldest event expires)."""
+        now = time.monotonic()
+        with self.lock:
+            used = self.used(now)
+            if used + amount > self.limit:
+                return False, max(0, self.limit - used), 60 - (now - self.events[0][0]) if self.events else 0
+            self.events.append((now, amount))
+            return True, self.limit - used - amount, 60 - (now - self.events[0][0])
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "StubServer/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class OpenAIStubHandler(StubHandler):
+    """Minimal /v1/chat/completions, /v1/files and /v1/batches.
+
+    Completions get latency, rate limits and injected 5xx errors; batches are
+    processed on a background thread and a configurable fraction of their
+    requests fail.
+    """
+
+    def do_POST(self):
+        path = self.path.rstrip('/')
+        if path.endswith('/chat/completions'):
+            return self.chat_completion(self._read_json())
+        if path.endswith('/files'):
+            return self.upload_file()
+        if path.endswith('/batches'):
+            return self.create_batch(self._read_json())
+        self._not_found()
+
+    def do_GET(self):
+        parts = self.path.rstrip('/').split('/')
+        if len(parts) >= 4 and parts[-3] == 'files' and parts[-1] == 'content':
+            return self.file_content(parts[-2])
+        if len(parts) >= 3 and parts[-2] == 'batches':
+            return self.get_batch(parts[-1])
+        self._not_found()
+
+    def _not_found(self):
+        self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def upload_file(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        message = BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8') + raw)
+        fields = {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+        if 'file' not in fields:
+            return self._send_json(400, {"error": {"message": "Missing file", "type": "invalid_request_error"}})
+        content = fields['file'].get_payload(decode=True)
+        purpose = fields['purpose'].get_content().strip() if 'purpose' in fields else 'batch'
+        stored = self.server.store_file(content, fields['file'].get_filename() or 'upload.jsonl', purpose)
+        self._send_json(200, stored)
+
+    def file_content(self, file_id):
+        stored = self.server.files.get(file_id)
+        if stored is None:
+            return self._not_found()
+        body = stored['content']
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def create_batch(self, request):
+        if request.get('input_file_id') not in self.server.files:
+            return self._send_json(400, {"error": {"message": "Unknown input_file_id", "type": "invalid_request_error"}})
+        self._send_json(200, self.server.create_batch(request))
+
+    def get_batch(self, batch_id):
+        batch = self.server.batches.get(batch_id)
+        if batch is None:
+            return self._not_found()
+        self._send_json(200, batch)
+
+    def chat_completion(self, request):
+        config = self.server.config
+        prompt = '\n'.join(message.get('content', '') for message in request.get('messages', []))
+        prompt_tokens = len(prompt) // 4 + 1
+
+        ok_requests, remaining_requests, reset_requests = self.server.requests.try_consume(1)
+        ok_tokens, remaining_tokens, reset_tokens = (self.server.tokens.try_consume(prompt_tokens)
+                                                     if ok_requests else (True, self.server.tokens.limit, 0))
+        headers = {
+            'x-ratelimit-limit-requests': self.server.requests.limit,
+            'x-ratelimit-remaining-requests': remaining_requests,
+            'x-ratelimit-reset-requests': f"{reset_requests:.3f}s",
+            'x-ratelimit-limit-tokens': self.server.tokens.limit,
+            'x-ratelimit-remaining-tokens': remaining_tokens,
+            'x-ratelimit-reset-tokens': f"{reset_tokens:.3f}s",
+        }
+        if not (ok_requests and ok_tokens):
+            headers['retry-after'] = f"{max(reset_requests, reset_tokens, 0.1):.3f}"
+            return self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                                   "code": "rate_limit_exceeded"}}, headers)
+
+        if random.random() < config['throttle_rate']:
+            # Capacity throttling: 429 although the per-minute budget isn't used up
+            headers['retry-after'] = f"{config['retry_after']:.3f}"
+            return self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                                   "code": "rate_limit_exceeded"}}, headers)
+
+        if random.random() < config['error_rate']:
+            return self._send_json(503, {"error": {"message": "The server is overloaded", "type": "server_error"}}, headers)
+
+        time.sleep(config['latency'] + random.uniform(0, config['jitter']))
+        self._send_json(200, stub_chat_completion(request), headers)
+
+
+def stub_completion(prompt):
+    """Deterministic fake summary; dead-looking sites get NO INFO like the real prompt asks for."""
+    # Only the scraped data, which starts at 'Project Name:'; the instructions themselves mention "404 page"
+    start = prompt.find('Project Name:')
+    lowered = prompt[start if start >= 0 else 0:].lower()
+    if any(marker in lowered for marker in ('404', 'domain for sale', 'domain is for sale', 'page not found')):
+        return "NO INFO"
+    name = next((line.split(':', 1)[1].strip() for line in prompt.splitlines() if line.startswith('Project Name:')), 'The project')
+    return (f"{name} is a project described by its website. This is a stub summary generated locally.\n"
+            f"{name} uses technologies and partnerships listed on its site.")
+
+
+def start_server(handler, port, config, host='127.0.0.1', verbose=False, server_class=ThreadingHTTPServer):
+    """Start a stub server on a background thread and return it; call shutdown() to stop."""
+    server = server_class((host, port), handler)
+    if hasattr(server, 'init_state'):
+        server.init_state()
+    server.daemon_threads = True
+    server.config = config
+    server.verbose = verbose
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stub_chat_completion(request):
+    """Chat-completion body for a request, without rate limits or latency."""
+    prompt = '\n'.join(message.get('content', '') for message in request.get('messages', []))
+    content = stub_completion(prompt)
+    prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(content) // 4 + 1
+    return {
+        "id": f"chatcmpl-stub-{random.getrandbits(48):x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get('model', 'stub'),
+        "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                     "message": {"role": "assistant", "content": content, "refusal": None}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+class OpenAIStubServer(ThreadingHTTPServer):
+    """Holds uploaded files and batches for OpenAIStubHandler."""
+
+    def init_state(self):
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def store_file(self, content, filename, purpose):
+        file_id = f"file-stub-{random.getrandbits(48):x}"
+        meta = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        with self.lock:
+            self.files[file_id] = dict(meta, content=content)
+        return meta
+
+    def create_batch(self, request):
+        batch_id = f"batch_stub_{random.getrandbits(48):x}"
+        lines = [json.loads(line) for line in self.files[request['input_file_id']]['content'].decode('utf-8').splitlines()
+                 if line.strip()]
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": request.get('endpoint', '/v1/chat/completions'),
+            "errors": None, "input_file_id": request['input_file_id'],
+            "completion_window": request.get('completion_window', '24h'), "status": "validating",
+            "output_file_id": None, "error_file_id": None, "created_at": int(time.time()),
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0}, "metadata": request.get('metadata'),
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._process_batch, args=(batch, lines), daemon=True).start()
+        return batch
+
+    def _process_batch(self, batch, lines):
+        batch['status'] = 'in_progress'
+        batch['in_progress_at'] = int(time.time())
+        time.sleep(self.config['batch_delay'])
+
+        outputs, errors = [], []
+        for line in lines:
+            record = {"id": f"batch_req_{random.getrandbits(48):x}", "custom_id": line['custom_id']}
+            if random.random() < self.config['batch_error_rate']:
+                errors.append(dict(record, response=None,
+                                   error={"code": "server_error", "message": "Stub batch request failed"}))
+                batch['request_counts']['failed'] += 1
+            else:
+                outputs.append(dict(record, error=None, response={
+                    "status_code": 200, "request_id": record['id'], "body": stub_chat_completion(line['body'])}))
+                batch['request_counts']['completed'] += 1
+
+        def to_jsonl(records):
+            return ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
+
+        if outputs:
+            batch['output_file_id'] = self.store_file(to_jsonl(outputs), 'batch_output.jsonl', 'batch_output')['id']
+        if errors:
+            batch['error_file_id'] = self.store_file(to_jsonl(errors), 'batch_errors.jsonl', 'batch_output')['id']
+        batch['completed_at'] = int(time.time())
+        batch['status'] = 'completed'
+
+
+def start_openai_stub(port=8001, latency=0.2, jitter=0.1, rpm=500, tpm=200000, error_rate=0.0,
+                      batch_delay=2.0, batch_error_rate=0.0, throttle_rate=0.0, retry_after=1.0, **kwargs):
+    config = {'latency': latency, 'jitter': jitter, 'error_rate': error_rate,
+              'batch_delay': batch_delay, 'batch_error_rate': batch_error_rate,
+              'throttle_rate': throttle_rate, 'retry_after': retry_after}
+    server = start_server(OpenAIStubHandler, port, config, server_class=OpenAIStubServer, **kwargs)
+    server.requests = SlidingWindow(rpm)
+    server.tokens = SlidingWindow(tpm)
+    return server
+
+
+class MediaWikiStubHandler(StubHandler):
+    """Minimal MediaWiki api.php: CSRF tokens, revision queries and edits, with latency, maxlag and rate limits.
+
+    The CSRF token rotates every `token_ttl` seconds so clients see `badtoken`.
+    """
+
+    def do_GET(self):
+        self.api(dict(parse_qsl(urlsplit(self.path).query)))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        params = dict(parse_qsl(urlsplit(self.path).query))
+        params.update(parse_qsl(self.rfile.read(length).decode('utf-8'), keep_blank_values=True))
+        self.api(params)
+
+    def api(self, params):
+        action = params.get('action')
+        if action == 'query' and params.get('meta') == 'tokens':
+            return self._send_json(200, {"batchcomplete": "", "query": {"tokens": {"csrftoken": self.server.csrf_token()}}})
+        if action == 'query' and params.get('prop') == 'revisions':
+            return self.revisions(params)
+        if action == 'edit':
+            return self.edit(params)
+        self._send_json(200, {"error": {"code": "badvalue", "info": f"Unsupported request: {params}"}})
+
+    def revisions(self, params):
+        """prop=revisions&rvslots=main in formatversion=2 shape, with title normalization."""
+        titles = [title for title in params.get('titles', '').split('|') if title]
+        if len(titles) > 50:
+            return self._send_json(200, {"error": {"code": "toomanyvalues",
+                                                   "info": "Too many values supplied for parameter \"titles\". The limit is 50."}})
+        normalized, pages = [], []
+        for title in titles:
+            canonical = title.replace('_', ' ')
+            if canonical != title:
+                normalized.append({"fromencoded": False, "from": title, "to": canonical})
+            page = self.server.pages.get(canonical)
+            if page is None:
+                pages.append({"ns": 0, "title": canonical, "missing": True})
+            else:
+                pages.append({"pageid": page['pageid'], "ns": 0, "title": canonical, "revisions": [{
+                    "revid": page['revid'], "parentid": page['parentid'],
+                    "slots": {"main": {"contentmodel": "wikitext", "contentformat": "text/x-wiki",
+                                       "content": page['content']}}}]})
+        query = {"pages": pages}
+        if normalized:
+            query["normalized"] = normalized
+        self._send_json(200, {"batchcomplete": True, "query": query})
+
+    def edit(self, params):
+        config = self.server.config
+        if params.get('token') != self.server.csrf_token():
+            return self._send_json(200, {"error": {"code": "badtoken", "info": "Invalid CSRF token."}})
+
+        ok, _, reset = self.server.edits.try_consume(1)
+        if not ok:
+            return self._send_json(429, {"error": {"code": "ratelimited", "info": "You've exceeded your rate limit."}},
+                                   {'Retry-After': f"{max(1, int(reset))}"})
+
+        if 'maxlag' in params and random.random() < config['lag_rate']:
+            lag = int(params['maxlag']) + random.randint(1, 5)
+            return self._send_json(200, {"error": {"code": "maxlag", "info": f"Waiting for a database server: {lag} seconds lagged.",
+                                                   "host": "db-stub", "lag": lag, "type": "db"}},
+                                   {'Retry-After': config['retry_after'], 'X-Database-Lag': lag})
+
+        time.sleep(config['latency'] + random.uniform(0, config['jitter']))
+        title = params['title'].replace('_', ' ')
+        page = self.server.pages.get(title)
+        if page is not None and 'createonly' in params:
+            return self._send_json(200, {"error": {"code": "articleexists", "info": "The article you tried to create has been created already."}})
+        if page is None and 'nocreate' in params:
+            return self._send_json(200, {"error": {"code": "missingtitle", "info": "The page you specified doesn't exist."}})
+        if page is not None and params.get('baserevid') and int(params['baserevid']) != page['revid']:
+            return self._send_json(200, {"error": {"code": "editconflict", "info": "Edit conflict."}})
+        self._send_json(200, {"edit": self.server.save_page(title, params.get('text', ''))})
+
+
+class MediaWikiStubServer(ThreadingHTTPServer):
+    """Holds pages, revisions and the current CSRF token for MediaWikiStubHandler."""
+
+    def init_state(self):
+        self.pages = {}
+        self.next_revid = 1
+        self.lock = threading.Lock()
+        self._token = None
+        self._token_issued = 0
+
+    def csrf_token(self):
+        with self.lock:
+            if self._token is None or time.monotonic() - self._token_issued > self.config['token_ttl']:
+                self._token = f"{random.getrandbits(64):016x}+\\"
+                self._token_issued = time.monotonic()
+            return self._token
+
+    def save_page(self, title, text):
+        # MediaWiki strips trailing whitespace from saved wikitext
+        text = text.rstrip()
+        with self.lock:
+            page = self.pages.get(title)
+            result = {"result": "Success", "title": title, "contentmodel": "wikitext"}
+            if page is not None and page['content'] == text:
+                return dict(result, pageid=page['pageid'], nochange="")
+            old_revid = page['revid'] if page else 0
+            revid = self.next_revid
+            self.next_revid += 1
+            pageid = page['pageid'] if page else len(self.pages) + 1
+            self.pages[title] = {'content': text, 'revid': revid, 'parentid': old_revid, 'pageid': pageid,
+                                 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+            result.update(pageid=pageid, oldrevid=old_revid, newrevid=revid, newtimestamp=self.pages[title]['timestamp'])
+            if page is None:
+                result['new'] = ""
+            return result
+
+
+def start_mediawiki_stub(port=8002, latency=0.1, jitter=0.05, edits_per_minute=600, lag_rate=0.0,
+                         retry_after=1, token_ttl=3600, **kwargs):
+    config = {'latency': latency, 'jitter': jitter, 'lag_rate': lag_rate, 'retry_after': retry_after,
+              'token_ttl': token_ttl}
+    server = start_server(MediaWikiStubHandler, port, config, server_class=MediaWikiStubServer, **kwargs)
+    server.edits = SlidingWindow(edits_per_minute)
+    return server
+
+
+class SiteStubHandler(StubHandler):
+    """Serves one project site of a benchmark corpus (see benchmark.py) from its directory.
+
+    Slow sites answer after their delay, dead sites answer 404 to everything.
+    """
+    server_version = "nginx"
+
+    def do_GET(self):
+        config = self.server.config
+        site = self.server.site
+        time.sleep(config['latency'] + random.uniform(0, config['jitter']) + site.get('delay', 0))
+        path = urlsplit(self.path).path.lstrip('/') or 'index.html'
+        file_path = os.path.normpath(os.path.join(config['corpus'], site['dir'], path))
+        if not os.path.splitext(file_path)[1]:
+            file_path += '.html'
+        if (site['kind'] == 'dead' or not file_path.startswith(os.path.join(config['corpus'], site['dir'], ''))
+                or not os.path.isfile(file_path)):
+            body = b'<html><head><title>404 Not Found</title></head><body><h1>404 Not Found</h1></body></html>'
+            status, content_type = 404, 'text/html'
+        else:
+            with open(file_path, 'rb') as f:
+                body = f.read()
+            status, content_type = 200, mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8' if content_type.startswith('text/') else content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SiteFarm:
+    """One site server per corpus entry, each on its own loopback address so every site is a separate domain."""
+
+    def __init__(self, servers):
+        self.servers = servers
+        self.urls = {server.site['name']: f"http://{server.server_address[0]}:{server.server_address[1]}/"
+                     for server in servers}
+
+    def shutdown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+def site_address(index):
+    """Loopback address of the index-th site (127.0.1.1, 127.0.1.2, ...); Linux routes all of 127/8 locally."""
+    return f"127.0.{1 + index // 250}.{1 + index % 250}"
+
+
+def start_sites_stub(corpus, port=8003, latency=0.05, jitter=0.05, **kwargs):
+    with open(os.path.join(corpus, 'sites.json'), 'r', encoding='utf-8') as f:
+        sites = json.load(f)
+    config = {'corpus': os.path.abspath(corpus), 'latency': latency, 'jitter': jitter}
+    servers = []
+    for index, site in enumerate(sites):
+        server = start_server(SiteStubHandler, port, config, host=site_address(index), **kwargs)
+        server.site = site
+        servers.append(server)
+    return SiteFarm(servers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stub of an external API")
+    subparsers = parser.add_subparsers(dest='api', required=True)
+
+    openai_parser = subparsers.add_parser('openai', help='OpenAI chat completions')
+    openai_parser.add_argument('--port', type=int, default=8001)
+    openai_parser.add_argument('--latency', type=float, default=0.2, help='Seconds added to every completion')
+    openai_parser.add_argument('--jitter', type=float, default=0.1, help='Extra random latency, in seconds')
+    openai_parser.add_argument('--rpm', type=int, default=500, help='Requests per minute before returning 429')
+    openai_parser.add_argument('--tpm', type=int, default=200000, help='Prompt tokens per minute before returning 429')
+    openai_parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    openai_parser.add_argument('--throttle-rate', type=float, default=0.0,
+                               help='Fraction of requests answered with 429 even below the rate limits')
+    openai_parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After sent with those 429s')
+    openai_parser.add_argument('--batch-delay', type=float, default=2.0, help='Seconds before a batch completes')
+    openai_parser.add_argument('--batch-error-rate', type=float, default=0.0,
+                               help='Fraction of batch requests reported as failed')
+    openai_parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    mediawiki_parser = subparsers.add_parser('mediawiki', help='MediaWiki api.php (tokens, revisions and edits)')
+    mediawiki_parser.add_argument('--port', type=int, default=8002)
+    mediawiki_parser.add_argument('--latency', type=float, default=0.1, help='Seconds added to every edit')
+    mediawiki_parser.add_argument('--jitter', type=float, default=0.05, help='Extra random latency, in seconds')
+    mediawiki_parser.add_argument('--edits-per-minute', type=int, default=600, help='Edits per minute before returning 429')
+    mediawiki_parser.add_argument('--lag-rate', type=float, default=0.0, help='Fraction of edits refused with a maxlag error')
+    mediawiki_parser.add_argument('--retry-after', type=int, default=1, help='Retry-After sent with maxlag errors')
+    mediawiki_parser.add_argument('--token-ttl', type=float, default=3600, help='Seconds before the CSRF token rotates')
+    mediawiki_parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    sites_parser = subparsers.add_parser('sites', help='Project websites from a benchmark corpus')
+    sites_parser.add_argument('--corpus', default='resources/benchmark_sites', help='Corpus directory (see benchmark.py)')
+    sites_parser.add_argument('--port', type=int, default=8003)
+    sites_parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to every response')
+    sites_parser.add_argument('--jitter', type=float, default=0.05, help='Extra random latency, in seconds')
+    sites_parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    args = parser.parse_args()
+
+    if args.api == 'mediawiki':
+        server = start_mediawiki_stub(args.port, args.latency, args.jitter, args.edits_per_minute, args.lag_rate,
+                                      args.retry_after, args.token_ttl, verbose=args.verbose)
+    elif args.api == 'openai':
+        server = start_openai_stub(args.port, args.latency, args.jitter, args.rpm, args.tpm, args.error_rate,
+                                   args.batch_delay, args.batch_error_rate, args.throttle_rate, args.retry_after,
+                                   verbose=args.verbose)
+    elif args.api == 'sites':
+        server = start_sites_stub(args.corpus, args.port, args.latency, args.jitter, verbose=args.verbose)
+        for name, url in server.urls.items():
+            print(f"{url}  {name}")
+
+    if args.api != 'sites':
+        print(f"{args.api} stub listening on http://127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Batch API mode for gen_summary.
+
+All prompts are written to one JSONL request file, submitted as a single batch
+job and polled until it finishes; results are then fanned back out through the
+same callback the interactive engine uses. Requests that failed inside the
+batch are resubmitted on their own. The id of the running batch is saved, with
+the model, prompt version and a hash of each project's info, so an interrupted
+run resumes polling instead of submitting again, unless any of those changed.
+"""
+import json
+import os
+import time
+
+from openai import OpenAI
+
+from state_store import hash_text
+from summary_cache import prompt_version
+from telemetry import cost_usd, record
+
+BATCH_REQUESTS_FILE = 'resources/summary_batch_requests.jsonl'
+BATCH_STATE_FILE = 'resources/summary_batch_state.json'
+POLL_INTERVAL = 30
+MAX_ROUNDS = 3
+FINISHED_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def build_batch_file(requests, model, system_message, prompt_template, path=BATCH_REQUESTS_FILE):
+    """Write one chat-completion request per project; the project name is the custom_id."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for project_name, project_info in requests.items():
+            f.write(json.dumps({
+                "custom_id": project_name,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": prompt_template.format(project_info=project_info)}
+                    ]
+                }
+            }, ensure_ascii=False) + "\n")
+    return path
+
+
+def _save_state(state):
+    with open(BATCH_STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+def _load_state():
+    try:
+        with open(BATCH_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def resumable(state, model, version, inputs):
+    """Whether a saved batch was built from the same model and prompt and still answers some pending request.
+
+    Requests recorded before the run stopped are no longer pending and are
+    ignored; a pending request whose info changed makes the batch stale.
+    """
+    if state.get("model") != model or state.get("prompt_version") != version:
+        return False
+    saved = state.get("inputs", {})
+    return (any(custom_id in inputs for custom_id in saved)
+            and all(inputs.get(custom_id, input_hash) == input_hash for custom_id, input_hash in saved.items()))
+
+
+def submit_batch(client, path):
+    with open(path, 'rb') as f:
+        batch_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(input_file_id=batch_file.id, endpoint="/v1/chat/completions",
+                                  completion_window="24h")
+    print(f"Submitted batch {batch.id}")
+    return batch
+
+
+def wait_for_batch(client, batch_id, poll_interval=POLL_INTERVAL):
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts is not None:
+            print(f"Batch {batch_id}: {batch.status} ({counts.completed}/{counts.total} done, {counts.failed} failed)")
+        if batch.status in FINISHED_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def _read_jsonl(client, file_id):
+    if not file_id:
+        return []
+    content = client.files.content(file_id).text
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def collect_results(client, batch):
+    """Split batch output into {custom_id: summary} and {custom_id: error message}."""
+    summaries, errors = {}, {}
+    for line in _read_jsonl(client, batch.output_file_id) + _read_jsonl(client, batch.error_file_id):
+        custom_id = line["custom_id"]
+        response = line.get("response") or {}
+        if response.get("status_code") == 200:
+            summaries[custom_id] = response["body"]["choices"][0]["message"]["content"].strip()
+            usage = response["body"].get("usage") or {}
+            model = response["body"].get("model")
+            record('openai_call', model=model, project=custom_id, batch=True,
+                   prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"),
+                   cost_usd=cost_usd(model, usage.get("prompt_tokens"), usage.get("completion_tokens"), batch=True))
+        else:
+            error = line.get("error") or response.get("body", {}).get("error") or {}
+            errors[custom_id] = error.get("message", f"status {response.get('status_code')}")
+    return summaries, errors
+
+
+def run_batch(requests, on_result, model, system_message, prompt_template, api_key=None, cache=None,
+              poll_interval=POLL_INTERVAL, max_rounds=MAX_ROUNDS):
+    """Summarize {project_name: project_info} through the Batch API, calling on_result per project."""
+    client = OpenAI(api_key=api_key)
+
+    pending = {}
+    for project_name, project_info in requests.items():
+        if project_info is None:
+            on_result(project_name, "NO INFO")
+            continue
+        cached = cache.get(project_info) if cache is not None else None
+        if cached is not None:
+            on_result(project_name, cached)
+        else:
+            pending[project_name] = project_info
+
+    version = prompt_version(model, system_message, prompt_template)
+    state = _load_state()
+    for round_number in range(1, max_rounds + 1):
+        if not pending:
+            break
+
+        inputs = {project_name: hash_text(project_info) for project_name, project_info in pending.items()}
+        if state and state.get("batch_id") and resumable(state, model, version, inputs):
+            print(f"Resuming batch {state['batch_id']}")
+            batch_id = state["batch_id"]
+        else:
+            if state and state.get("batch_id"):
+                print(f"Not resuming batch {state['batch_id']}: it was submitted for another model, prompt or "
+                      f"project info (cancel it if it is still running)")
+            path = build_batch_file(pending, model, system_message, prompt_template)
+            batch_id = submit_batch(client, path).id
+            _save_state({"batch_id": batch_id, "model": model, "prompt_version": version, "inputs": inputs})
+        state = None
+
+        batch = wait_for_batch(client, batch_id, poll_interval)
+        summaries, errors = collect_results(client, batch)
+
+        for project_name, summary in summaries.items():
+            if project_name not in pending:
+                continue
+            if cache is not None:
+                cache.put(pending[project_name], summary)
+            on_result(project_name, summary)
+            del pending[project_name]
+
+        # Anything neither answered nor reported (e.g. an expired batch, or a project
+        # that was not in the resumed batch) is submitted in the next round
+        print(f"Batch round {round_number}: {len(summaries)} succeeded, {len(pending)} to resubmit")
+        for project_name, error in errors.items():
+            if project_name in pending:
+                print(f"Batch request failed for {project_name}: {error}")
+
+    if os.path.exists(BATCH_STATE_FILE):
+        os.remove(BATCH_STATE_FILE)
+
+    for project_name in pending:
+        print(f"Error generating summary for {project_name}: still failing after {max_rounds} batch rounds")
+        on_result(project_name, "ERROR")
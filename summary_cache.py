@@ -0,0 +1,116 @@
+"""Persistent cache of OpenAI summary responses.
+
+Entries are keyed on the model, system message, prompt template and a hash of
+the scraped project info, so a rerun over unchanged info files makes no API
+calls. Entries expire after a TTL, the least recently used ones are evicted
+beyond a size limit, and entries written for older prompts can be dropped.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from state_store import hash_text
+
+CACHE_DB = 'resources/summary_cache.db'
+CACHE_TTL_DAYS = 90
+CACHE_MAX_ENTRIES = 20000
+
+
+def prompt_version(model, system_message, prompt_template):
+    """Hash identifying the prompt an entry was generated with."""
+    return hash_text(model, system_message, prompt_template)
+
+
+class SummaryCache:
+    def __init__(self, model, system_message, prompt_template, path=CACHE_DB,
+                 ttl_days=CACHE_TTL_DAYS, max_entries=CACHE_MAX_ENTRIES):
+        self.prompt_version = prompt_version(model, system_message, prompt_template)
+        self.ttl = ttl_days * 24 * 3600
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                key TEXT PRIMARY KEY,
+                prompt_version TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS summary_cache_accessed ON summary_cache (accessed_at)')
+        self._conn.commit()
+
+    def key(self, project_info):
+        return hash_text(self.prompt_version, hash_text(project_info))
+
+    def get(self, project_info):
+        """Return the cached response for this info, or None on a miss."""
+        key = self.key(project_info)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, created_at FROM summary_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE summary_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, project_info, response):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO summary_cache (key, prompt_version, response, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (self.key(project_info), self.prompt_version, response, now, now))
+            self._conn.commit()
+            self.stores += 1
+
+    def evict(self):
+        """Drop expired entries and the least recently used ones beyond max_entries."""
+        with self._lock:
+            expired = self._conn.execute(
+                'DELETE FROM summary_cache WHERE created_at < ?', (time.time() - self.ttl,)
+            ).rowcount
+            overflow = self._conn.execute('''
+                DELETE FROM summary_cache WHERE key IN (
+                    SELECT key FROM summary_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,)).rowcount
+            self._conn.commit()
+        return expired + overflow
+
+    def invalidate_old_prompts(self):
+        """Drop entries generated with a different model or prompt than the current one."""
+        with self._lock:
+            removed = self._conn.execute(
+                'DELETE FROM summary_cache WHERE prompt_version != ?', (self.prompt_version,)
+            ).rowcount
+            self._conn.commit()
+        return removed
+
+    def clear(self):
+        with self._lock:
+            removed = self._conn.execute('DELETE FROM summary_cache').rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return f"Summary cache: {self.hits} hits, {self.misses} misses ({hit_rate:.0%} hit rate), {self.stores} stored"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
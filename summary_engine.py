@@ -0,0 +1,273 @@
+"""Asyncio summarization engine for gen_summary.
+
+Requests are scheduled through two token buckets (requests/min and
+tokens/min) that are kept in sync with the x-ratelimit-* response headers.
+Throttled and transient failures are retried with jittered exponential
+backoff, and the number of concurrent requests adapts with AIMD: it grows by
+one per window of successful calls and halves on every 429.
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+
+import openai
+from openai import AsyncOpenAI
+
+from telemetry import cost_usd, span
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200000
+INITIAL_CONCURRENCY = 5
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 64
+MAX_ATTEMPTS = 6
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+REQUEST_TIMEOUT = 60
+# Rough allowance for the completion when estimating a request's token cost
+COMPLETION_TOKEN_ESTIMATE = 400
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for scheduling."""
+    return len(text) // 4 + 1
+
+
+def parse_reset(value):
+    """Parse reset durations like '1s', '6m0s' or '250ms' into seconds."""
+    if not value:
+        return None
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    seconds = sum(float(amount) * units[unit] for amount, unit in re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', value))
+    return seconds if seconds else None
+
+
+def _header_int(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(headers):
+    """Delay requested by the server via retry-after-ms / retry-after, if any."""
+    if headers is None:
+        return None
+    for name, scale in (('retry-after-ms', 0.001), ('retry-after', 1)):
+        try:
+            return float(headers.get(name)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Jittered exponential backoff, never shorter than what the server asked for."""
+    delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.0)
+    if retry_after is not None:
+        delay = max(delay, retry_after + random.uniform(0, 0.25))
+    return delay
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously, paused when the server says it is exhausted."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    @property
+    def rate(self):
+        return self.capacity / 60
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount):
+        amount = min(amount, self.capacity)
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def sync(self, limit, remaining, reset):
+        """Adopt the limits reported by the API."""
+        self._refill()
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight requests."""
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttle(self):
+        self.limit = max(self.minimum, self.limit / 2)
+
+
+class SummaryEngine:
+    def __init__(self, model, system_message, prompt_template, api_key=None, cache=None,
+                 rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, initial_concurrency=INITIAL_CONCURRENCY,
+                 max_concurrency=MAX_CONCURRENCY):
+        self.model = model
+        self.system_message = system_message
+        self.prompt_template = prompt_template
+        self.api_key = api_key
+        self.cache = cache
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.retries = 0
+        self.throttled = 0
+
+    def _sync_limits(self, headers):
+        self.requests.sync(_header_int(headers, 'x-ratelimit-limit-requests'),
+                           _header_int(headers, 'x-ratelimit-remaining-requests'),
+                           parse_reset(headers.get('x-ratelimit-reset-requests')))
+        self.tokens.sync(_header_int(headers, 'x-ratelimit-limit-tokens'),
+                         _header_int(headers, 'x-ratelimit-remaining-tokens'),
+                         parse_reset(headers.get('x-ratelimit-reset-tokens')))
+
+    async def _call(self, client, prompt, estimate, fields):
+        raw = await client.chat.completions.with_raw_response.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.system_message},
+                {"role": "user", "content": prompt}
+            ]
+        )
+        self._sync_limits(raw.headers)
+        response = raw.parse()
+        if response.usage is not None:
+            self.tokens.refund(estimate - response.usage.total_tokens)
+            fields.update(prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens,
+                          cost_usd=cost_usd(self.model, response.usage.prompt_tokens, response.usage.completion_tokens))
+        return response.choices[0].message.content.strip()
+
+    async def summarize(self, client, project_name, project_info):
+        """Summarize one project; returns (project_name, summary | "NO INFO" | "ERROR")."""
+        if project_info is None:
+            return project_name, "NO INFO"
+
+        if self.cache is not None:
+            cached = self.cache.get(project_info)
+            if cached is not None:
+                return project_name, cached
+
+        prompt = self.prompt_template.format(project_info=project_info)
+        estimate = estimate_tokens(self.system_message) + estimate_tokens(prompt) + COMPLETION_TOKEN_ESTIMATE
+
+        for attempt in range(MAX_ATTEMPTS):
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimate)
+            try:
+                async with self.concurrency:
+                    with span('openai_call', model=self.model, project=project_name, attempt=attempt) as fields:
+                        summary = await self._call(client, prompt, estimate, fields)
+            except openai.APIStatusError as e:
+                self._sync_limits(e.response.headers)
+                if e.status_code not in RETRYABLE_STATUS:
+                    print(f"Error generating summary for {project_name}: {str(e)}")
+                    return project_name, "ERROR"
+                if e.status_code == 429:
+                    self.throttled += 1
+                    self.concurrency.on_throttle()
+                delay = backoff_delay(attempt, retry_after_seconds(e.response.headers))
+            except openai.APIConnectionError:
+                delay = backoff_delay(attempt)
+            except Exception as e:
+                # e.g. a refused or filtered completion without content; one bad response mustn't stop the run
+                print(f"Error generating summary for {project_name}: {type(e).__name__}: {e}")
+                return project_name, "ERROR"
+            else:
+                self.concurrency.on_success()
+                if self.cache is not None:
+                    self.cache.put(project_info, summary)
+                return project_name, summary
+
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+        print(f"Error generating summary for {project_name}: gave up after {MAX_ATTEMPTS} attempts")
+        return project_name, "ERROR"
+
+    async def run(self, projects, on_result):
+        """Summarize every (project_name, project_info) pair, calling on_result as each finishes."""
+        self.concurrency = AdaptiveConcurrency(self.initial_concurrency, maximum=self.max_concurrency)
+        client = AsyncOpenAI(api_key=self.api_key, max_retries=0, timeout=REQUEST_TIMEOUT)
+        try:
+            tasks = [asyncio.create_task(self.summarize(client, name, info)) for name, info in projects]
+            for task in asyncio.as_completed(tasks):
+                project_name, summary = await task
+                on_result(project_name, summary)
+        finally:
+            await client.close()
+
+    def start(self):
+        """Run the engine on a background event loop, for callers that submit projects one at a time from threads."""
+        self.concurrency = AdaptiveConcurrency(self.initial_concurrency, maximum=self.max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='summary-engine', daemon=True)
+        self._thread.start()
+        self._client = AsyncOpenAI(api_key=self.api_key, max_retries=0, timeout=REQUEST_TIMEOUT)
+        return self
+
+    def summarize_blocking(self, project_name, project_info):
+        """Summarize one project on the background loop started by `start`, waiting for the result.
+
+        Every caller shares the loop's rate limits and adaptive concurrency.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.summarize(self._client, project_name, project_info), self._loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def stats(self):
+        return (f"Summary engine: {self.retries} retries, {self.throttled} throttled, "
+                f"final concurrency {int(self.concurrency.limit)}")
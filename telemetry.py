@@ -0,0 +1,272 @@
+"""Structured timing, throughput and cost events shared by every script.
+
+Scripts time named phases with `span` (driver_start, navigate, wait,
+extract, write, http_fetch, openai_call, wiki_edit, ...) and log one-off
+facts with `record`. Every event is one JSON line in resources/telemetry.jsonl,
+tagged with the run (script, start time and pid) it belongs to. Set
+TELEMETRY=off to disable recording.
+
+    python telemetry.py report            # latest run: p50/p95 per phase, slowest domains, failures, $ spent
+    python telemetry.py report --all      # every run in the file
+    python telemetry.py metrics > ief.prom  # OpenMetrics text format, e.g. for node_exporter's textfile collector
+"""
+import argparse
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TELEMETRY_FILE = 'resources/telemetry.jsonl'
+# USD per million (prompt, completion) tokens; Batch API requests cost half
+MODEL_PRICES = {'gpt-4o-mini': (0.15, 0.60), 'gpt-4o': (2.50, 10.00)}
+BATCH_DISCOUNT = 0.5
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Phases whose time is spent waiting on a website, used for the slowest-domains table
+SITE_PHASES = ('http_fetch', 'navigate', 'wait', 'project_page')
+SLOWEST_DOMAINS = 10
+
+
+class _Recorder:
+    """Appends events to the telemetry file from any thread, opening it on first use."""
+
+    def __init__(self, path=TELEMETRY_FILE):
+        self.path = path
+        self.enabled = os.getenv('TELEMETRY', 'on').lower() not in ('0', 'off', 'false', 'no')
+        self.script = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        self.run = f"{self.script}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self._started = time.monotonic()
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _write(self, event):
+        self._file.write(json.dumps(event, default=str) + '\n')
+
+    def write(self, name, fields):
+        if not self.enabled:
+            return
+        event = {'ts': round(time.time(), 3), 'run': self.run, 'event': name,
+                 **{key: value for key, value in fields.items() if value is not None}}
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)  # Line-buffered
+                self._write({'ts': event['ts'], 'run': self.run, 'event': 'run_start', 'script': self.script,
+                             'argv': sys.argv[1:]})
+                atexit.register(self.close)
+            self._write(event)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._write({'ts': round(time.time(), 3), 'run': self.run, 'event': 'run_end',
+                             'seconds': round(time.monotonic() - self._started, 3)})
+                self._file.close()
+                self._file = None
+
+
+_recorder = _Recorder()
+
+
+def record(name, **fields):
+    """Record a single event, e.g. record('openai_call', seconds=1.2, prompt_tokens=800)."""
+    _recorder.write(name, fields)
+
+
+@contextmanager
+def span(name, **fields):
+    """Time a phase and record it with its fields.
+
+    The fields dict is yielded so the body can add to it (an outcome, token
+    counts, ...). If the body raises, the exception class is recorded as
+    `error` and the exception propagates.
+    """
+    start = time.monotonic()
+    try:
+        yield fields
+    except BaseException as e:
+        fields.setdefault('error', type(e).__name__)
+        raise
+    finally:
+        record(name, seconds=round(time.monotonic() - start, 4), **fields)
+
+
+def cost_usd(model, prompt_tokens, completion_tokens, batch=False):
+    """Price of one request in USD, or None for a model without a known price.
+
+    Dated snapshots ('gpt-4o-mini-2024-07-18') are priced as their base model.
+    """
+    base = next((name for name in sorted(MODEL_PRICES, key=len, reverse=True) if (model or '').startswith(name)), None)
+    if base is None:
+        return None
+    prompt_price, completion_price = MODEL_PRICES[base]
+    cost = ((prompt_tokens or 0) * prompt_price + (completion_tokens or 0) * completion_price) / 1e6
+    return round(cost * (BATCH_DISCOUNT if batch else 1), 8)
+
+
+def load_events(path=TELEMETRY_FILE, run='last'):
+    """Events of one run (an id, or 'last' for the most recent) or of every run (run=None) as a DataFrame."""
+    import pandas as pd
+
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # Partial line from a run that was killed mid-write
+    df = pd.DataFrame(events)
+    if df.empty or run is None:
+        return df
+    if run == 'last':
+        run = df.loc[df['event'] == 'run_start', 'run'].iloc[-1]
+    return df[df['run'] == run]
+
+
+def _column(df, name):
+    import pandas as pd
+
+    return df[name] if name in df else pd.Series(index=df.index, dtype=object)
+
+
+def phase_table(df):
+    spans = df[_column(df, 'seconds').notna() & ~df['event'].isin(('run_end',))]
+    if spans.empty:
+        return None
+    grouped = spans.groupby('event')['seconds']
+    table = grouped.agg(count='count', total='sum', p50='median', p95=lambda s: s.quantile(0.95), max='max')
+    table['failed'] = spans[_column(spans, 'error').notna()].groupby('event').size()
+    return table.fillna({'failed': 0}).astype({'failed': int}).sort_values('total', ascending=False).round(3)
+
+
+def domain_table(df, limit=SLOWEST_DOMAINS):
+    from frontier import registered_domain
+
+    visits = df[df['event'].isin(SITE_PHASES) & _column(df, 'url').notna()]
+    if visits.empty:
+        return None
+    visits = visits.assign(domain=visits['url'].map(registered_domain))
+    table = visits.groupby('domain')['seconds'].agg(requests='count', total='sum', p95=lambda s: s.quantile(0.95))
+    return table.sort_values('total', ascending=False).head(limit).round(3)
+
+
+def failure_table(df):
+    failures = df[_column(df, 'error').notna()]
+    if failures.empty:
+        return None
+    return failures.groupby(['event', 'error']).size().sort_values(ascending=False).rename('count')
+
+
+def resource_table(df):
+    """Per resource policy: traffic per page, estimated savings from blocked requests, Chrome RSS and kills."""
+    pages = df[df['event'] == 'page_resources']
+    if pages.empty:
+        return None
+    pages = pages.assign(kb=_column(pages, 'bytes') / 1024, kb_saved=_column(pages, 'bytes_saved') / 1024,
+                         rss_mb=_column(pages, 'rss_mb').astype(float))
+    table = pages.groupby('policy').agg(pages=('url', 'count'), requests=('requests', 'mean'), blocked=('blocked', 'mean'),
+                                        kb=('kb', 'mean'), kb_saved=('kb_saved', 'mean'),
+                                        mb_saved=('kb_saved', lambda s: s.sum() / 1024),
+                                        rss_p50=('rss_mb', 'median'), rss_p95=('rss_mb', lambda s: s.quantile(0.95)))
+    kills = df[df['event'] == 'driver_killed']
+    table['kills'] = kills.groupby(_column(kills, 'policy')).size() if not kills.empty else 0
+    return table.fillna({'kills': 0}).astype({'kills': int}).round(1)
+
+
+def run_table(df):
+    import pandas as pd
+
+    calls = df[df['event'] == 'openai_call']
+    starts = df[df['event'] == 'run_start'].set_index('run')
+    table = pd.DataFrame({
+        'script': starts['script'],
+        'started': pd.to_datetime(starts['ts'], unit='s').dt.strftime('%Y-%m-%d %H:%M'),
+        'seconds': df[df['event'] == 'run_end'].set_index('run')['seconds'],
+        'events': df.groupby('run').size(),
+        'openai_calls': calls.groupby('run').size(),
+        'prompt_tokens': _column(calls, 'prompt_tokens').groupby(calls['run']).sum(),
+        'completion_tokens': _column(calls, 'completion_tokens').groupby(calls['run']).sum(),
+        'usd': _column(calls, 'cost_usd').groupby(calls['run']).sum(),
+    })
+    table = table.fillna(0)
+    return table.astype({'events': int, 'openai_calls': int, 'prompt_tokens': int, 'completion_tokens': int}).round({'usd': 4})
+
+
+def print_report(df):
+    import pandas as pd
+
+    with pd.option_context('display.width', 160, 'display.max_columns', 20):
+        for title, table in (('Runs', run_table(df)), ('Phases (seconds)', phase_table(df)),
+                             ('Slowest domains (seconds)', domain_table(df)), ('Page resources', resource_table(df)),
+                             ('Failures', failure_table(df))):
+            if table is not None and len(table):
+                print(f"\n{title}\n{table.to_string()}")
+
+
+def _labels(**labels):
+    escaped = {key: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for key, value in labels.items()}
+    return ','.join(f'{key}="{value}"' for key, value in escaped.items())
+
+
+def openmetrics(df):
+    """The events as OpenMetrics text: phase latency histograms, failure, token and cost counters."""
+    lines = ['# TYPE ief_phase_seconds histogram', '# UNIT ief_phase_seconds seconds',
+             '# HELP ief_phase_seconds Time spent per pipeline phase.']
+    spans = df[_column(df, 'seconds').notna() & (df['event'] != 'run_end')]
+    for phase, seconds in spans.groupby('event')['seconds']:
+        for bucket in LATENCY_BUCKETS:
+            lines.append(f'ief_phase_seconds_bucket{{{_labels(phase=phase, le=float(bucket))}}} {int((seconds <= bucket).sum())}')
+        lines.append(f'ief_phase_seconds_bucket{{{_labels(phase=phase, le="+Inf")}}} {len(seconds)}')
+        lines.append(f'ief_phase_seconds_count{{{_labels(phase=phase)}}} {len(seconds)}')
+        lines.append(f'ief_phase_seconds_sum{{{_labels(phase=phase)}}} {seconds.sum():.4f}')
+
+    lines += ['# TYPE ief_failures counter', '# HELP ief_failures Failed phases by error class.']
+    failures = df[_column(df, 'error').notna()]
+    for (phase, error), count in (failures.groupby(['event', 'error']).size().items() if not failures.empty else ()):
+        lines.append(f'ief_failures_total{{{_labels(phase=phase, error=error)}}} {count}')
+
+    calls = df[df['event'] == 'openai_call']
+    lines += ['# TYPE ief_openai_tokens counter', '# HELP ief_openai_tokens OpenAI tokens used.']
+    for kind in ('prompt', 'completion'):
+        lines.append(f'ief_openai_tokens_total{{{_labels(kind=kind)}}} {int(_column(calls, f"{kind}_tokens").sum())}')
+    pages = df[df['event'] == 'page_resources']
+    lines += ['# TYPE ief_page_bytes counter', '# HELP ief_page_bytes Bytes Chrome transferred, and estimated bytes saved by blocking.']
+    for policy, group in pages.groupby(_column(pages, 'policy')):
+        lines.append(f'ief_page_bytes_total{{{_labels(policy=policy, kind="transferred")}}} {int(_column(group, "bytes").sum())}')
+        lines.append(f'ief_page_bytes_total{{{_labels(policy=policy, kind="saved")}}} {int(_column(group, "bytes_saved").sum())}')
+    lines += ['# TYPE ief_driver_kills counter', '# HELP ief_driver_kills Chrome drivers killed for using too much memory.',
+              f'ief_driver_kills_total {int((df["event"] == "driver_killed").sum())}']
+
+    lines += ['# TYPE ief_openai_cost_usd counter', '# HELP ief_openai_cost_usd Estimated OpenAI spend.',
+              f'ief_openai_cost_usd_total {float(_column(calls, "cost_usd").sum()):.6f}', '# EOF']
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the telemetry recorded by the pipeline scripts")
+    parser.add_argument('command', choices=['report', 'metrics'], help='Print a report, or OpenMetrics text')
+    parser.add_argument('--file', default=TELEMETRY_FILE, help='Telemetry file to read')
+    runs = parser.add_mutually_exclusive_group()
+    runs.add_argument('--run', default='last', help="Run id to summarize (default: the latest run)")
+    runs.add_argument('--all', action='store_true', help='Summarize every run in the file')
+    args = parser.parse_args()
+    _recorder.enabled = False  # Don't record the report itself
+
+    if not os.path.exists(args.file):
+        print(f"No telemetry recorded yet in {args.file}")
+        return
+    df = load_events(args.file, run=None if args.all else args.run)
+    if df.empty:
+        print("No matching events")
+        return
+    if args.command == 'metrics':
+        sys.stdout.write(openmetrics(df))
+    else:
+        print_report(df)
+
+
+if __name__ == "__main__":
+    main()
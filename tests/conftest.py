@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The scripts live in the repository root and are imported as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TELEMETRY', 'off')
@@ -0,0 +1,52 @@
+"""CrawlFrontier: per-host limits and slots taken outside the queue with acquire."""
+import time
+
+from frontier import CrawlFrontier, registered_domain
+
+
+def test_registered_domain():
+    assert registered_domain('https://foo.notion.site/page') == 'notion.site'
+    assert registered_domain('https://www.example.co.uk') == 'example.co.uk'
+    assert registered_domain('http://127.0.0.1:8000/') == '127.0.0.1'
+
+
+def test_per_host_limit():
+    frontier = CrawlFrontier(per_host=1, delay=0, robots=False)
+    frontier.add('https://a.notion.site')
+    frontier.add('https://b.notion.site')
+    frontier.add('https://example.com')
+
+    first = frontier.get(timeout=1)
+    assert first[0] == 'https://a.notion.site'
+    # notion.site is at its limit, so the other domain is handed out next
+    assert frontier.get(timeout=1)[0] == 'https://example.com'
+    assert frontier.get(timeout=0.2) is None
+
+    frontier.done(first[0])
+    assert frontier.get(timeout=1)[0] == 'https://b.notion.site'
+
+
+def test_acquire_while_delayed_keeps_queue_moving():
+    frontier = CrawlFrontier(per_host=2, delay=0.3, robots=False)
+    frontier.add('https://a.notion.site')
+    frontier.add('https://b.notion.site')
+
+    url, _ = frontier.get(timeout=1)
+    # The domain is delayed now; a follow-up page on it pushes the delay forward
+    assert frontier.acquire('https://a.notion.site/contact', timeout=3)
+    frontier.done('https://a.notion.site/contact')
+    frontier.done(url)
+
+    assert frontier.get(timeout=3)[0] == 'https://b.notion.site'
+
+
+def test_acquire_waits_for_delay_and_times_out_when_full():
+    frontier = CrawlFrontier(per_host=1, delay=0.2, robots=False)
+    started = time.monotonic()
+    assert frontier.acquire('https://example.com/a', timeout=1)
+    assert not frontier.acquire('https://example.com/b', timeout=0.1)
+
+    frontier.done('https://example.com/a')
+    assert frontier.acquire('https://example.com/b', timeout=1)
+    assert time.monotonic() - started >= 0.2
+    frontier.done('https://example.com/b')
@@ -0,0 +1,123 @@
+"""WikiPublisher against the local MediaWiki stub: token caching, maxlag/Retry-After and skipping unchanged pages."""
+import types
+
+import pytest
+import requests
+
+import gen_wikis
+from gen_wikis import STAGE, WikiPublisher, plan_sync, record_outcome
+from state_store import StateStore, hash_text
+from stub_servers import start_mediawiki_stub
+
+
+@pytest.fixture
+def wiki():
+    server = start_mediawiki_stub(port=0, latency=0, jitter=0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def publisher(wiki):
+    return WikiPublisher(requests.Session(), api_url=f"http://127.0.0.1:{wiki.server_address[1]}/w/api.php")
+
+
+@pytest.fixture
+def token_fetches(monkeypatch):
+    fetches = []
+    original = gen_wikis.get_csrf_token
+
+    def counting_get_csrf_token(*args, **kwargs):
+        fetches.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(gen_wikis, 'get_csrf_token', counting_get_csrf_token)
+    return fetches
+
+
+def test_token_is_fetched_once_for_many_edits(wiki, publisher, token_fetches):
+    outcomes = {}
+    pages = [(f"p{i}", f"Articles:Project {i}", f"= Project {i} =") for i in range(6)]
+
+    publisher.publish(pages, lambda key, title, outcome: outcomes.__setitem__(key, outcome))
+
+    assert set(outcomes.values()) == {"created"}
+    assert len(token_fetches) == 1
+    assert len(wiki.pages) == 6
+
+
+def test_badtoken_refreshes_the_token_and_retries(wiki, publisher, token_fetches):
+    assert publisher.edit("Articles:Alpha", "first") == "created"
+    # The wiki rotates its token; the cached one is now rejected
+    wiki._token = None
+
+    assert publisher.edit("Articles:Alpha", "second") == "edited"
+    assert len(token_fetches) == 2
+    assert wiki.pages["Articles:Alpha"]["content"] == "second"
+
+
+def test_maxlag_waits_for_retry_after(wiki, publisher, monkeypatch):
+    delays = []
+
+    def sleep(seconds):
+        delays.append(seconds)
+        if len(delays) == 2:
+            wiki.config['lag_rate'] = 0.0
+
+    monkeypatch.setattr(gen_wikis, 'time', types.SimpleNamespace(sleep=sleep))
+    wiki.config.update(lag_rate=1.0, retry_after=3)
+
+    assert publisher.edit("Articles:Beta", "content") == "created"
+    assert delays == [3.0, 3.0]
+
+
+def test_rate_limit_waits_for_retry_after(wiki, publisher, monkeypatch):
+    delays = []
+
+    def sleep(seconds):
+        delays.append(seconds)
+        wiki.edits.events.clear()  # The rate-limit window has passed
+
+    monkeypatch.setattr(gen_wikis, 'time', types.SimpleNamespace(sleep=sleep))
+    wiki.edits.limit = 1
+
+    assert publisher.edit("Articles:Gamma", "one") == "created"
+    assert publisher.edit("Articles:Delta", "two") == "created"
+    assert len(delays) == 1
+    assert 1 <= delays[0] <= 60
+
+
+def test_sync_skips_unchanged_pages(wiki, publisher):
+    wiki.save_page("Articles:Same", "= Same =\n\nUnchanged text")
+    wiki.save_page("Articles:Old", "= Old =\n\nOutdated text")
+    pages = [("same", "Articles:Same", "= Same =\n\nUnchanged text\n"),  # Trailing whitespace is stripped on save
+             ("old", "Articles:Old", "= Old =\n\nNew text"),
+             ("new", "Articles:New", "= New =")]
+
+    revisions = publisher.fetch_revisions([title for _, title, _ in pages])
+    plan = {key: (action, baserevid) for action, key, _, _, baserevid in plan_sync(pages, revisions)}
+
+    assert plan["same"][0] == "skip"
+    assert plan["old"] == ("edit", wiki.pages["Articles:Old"]["revid"])
+    assert plan["new"] == ("create", None)
+
+
+def test_identical_edit_is_reported_unchanged(wiki, publisher):
+    assert publisher.edit("Articles:Epsilon", "text") == "created"
+    revid = wiki.pages["Articles:Epsilon"]["revid"]
+
+    assert publisher.edit("Articles:Epsilon", "text\n") == "unchanged"
+    assert wiki.pages["Articles:Epsilon"]["revid"] == revid
+
+
+def test_published_pages_are_not_republished(tmp_path):
+    with StateStore(str(tmp_path / 'state.db')) as store:
+        input_hash = hash_text("Articles:Zeta", "content")
+        assert store.needs_run("Zeta", STAGE, input_hash)
+
+        record_outcome(store, "Zeta", input_hash, "created")
+        assert not store.needs_run("Zeta", STAGE, input_hash)
+        assert store.needs_run("Zeta", STAGE, hash_text("Articles:Zeta", "new content"))
+
+        record_outcome(store, "Eta", hash_text("Articles:Eta", "content"), "failed")
+        assert store.needs_run("Eta", STAGE, hash_text("Articles:Eta", "content"))
@@ -0,0 +1,66 @@
+"""run_batch against the local OpenAI stub: resuming a saved batch after part of it was recorded."""
+import json
+
+import pytest
+from openai import OpenAI
+
+import summary_batch
+from state_store import hash_text
+from stub_servers import start_openai_stub
+from summary_cache import prompt_version
+
+MODEL = "gpt-4o-mini"
+SYSTEM_MESSAGE = "You summarize projects."
+PROMPT = "Summarize this project.\n\n{project_info}"
+
+
+@pytest.fixture
+def openai_stub(monkeypatch, tmp_path):
+    server = start_openai_stub(port=0, latency=0, jitter=0, batch_delay=0)
+    monkeypatch.setenv('OPENAI_BASE_URL', f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.chdir(tmp_path)  # The request and state files go to resources/
+    yield server
+    server.shutdown()
+
+
+def submit_saved_batch(requests):
+    """Submit a batch and save its state, as an interrupted run would have left it."""
+    path = summary_batch.build_batch_file(requests, MODEL, SYSTEM_MESSAGE, PROMPT)
+    batch_id = summary_batch.submit_batch(OpenAI(api_key='stub'), path).id
+    summary_batch._save_state({"batch_id": batch_id, "model": MODEL,
+                               "prompt_version": prompt_version(MODEL, SYSTEM_MESSAGE, PROMPT),
+                               "inputs": {name: hash_text(info) for name, info in requests.items()}})
+    return batch_id
+
+
+def run(requests):
+    results = {}
+    summary_batch.run_batch(requests, results.__setitem__, MODEL, SYSTEM_MESSAGE, PROMPT, api_key='stub',
+                            poll_interval=0.05)
+    return results
+
+
+def test_resumes_partially_recorded_batch(openai_stub):
+    saved_id = submit_saved_batch({'a': 'info a', 'b': 'info b', 'c': 'info c'})
+
+    # 'a' was recorded before the run stopped; 'd' is new
+    results = run({'b': 'info b', 'c': 'info c', 'd': 'info d'})
+
+    assert set(results) == {'b', 'c', 'd'}
+    assert 'ERROR' not in results.values()
+    new_batches = [batch for batch_id, batch in openai_stub.batches.items() if batch_id != saved_id]
+    # Only the project missing from the saved batch is submitted again
+    assert [batch['request_counts']['total'] for batch in new_batches] == [1]
+
+
+def test_changed_info_is_not_resumed(openai_stub):
+    saved_id = submit_saved_batch({'a': 'info a', 'b': 'info b'})
+
+    results = run({'a': 'info a', 'b': 'new info b'})
+
+    assert set(results) == {'a', 'b'}
+    new_batches = [batch for batch_id, batch in openai_stub.batches.items() if batch_id != saved_id]
+    assert [batch['request_counts']['total'] for batch in new_batches] == [2]
+    with open(summary_batch.BATCH_REQUESTS_FILE, encoding='utf-8') as f:
+        prompts = [json.loads(line)["body"]["messages"][1]["content"] for line in f]
+    assert PROMPT.format(project_info='new info b') in prompts
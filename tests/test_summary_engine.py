@@ -0,0 +1,182 @@
+"""SummaryEngine against the local OpenAI stub: retries, header-driven rate limits and AIMD concurrency."""
+import asyncio
+
+import pytest
+from openai import AsyncOpenAI
+
+import summary_engine
+from stub_servers import start_openai_stub
+from summary_engine import AdaptiveConcurrency, SummaryEngine
+
+PROMPT = "Summarize this project.\n\n{project_info}"
+
+
+@pytest.fixture
+def openai_stub():
+    servers = []
+
+    def start(**config):
+        server = start_openai_stub(port=0, latency=0, jitter=0, **config)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+class Backoffs(list):
+    """(attempt, retry_after, delay) of every backoff; hooks run with the number of backoffs so far."""
+
+    def __init__(self):
+        super().__init__()
+        self.hooks = []
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """Records every backoff_delay call; the scheduled delays are kept short."""
+    calls = Backoffs()
+    original = summary_engine.backoff_delay
+
+    def recording_backoff(attempt, retry_after=None):
+        delay = original(attempt, retry_after)
+        calls.append((attempt, retry_after, delay))
+        for hook in calls.hooks:
+            hook(len(calls))
+        return delay
+
+    monkeypatch.setattr(summary_engine, 'BASE_BACKOFF', 0.01)
+    monkeypatch.setattr(summary_engine, 'backoff_delay', recording_backoff)
+    return calls
+
+
+def summarize(engine, server, projects, concurrency=None):
+    """Summarize (name, info) pairs one after another on a client pointed at the stub."""
+    async def run():
+        engine.concurrency = concurrency or AdaptiveConcurrency(engine.initial_concurrency)
+        client = AsyncOpenAI(api_key='stub', base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                             max_retries=0)
+        try:
+            return [await engine.summarize(client, name, info) for name, info in projects]
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def make_engine(**kwargs):
+    return SummaryEngine('gpt-4o-mini', 'You write project summaries.', PROMPT, api_key='stub', **kwargs)
+
+
+def test_503_is_retried_with_exponential_backoff(openai_stub, backoffs):
+    server = openai_stub(error_rate=1.0)
+
+    def recover(calls):
+        if calls == 2:
+            server.config['error_rate'] = 0.0
+
+    backoffs.hooks.append(recover)
+    engine = make_engine()
+
+    [(name, summary)] = summarize(engine, server, [('Alpha', 'Project Name: Alpha\nSolar panels for schools')])
+
+    assert name == 'Alpha'
+    assert summary.startswith('Alpha is a project')
+    assert engine.retries == 2
+    assert engine.throttled == 0
+    assert [(attempt, retry_after) for attempt, retry_after, _ in backoffs] == [(0, None), (1, None)]
+    assert 0.005 <= backoffs[0][2] <= 0.01
+    assert 0.01 <= backoffs[1][2] <= 0.02
+
+
+def test_429_waits_at_least_retry_after(openai_stub, backoffs):
+    server = openai_stub(throttle_rate=1.0, retry_after=0.05)
+
+    def recover(calls):
+        if calls == 1:
+            server.config['throttle_rate'] = 0.0
+
+    backoffs.hooks.append(recover)
+    engine = make_engine()
+
+    [(_, summary)] = summarize(engine, server, [('Beta', 'Project Name: Beta\nClean water')])
+
+    assert summary.startswith('Beta is a project')
+    assert engine.retries == 1
+    assert engine.throttled == 1
+    [(attempt, retry_after, delay)] = backoffs
+    assert (attempt, retry_after) == (0, 0.05)
+    assert delay >= 0.05
+
+
+def test_gives_up_after_max_attempts(openai_stub, backoffs, monkeypatch):
+    monkeypatch.setattr(summary_engine, 'MAX_ATTEMPTS', 3)
+    server = openai_stub(error_rate=1.0)
+    engine = make_engine()
+
+    assert summarize(engine, server, [('Gamma', 'Project Name: Gamma')]) == [('Gamma', 'ERROR')]
+    assert engine.retries == 3
+    assert len(backoffs) == 3
+
+
+def test_rate_limit_headers_feed_token_buckets(openai_stub):
+    server = openai_stub(rpm=40, tpm=5000)
+    engine = make_engine(rpm=500, tpm=200000)
+
+    summarize(engine, server, [('Delta', 'Project Name: Delta\nReforestation'),
+                               ('Epsilon', 'Project Name: Epsilon\nMicro loans')])
+
+    assert engine.requests.capacity == 40
+    assert engine.tokens.capacity == 5000
+    # The buckets never hold more than the server said remains
+    assert engine.requests.tokens <= 40 - 2
+    assert engine.tokens.tokens < 5000
+    assert engine.requests.blocked_until == 0
+
+
+def test_exhausted_budget_blocks_until_reset(openai_stub):
+    server = openai_stub(rpm=1)
+    engine = make_engine()
+
+    summarize(engine, server, [('Zeta', 'Project Name: Zeta')])
+
+    assert engine.requests.capacity == 1
+    assert engine.requests.tokens < 1
+    assert 55 < engine.requests.blocked_until - summary_engine.time.monotonic() <= 60
+
+
+def test_aimd_halves_on_429_and_grows_on_success(openai_stub, backoffs):
+    server = openai_stub(throttle_rate=1.0, retry_after=0.01)
+
+    def recover(calls):
+        if calls == 3:
+            server.config['throttle_rate'] = 0.0
+
+    backoffs.hooks.append(recover)
+    engine = make_engine()
+    concurrency = AdaptiveConcurrency(8)
+
+    summarize(engine, server, [('Eta', 'Project Name: Eta')], concurrency)
+    # 8 -> 4 -> 2 -> 1 on the three 429s, then 1 + 1/1 on the success
+    assert engine.throttled == 3
+    assert concurrency.limit == 2
+
+    summarize(engine, server, [(f'Project {i}', f'Project Name: Project {i}') for i in range(5)], concurrency)
+    # Additive increase: 1/limit per success
+    assert engine.throttled == 3
+    assert int(concurrency.limit) == 3
+
+
+def test_unexpected_exception_is_recorded_as_error(openai_stub, monkeypatch):
+    server = openai_stub()
+    engine = make_engine()
+
+    async def no_content(*args):
+        raise AttributeError("'NoneType' object has no attribute 'strip'")
+
+    monkeypatch.setattr(engine, '_call', no_content)
+
+    results = summarize(engine, server, [('Theta', 'Project Name: Theta'), ('Iota', None)])
+
+    assert results == [('Theta', 'ERROR'), ('Iota', 'NO INFO')]
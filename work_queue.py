@@ -0,0 +1,343 @@
+"""Shared task queue for running the scrapers as several worker processes.
+
+`python work_queue.py enqueue info contacts screenshots` queues every project
+of resources/mixed_data.csv. Then any number of `info_export.py --worker`,
+`contact_export.py --worker` or `image_export.py --worker` processes lease
+batches of tasks and process them. The queue is a SQLite database in WAL
+mode, so every worker must run on the same machine: WAL relies on shared
+memory and doesn't work on network filesystems like NFS or SMB.
+
+A lease expires after --lease-seconds unless the worker's heartbeat renews
+it, so the tasks of a crashed worker go back to the queue. A task is retried
+up to MAX_ATTEMPTS times before it is marked failed. Results are committed
+against the lease they were produced under: a worker whose lease was taken
+over can't overwrite the result of the worker that took it, and committing
+the same result twice is harmless. The scrapers write their outputs per
+project, so a task processed twice doesn't duplicate anything either.
+
+    python work_queue.py enqueue info --force   # queue every project again, including finished ones
+    python work_queue.py status                 # tasks per queue and status, and the active workers
+    python work_queue.py retry info             # give the failed tasks another MAX_ATTEMPTS attempts
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+
+QUEUE_DB = 'resources/work_queue.db'
+QUEUES = ('info', 'contacts', 'screenshots')
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+BATCH_SIZE = 20
+POLL_INTERVAL = 5
+
+Task = namedtuple('Task', 'queue key payload lease_id attempts')
+
+
+def worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def add_worker_arguments(parser):
+    """Add the options for running an exporter as a queue worker."""
+    parser.add_argument('--worker', action='store_true',
+                        help=f'Process tasks leased from the shared work queue ({QUEUE_DB}) instead of the whole CSV')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Tasks leased at a time')
+    parser.add_argument('--lease-seconds', type=int, default=LEASE_SECONDS,
+                        help='Seconds before the tasks of a worker that stopped sending heartbeats are handed out again')
+    parser.add_argument('--wait', action='store_true', help='Keep polling for new tasks once the queue is drained')
+
+
+class WorkQueue:
+    """SQLite-backed task queues with leases, safe to share between processes."""
+
+    def __init__(self, path=QUEUE_DB, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # Transactions are explicit, so leasing can take the write lock before reading
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                queue TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_id TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (queue, key)
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS tasks_status ON tasks (queue, status)')
+
+    def _transaction(self, statements):
+        """Run statements(conn) in one write transaction and return its result."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = statements(self._conn)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return result
+
+    def enqueue(self, queue, tasks, force=False):
+        """Queue {key: payload} tasks; returns how many were added or reset to pending.
+
+        Tasks already queued are left alone unless their payload changed or
+        `force` is set (leased tasks are never reset).
+        """
+        def statements(conn):
+            now = time.time()
+            changed = 0
+            for key, payload in tasks.items():
+                payload = json.dumps(payload, sort_keys=True)
+                row = conn.execute('SELECT payload, status FROM tasks WHERE queue = ? AND key = ?', (queue, key)).fetchone()
+                if row is None:
+                    conn.execute('INSERT INTO tasks (queue, key, payload, status, updated_at) VALUES (?, ?, ?, ?, ?)',
+                                 (queue, key, payload, 'pending', now))
+                elif row[1] != 'leased' and (row[0] != payload or (force and row[1] != 'pending')):
+                    conn.execute('''UPDATE tasks SET payload = ?, status = 'pending', attempts = 0, result = NULL,
+                                    error = NULL, updated_at = ? WHERE queue = ? AND key = ?''',
+                                 (payload, now, queue, key))
+                else:
+                    continue
+                changed += 1
+            return changed
+        return self._transaction(statements)
+
+    def lease(self, queue, worker, limit):
+        """Lease up to `limit` pending tasks, or tasks whose lease expired, to a worker."""
+        def statements(conn):
+            now = time.time()
+            # Tasks whose lease ran out on their last attempt crashed every worker that took them
+            conn.execute('''UPDATE tasks SET status = 'failed', error = 'lease expired', lease_id = NULL, updated_at = ?
+                            WHERE queue = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?''',
+                         (now, queue, now, self.max_attempts))
+            rows = conn.execute('''SELECT key, payload, attempts FROM tasks
+                                   WHERE queue = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                                   ORDER BY attempts, updated_at LIMIT ?''', (queue, now, limit)).fetchall()
+            tasks = []
+            for key, payload, attempts in rows:
+                lease_id = uuid.uuid4().hex
+                conn.execute('''UPDATE tasks SET status = 'leased', attempts = attempts + 1, worker = ?, lease_id = ?,
+                                lease_expires = ?, updated_at = ? WHERE queue = ? AND key = ?''',
+                             (worker, lease_id, now + self.lease_seconds, now, queue, key))
+                tasks.append(Task(queue, key, json.loads(payload), lease_id, attempts + 1))
+            return tasks
+        return self._transaction(statements)
+
+    def heartbeat(self, tasks):
+        """Renew the leases of tasks still held; returns the keys whose lease was lost."""
+        def statements(conn):
+            lost = set()
+            expires = time.time() + self.lease_seconds
+            for task in tasks:
+                cursor = conn.execute('''UPDATE tasks SET lease_expires = ? WHERE queue = ? AND key = ? AND lease_id = ?
+                                         AND status = 'leased' ''', (expires, task.queue, task.key, task.lease_id))
+                if cursor.rowcount == 0:
+                    lost.add(task.key)
+            return lost
+        return self._transaction(statements)
+
+    def complete(self, task, result=None):
+        """Commit a task's result; False when its lease was taken over by another worker."""
+        def statements(conn):
+            # A finished task keeps its lease id, so committing the same result again succeeds
+            cursor = conn.execute('''UPDATE tasks SET status = 'done', result = ?, error = NULL, updated_at = ?
+                                     WHERE queue = ? AND key = ? AND lease_id = ? AND status IN ('leased', 'done')''',
+                                  (json.dumps(result, default=str), time.time(), task.queue, task.key, task.lease_id))
+            return cursor.rowcount == 1
+        return self._transaction(statements)
+
+    def fail(self, task, error):
+        """Record a failed attempt: the task is retried until it has had max_attempts."""
+        status = 'failed' if task.attempts >= self.max_attempts else 'pending'
+
+        def statements(conn):
+            cursor = conn.execute('''UPDATE tasks SET status = ?, error = ?, updated_at = ?
+                                     WHERE queue = ? AND key = ? AND lease_id = ? AND status = 'leased' ''',
+                                  (status, str(error), time.time(), task.queue, task.key, task.lease_id))
+            return cursor.rowcount == 1
+        return self._transaction(statements)
+
+    def release(self, tasks):
+        """Hand leased tasks back without counting the attempt, e.g. when a worker is stopped."""
+        def statements(conn):
+            for task in tasks:
+                conn.execute('''UPDATE tasks SET status = 'pending', attempts = attempts - 1, lease_id = NULL,
+                                updated_at = ? WHERE queue = ? AND key = ? AND lease_id = ? AND status = 'leased' ''',
+                             (time.time(), task.queue, task.key, task.lease_id))
+        self._transaction(statements)
+
+    def retry_failed(self, queue):
+        def statements(conn):
+            return conn.execute('''UPDATE tasks SET status = 'pending', attempts = 0, updated_at = ?
+                                   WHERE queue = ? AND status = 'failed' ''', (time.time(), queue)).rowcount
+        return self._transaction(statements)
+
+    def counts(self, queue):
+        """Number of tasks per status."""
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM tasks WHERE queue = ? GROUP BY status', (queue,))
+            return dict(rows.fetchall())
+
+    def drained(self, queue):
+        """Whether no task is waiting or being worked on."""
+        counts = self.counts(queue)
+        return not counts.get('pending') and not counts.get('leased')
+
+    def workers(self, queue):
+        """{worker: tasks held} for the workers holding unexpired leases."""
+        with self._lock:
+            rows = self._conn.execute('''SELECT worker, COUNT(*) FROM tasks WHERE queue = ? AND status = 'leased'
+                                         AND lease_expires >= ? GROUP BY worker''', (queue, time.time()))
+            return dict(rows.fetchall())
+
+    def finished(self, queue):
+        """(key, status, result, error) of every done or failed task."""
+        with self._lock:
+            rows = self._conn.execute('''SELECT key, status, result, error FROM tasks WHERE queue = ?
+                                         AND status IN ('done', 'failed') ORDER BY key''', (queue,)).fetchall()
+        return [(key, status, json.loads(result) if result else None, error) for key, status, result, error in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class Heartbeat:
+    """Renews the leases of a batch on a background thread while it is processed."""
+
+    def __init__(self, work_queue, tasks, interval):
+        self.work_queue = work_queue
+        self.tasks = tasks
+        self.interval = interval
+        self.lost = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='heartbeat', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.lost |= self.work_queue.heartbeat(self.tasks)
+            except sqlite3.Error as e:
+                print(f"Heartbeat failed, retrying: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(queue, process_batch, args, path=QUEUE_DB):
+    """Lease batches from `queue` and process them until nothing is left (or forever with --wait).
+
+    process_batch(tasks) returns {key: (success, result)}: successful results
+    are committed, failures retried later; tasks missing from the returned
+    dict count as failed attempts. Returns the number of tasks per outcome.
+    """
+    worker = worker_id()
+    totals = Counter()
+    with WorkQueue(path, lease_seconds=args.lease_seconds) as work_queue:
+        print(f"Worker {worker} taking tasks from the '{queue}' queue")
+        while True:
+            tasks = work_queue.lease(queue, worker, args.batch_size)
+            if not tasks:
+                # Tasks leased by other workers may still come back if those workers die
+                if not args.wait and work_queue.drained(queue):
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            with Heartbeat(work_queue, tasks, args.lease_seconds / 3) as heartbeat:
+                try:
+                    outcomes = process_batch(tasks)
+                except BaseException:
+                    work_queue.release(tasks)
+                    raise
+
+            for task in tasks:
+                success, result = outcomes.get(task.key, (False, 'no result'))
+                if task.key in heartbeat.lost:
+                    totals['lost'] += 1
+                elif success:
+                    totals['done' if work_queue.complete(task, result) else 'lost'] += 1
+                else:
+                    work_queue.fail(task, result)
+                    totals['failed' if task.attempts >= work_queue.max_attempts else 'retry'] += 1
+            print(f"{sum(totals.values())} tasks processed: {dict(totals)}; queue: {work_queue.counts(queue)}")
+    return totals
+
+
+def enqueue_projects(queues, csv_path='resources/mixed_data.csv', force=False, path=QUEUE_DB):
+    import pandas as pd
+
+    df = pd.read_csv(csv_path).dropna(subset=['Website', 'Name']).drop_duplicates(subset=['Name'])
+    tasks = {row['Name']: {'Name': row['Name'], 'Website': row['Website']} for _, row in df.iterrows()}
+    with WorkQueue(path) as work_queue:
+        for queue in queues:
+            print(f"{work_queue.enqueue(queue, tasks, force=force)} of {len(tasks)} projects queued for '{queue}'")
+
+
+def print_status(path=QUEUE_DB):
+    with WorkQueue(path) as work_queue:
+        for queue in QUEUES:
+            counts = work_queue.counts(queue)
+            if not counts:
+                continue
+            print(f"{queue}: " + ', '.join(f"{count} {status}" for status, count in sorted(counts.items())))
+            for worker, held in work_queue.workers(queue).items():
+                print(f"    {worker} holds {held} tasks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the work queue shared by the scraper workers")
+    parser.add_argument('--db', default=QUEUE_DB, help='Queue database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='Queue the projects of a CSV')
+    enqueue_parser.add_argument('queues', nargs='+', choices=QUEUES)
+    enqueue_parser.add_argument('--csv', default='resources/mixed_data.csv', help='Projects to queue')
+    enqueue_parser.add_argument('--force', action='store_true', help='Queue finished and failed projects again')
+
+    subparsers.add_parser('status', help='Show the tasks per queue and status')
+
+    retry_parser = subparsers.add_parser('retry', help='Queue the failed tasks again')
+    retry_parser.add_argument('queues', nargs='+', choices=QUEUES)
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        enqueue_projects(args.queues, args.csv, args.force, args.db)
+    elif args.command == 'status':
+        print_status(args.db)
+    elif args.command == 'retry':
+        with WorkQueue(args.db) as work_queue:
+            for queue in args.queues:
+                print(f"{work_queue.retry_failed(queue)} failed tasks queued again for '{queue}'")
+
+
+if __name__ == "__main__":
+    main()